@@ -3,4 +3,5 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
+    # Development server; see wsgi.py for production serving
     app.run(debug=True, host='0.0.0.0', port=5002)
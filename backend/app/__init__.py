@@ -1,14 +1,47 @@
+import time
+BOOT_START = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
 from .config import Config
 
 def create_app(config_class=Config):
+    create_start = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Request/stage timings for /api/metrics and Server-Timing, slow query
+    # logging and the opt-in sampling profiler
+    from .utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # orjson serialization and br/gzip response compression
+    from .utils.responses import init_responses
+    init_responses(app)
+    
     # Enable CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
+    # Pooled SQLite connections, returned to the pool on app context teardown
+    from .utils.db import init_db
+    init_db(app)
+    
+    # Bearer token verification for /api/*, with verified claims cached per token
+    from .utils.auth import init_auth
+    init_auth(app)
+    
+    # Shared result cache for the analytics endpoints
+    from .utils.cache import init_cache
+    init_cache(app)
+    
+    # Process pool for CPU-heavy analytics, with 429/504 handlers
+    from .utils.offload import init_offload
+    init_offload(app)
+    
+    # Load forecasting models before the first request; hot-reloads new versions
+    from .services.model_registry import model_registry
+    model_registry.init_app(app)
+    
     # Register Blueprints
     from .routes.health import health_bp
     from .routes.auth import auth_bp
@@ -18,11 +51,12 @@ def create_app(config_class=Config):
     
     from .routes.kpis import kpis_bp
     from .routes.profit import profit_bp
-    from .routes.incidents import incidents_bp
+    from .routes.incidents import incidents_bp, init_store
     
     app.register_blueprint(kpis_bp, url_prefix='/api')
     app.register_blueprint(profit_bp, url_prefix='/api')
     app.register_blueprint(incidents_bp, url_prefix='/api')
+    init_store(app)
     
     from .routes.forecast import forecast_bp
     app.register_blueprint(forecast_bp, url_prefix='/api')
@@ -38,4 +72,14 @@ def create_app(config_class=Config):
     app.register_blueprint(clv_bp, url_prefix='/api')
     app.register_blueprint(anomalies_bp, url_prefix='/api')
     
+    # One precomputed payload for all dashboard widgets, rebuilt after each ETL run
+    from .routes.dashboard import dashboard_bp, snapshot_warmer
+    app.register_blueprint(dashboard_bp, url_prefix='/api')
+    snapshot_warmer.init_app(app)
+    
+    # Heavy imports and model load now (eager) or on first use / in a
+    # background warm-up (LAZY_STARTUP); logs the boot time against its budget
+    from .utils.startup import startup
+    startup.init_app(app, BOOT_START, create_start)
+    
     return app
@@ -3,5 +3,84 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-prod'
     DATABASE_URI = os.path.join(os.getcwd(), 'backend', 'data', 'superstore_enhanced.db')
+    # Month-partitioned Parquet copy of orders written by etl.py (see app/services/columnar.py)
+    PARQUET_DIR = os.path.join(os.getcwd(), 'backend', 'data', 'orders_parquet')
+    MODEL_DIR = os.path.join(os.getcwd(), 'backend', 'static', 'models')
+    MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5)) # seconds, 0 disables hot reload
+    # Background threads (model watcher, dashboard warmer) start in each worker
+    # after the fork instead of in the preloading parent (set by gunicorn.conf.py)
+    DEFER_BACKGROUND_THREADS = os.environ.get('DEFER_BACKGROUND_THREADS') == '1'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
+    # Optional rotating keys, {"current": kid, "keys": {kid: secret}}, re-read on change
+    JWT_KEYS_FILE = os.environ.get('JWT_KEYS_FILE')
+    JWT_LEEWAY = 0 # seconds of clock skew allowed on exp
+    # Tokens are verified whenever sent; AUTH_REQUIRED also rejects requests without one
+    AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED') == '1'
+    AUTH_EXEMPT = ['health.health_check', 'health.metrics', 'auth.login']
+    AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 4096))
     CORS_HEADERS = 'Content-Type'
+    
+    # Read connection pool (see app/utils/db.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024))
+    DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -64 * 1024)) # negative = KiB
+    # Threads per process querying order partitions in parallel; 1 queries them in turn
+    PARTITION_WORKERS = int(os.environ.get('PARTITION_WORKERS', min(4, os.cpu_count() or 1)))
+    
+    # Result cache (see app/utils/cache.py); set CACHE_DIR to persist results across restarts
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    
+    # Longest horizon in days for a single forecast series
+    FORECAST_MAX_DAYS = int(os.environ.get('FORECAST_MAX_DAYS', 730))
+    # Upper bound on series x days per /api/demand-forecast/batch call
+    FORECAST_BATCH_MAX_POINTS = int(os.environ.get('FORECAST_BATCH_MAX_POINTS', 200000))
+    # Upper bound on scenarios x series x days per /api/demand-forecast/scenarios call
+    FORECAST_SCENARIO_MAX_ROWS = int(os.environ.get('FORECAST_SCENARIO_MAX_ROWS', 1000000))
+    
+    # Streaming anomaly detector state (see app/services/anomaly_detector.py)
+    ANOMALY_STATE_PATH = os.path.join(os.getcwd(), 'backend', 'data', 'anomaly_state.json')
+    ANOMALY_WINDOW = int(os.environ.get('ANOMALY_WINDOW', 28)) # days
+    ANOMALY_THRESHOLD = float(os.environ.get('ANOMALY_THRESHOLD', 3.5)) # robust z-score
+    
+    # Process pool for CPU-heavy analytics (see app/utils/offload.py); requests
+    # beyond ANALYTICS_MAX_PENDING queued jobs get 429, jobs over ANALYTICS_TIMEOUT 504
+    ANALYTICS_WORKERS = int(os.environ.get('ANALYTICS_WORKERS', 2))
+    ANALYTICS_MAX_PENDING = int(os.environ.get('ANALYTICS_MAX_PENDING', 4))
+    ANALYTICS_TIMEOUT = float(os.environ.get('ANALYTICS_TIMEOUT', 30)) # seconds
+    
+    # Rebuild the default /api/dashboard-snapshot within this many seconds of an ETL run, 0 disables
+    DASHBOARD_WARM_INTERVAL = float(os.environ.get('DASHBOARD_WARM_INTERVAL', 5))
+    
+    # br/gzip for JSON responses of at least this many bytes (see app/utils/responses.py)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    
+    # Comments API (see app/routes/incidents.py): page sizes, POST batch size
+    # and how long /api/comments/feed long-polls hold a request open
+    COMMENTS_PAGE_SIZE = 100
+    COMMENTS_MAX_PAGE = 500
+    COMMENTS_MAX_BATCH = 500
+    COMMENTS_POLL_TIMEOUT = float(os.environ.get('COMMENTS_POLL_TIMEOUT', 25)) # seconds
+    COMMENTS_POLL_INTERVAL = 0.5 # re-check for comments posted through other workers
+    
+    # Instrumentation (see app/utils/metrics.py). Queries slower than
+    # SLOW_QUERY_MS are logged with their query plan (0 disables); setting
+    # PROFILE_THRESHOLD_MS samples request stacks and dumps them for slower requests.
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+    PROFILE_THRESHOLD_MS = float(os.environ['PROFILE_THRESHOLD_MS']) if os.environ.get('PROFILE_THRESHOLD_MS') else None
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.path.join(os.getcwd(), 'backend', 'data', 'profiles')
+    # Multi-process servers: each worker writes its metrics here and
+    # /api/metrics reports the sum (gunicorn.conf.py sets it per server run)
+    METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)) # seconds
+    
+    # Startup (see app/utils/startup.py). LAZY_STARTUP defers the ML imports
+    # and the model load to the first request needing them; WARMUP_IMPORTS then
+    # preloads them in a background thread. Boots over the budget log a warning.
+    LAZY_STARTUP = os.environ.get('LAZY_STARTUP') == '1'
+    WARMUP_IMPORTS = os.environ.get('WARMUP_IMPORTS', '1') == '1'
+    STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 3000))
@@ -1,37 +1,126 @@
-from flask import Blueprint, jsonify
-from sklearn.ensemble import IsolationForest
-from ..utils.db import query_db
-import pandas as pd
+from flask import Blueprint, jsonify, request, current_app
+from ..utils.db import query_db, plan_source, get_etl_state, get_data_version
+from ..utils.cache import cached
+from ..utils.offload import analytics_pool
+from ..utils.responses import table
+from ..utils.metrics import stage
+from ..services.anomaly_detector import StreamingAnomalyDetector, series_key
+from ..services.columnar import is_current, read_columns, month_filter
 import numpy as np
 
 anomalies_bp = Blueprint('anomalies', __name__)
 
-@anomalies_bp.route('/anomaly-alerts', methods=['GET'])
-def get_anomalies():
-    # Detect anomalies in Daily Sales
-    
-    data = query_db("""
-        SELECT Order_Date, SUM(Sales) as Sales
-        FROM orders
-        GROUP BY 1
+detector = None
+
+def get_detector():
+    global detector
+    if detector is None:
+        detector = StreamingAnomalyDetector(
+            current_app.config['ANOMALY_STATE_PATH'],
+            window=current_app.config['ANOMALY_WINDOW'],
+            threshold=current_app.config['ANOMALY_THRESHOLD']
+        )
+    return detector
+
+def load_daily_sales_columnar(path, after=None):
+    # Without the rollup, aggregate the Parquet columns rather than scan `orders`
+    import pandas as pd
+
+    with stage('parquet'):
+        data = read_columns(path, ['Order_Date', 'Region', 'Category', 'Sales'], filters=month_filter(after))
+    with stage('dataframe'):
+        df = pd.DataFrame(data)
+        df['Order_Date'] = df['Order_Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        if after:
+            df = df[df['Order_Date'] > after]
+        return df.groupby(['Order_Date', 'Region', 'Category'], observed=True, as_index=False)['Sales'].sum()
+
+def load_daily_sales(after=None):
+    # Daily Sales per Region x Category, from the rollup when available
+    import pandas as pd
+
+    source = plan_source(['Order_Date', 'Region', 'Category'])
+    path = current_app.config['PARQUET_DIR']
+    if source == 'orders' and is_current(path, get_data_version()):
+        return load_daily_sales_columnar(path, after)
+    query = f"""
+        SELECT CAST(Order_Date AS TEXT) as Order_Date, Region, Category, SUM(Sales) as Sales
+        FROM {source}
+        {'WHERE Order_Date > ?' if after else ''}
+        GROUP BY 1, 2, 3
         ORDER BY 1
-    """)
-    
-    df = pd.DataFrame(data, columns=['Order_Date', 'Sales'])
-    
+    """
+    data = query_db(query, [after] if after else [])
+    with stage('dataframe'):
+        return pd.DataFrame(data, columns=['Order_Date', 'Region', 'Category', 'Sales'])
+
+def refresh(detector):
+    # Feed the detector only the days appended since its last update. A full
+    # ETL reload (new base_version) or an incremental load that changed days
+    # already loaded (new history_version) invalidates its history, so reseed
+    # then; the rollup makes that a scan over days, not orders.
+    state = get_etl_state()
+    with detector.lock:
+        if detector.last_date is not None and state.get('data_version') == detector.data_version:
+            return
+        if (state.get('base_version') != detector.base_version
+                or state.get('history_version') != detector.history_version):
+            detector.reset()
+        daily = load_daily_sales(detector.last_date)
+        with stage('fit'):
+            detector.update(daily)
+        detector.data_version = state.get('data_version')
+        detector.base_version = state.get('base_version')
+        detector.history_version = state.get('history_version')
+        detector.save()
+
+def fit_isolation_forest(sales):
+    # Runs in the analytics process pool; True for outlying days
+    from sklearn.ensemble import IsolationForest
+
     model = IsolationForest(contamination=0.05, random_state=42)
-    df['Anomaly'] = model.fit_predict(df[['Sales']])
-    
-    # -1 is anomaly, 1 is normal
-    anomalies = df[df['Anomaly'] == -1].copy()
-    
-    results = []
-    for _, row in anomalies.iterrows():
-        results.append({
-            'date': row['Order_Date'],
-            'value': row['Sales'],
-            'type': 'Sales Spike/Drop',
-            'severity': 'High'
-        })
-        
-    return jsonify(results)
+    return model.fit_predict(sales.reshape(-1, 1)) == -1
+
+def isolation_forest_anomalies(region, category):
+    # Offline mode: the original full-history IsolationForest fit
+    df = load_daily_sales()
+    if (region and region not in set(df['Region'])) or (category and category not in set(df['Category'])):
+        return None
+    with stage('dataframe'):
+        if region:
+            df = df[df['Region'] == region]
+        if category:
+            df = df[df['Category'] == category]
+        df = df.groupby('Order_Date', as_index=False)['Sales'].sum()
+    if df.empty:
+        return []
+
+    with stage('fit'):
+        outliers = analytics_pool.run(fit_isolation_forest, df['Sales'].to_numpy())
+    anomalies = df[outliers]
+    return table({
+        'date': anomalies['Order_Date'].str[:10].to_numpy(),
+        'value': anomalies['Sales'].to_numpy(),
+        'type': np.full(len(anomalies), 'Sales Spike/Drop'),
+        'severity': np.full(len(anomalies), 'High')
+    })
+
+@anomalies_bp.route('/anomaly-alerts', methods=['GET'])
+@cached
+def get_anomalies():
+    # Detect anomalies in Daily Sales, globally or per Region/Category
+    region = request.args.get('region') if request.args.get('region') != 'All' else None
+    category = request.args.get('category') if request.args.get('category') != 'All' else None
+
+    if request.args.get('mode') == 'isolation_forest':
+        results = isolation_forest_anomalies(region, category)
+        if results is None:
+            return jsonify({'error': 'Unknown region or category'}), 400
+        return jsonify(results)
+
+    detector = get_detector()
+    refresh(detector)
+    results = detector.anomalies(series_key(region, category))
+    if results is None:
+        return jsonify({'error': 'Unknown region or category'}), 400
+    return jsonify(table(results))
@@ -1,21 +1,23 @@
 from flask import Blueprint, request, jsonify
-import jwt
-import datetime
-from ..config import Config
+from ..utils.db import query_db
+from ..utils.auth import issue_token, verifier
 
 auth_bp = Blueprint('auth', __name__)
 
+TOKEN_LIFETIME = 24 * 3600 # seconds
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     
     # Mock authentication - in prod check DB
     if data.get('username') == 'admin' and data.get('password') == 'admin':
-        token = jwt.encode({
-            'user': 'admin',
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }, Config.JWT_SECRET_KEY, algorithm="HS256")
-        
-        return jsonify({'token': token, 'role': 'CEO'}), 200
+        user = query_db("SELECT role FROM users WHERE username = ? AND active = 1", [data['username']], one=True)
+        if user is not None:
+            return jsonify({'token': issue_token(data['username'], TOKEN_LIFETIME), 'role': user['role']}), 200
     
     return jsonify({'message': 'Invalid credentials'}), 401
+
+@auth_bp.route('/stats', methods=['GET'])
+def auth_stats():
+    return jsonify(verifier.get_stats()), 200
@@ -1,57 +1,87 @@
-from flask import Blueprint, jsonify
-from sklearn.cluster import KMeans
-from ..utils.db import query_db
-import pandas as pd
+from flask import Blueprint, jsonify, request
+from ..utils.db import query_db, get_db
+from ..utils.cache import cached
+from ..utils.responses import table, not_built, precomputed
+from ..services.rfm import scores_status, CHURN_LEVELS, VALUE_LEVELS
 
 clv_bp = Blueprint('clv', __name__)
 
 @clv_bp.route('/clv-churn', methods=['GET'])
+@cached
 def get_clv_churn():
-    # RFM Analysis (Recency, Frequency, Monetary)
-    
-    # Fetch customer data
-    data = query_db("""
-        SELECT 
-            Customer_ID,
-            MAX(Order_Date) as Last_Order,
-            COUNT(DISTINCT Order_Date) as Frequency,
-            SUM(Sales) as Monetary
-        FROM orders
-        GROUP BY 1
-        LIMIT 2000
-    """)
-    
-    if not data:
+    # RFM Analysis (Recency, Frequency, Monetary) over all customers. Scores
+    # are precomputed by etl.py after each load; GET handlers only read them.
+    status = scores_status(get_db())
+    if status is None:
+        return not_built('Customer scores')
+
+    totals = query_db("""
+        SELECT COUNT(*) as customers, AVG(Monetary) as avg_clv
+        FROM customer_rfm
+    """, one=True)
+    if not totals['customers']:
         return jsonify([])
-        
-    df = pd.DataFrame(data, columns=['Customer_ID', 'Last_Order', 'Frequency', 'Monetary'])
-    df['Last_Order'] = pd.to_datetime(df['Last_Order'])
-    now = df['Last_Order'].max()
-    df['Recency'] = (now - df['Last_Order']).dt.days
-    
-    # Simple Segmentation using Quantiles (or KMeans if we had more time/data complexity)
-    # For this demo, let's use simple logic for "Churn Risk"
-    
-    # High Risk: High Recency (haven't bought in a while)
-    # High Value: High Monetary
-    
-    df['Churn_Risk'] = df['Recency'].apply(lambda x: 'High' if x > 365 else ('Medium' if x > 180 else 'Low'))
-    df['Customer_Value'] = pd.qcut(df['Monetary'], 3, labels=['Low', 'Medium', 'High'])
-    
-    # Aggregate for Heatmap
-    heatmap = df.groupby(['Churn_Risk', 'Customer_Value']).size().reset_index(name='count')
-    
-    # Format for frontend
-    segments = []
-    for _, row in heatmap.iterrows():
-        segments.append({
-            'churn_risk': row['Churn_Risk'],
-            'value_segment': row['Customer_Value'],
-            'count': int(row['count'])
-        })
-        
-    return jsonify({
+
+    # Aggregate for Heatmap, every Churn_Risk x Customer_Value cell
+    counts = {
+        (row['Churn_Risk'], row['Customer_Value']): row['count']
+        for row in query_db("""
+            SELECT Churn_Risk, Customer_Value, COUNT(*) as count
+            FROM customer_rfm
+            GROUP BY 1, 2
+        """)
+    }
+    segments = [
+        {'churn_risk': risk, 'value_segment': value, 'count': counts.get((risk, value), 0)}
+        for risk in sorted(CHURN_LEVELS) for value in VALUE_LEVELS
+    ]
+
+    clusters = [dict(row) for row in query_db("""
+        SELECT
+            Cluster as cluster,
+            COUNT(*) as customers,
+            ROUND(AVG(Recency), 1) as avg_recency,
+            ROUND(AVG(Frequency), 1) as avg_frequency,
+            ROUND(AVG(Monetary), 2) as avg_monetary
+        FROM customer_rfm
+        GROUP BY 1
+        ORDER BY 1
+    """)]
+
+    return precomputed({
         'segments': segments,
-        'total_customers': len(df),
-        'avg_clv': round(df['Monetary'].mean(), 2)
-    })
+        'clusters': clusters,
+        'total_customers': totals['customers'],
+        'avg_clv': round(totals['avg_clv'], 2)
+    }, status)
+
+@clv_bp.route('/clv-churn/customers', methods=['GET'])
+@cached
+def get_clv_customers():
+    # Drill-down into a heatmap cell or cluster, highest Monetary first
+    status = scores_status(get_db())
+    if status is None:
+        return not_built('Customer scores')
+
+    query = "SELECT * FROM customer_rfm WHERE 1 = 1"
+    params = []
+    for arg, column in (('churn_risk', 'Churn_Risk'), ('value_segment', 'Customer_Value'), ('cluster', 'Cluster')):
+        if request.args.get(arg):
+            query += f" AND {column} = ?"
+            params.append(request.args[arg])
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    query += " ORDER BY Monetary DESC LIMIT ? OFFSET ?"
+    params += [limit, offset]
+
+    rows = query_db(query, params)
+    columns = rows[0].keys() if rows else []
+    return precomputed({
+        'customers': table(dict(zip(columns, zip(*rows)))),
+        'limit': limit,
+        'offset': offset
+    }, status)
@@ -0,0 +1,169 @@
+from flask import Blueprint, request, current_app
+from datetime import date
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from ..utils.cache import result_cache
+from ..utils.db import get_data_version
+from ..services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Widgets of the React pages, each rendered by its own endpoint from the
+# snapshot params it depends on. 'All' isn't a forecast series, so the
+# forecast falls back to its default region then.
+WIDGETS = {
+    'kpis': {'path': '/api/kpis', 'params': ['start_date', 'end_date', 'region']},
+    'profit_diagnostic': {'path': '/api/profit-diagnostic', 'params': ['start_date', 'end_date']},
+    'demand_forecast': {'path': '/api/demand-forecast', 'params': ['region', 'category', 'sub_category', 'days'], 'skip_all': True},
+    'anomalies': {'path': '/api/anomaly-alerts', 'params': ['region', 'category']},
+    'clv_churn': {'path': '/api/clv-churn', 'params': []},
+    'pricing': {'path': '/api/pricing-elasticity', 'params': ['segment']},
+    'inventory': {'path': '/api/inventory-optimize', 'params': ['start_date', 'end_date', 'capacity']},
+}
+
+# Same defaults as the frontend's GlobalContext / DemandForecast page
+DEFAULTS = {'start_date': '2023-01-01', 'end_date': '2025-12-31', 'region': 'All', 'days': '90'}
+
+def snapshot_version():
+    # Widgets change with the data, the serving model and (forecasts) the day
+    current = model_registry.current()
+    return (get_data_version(), current.version if current else None, date.today().isoformat())
+
+def widget_args(name, args):
+    spec = WIDGETS[name]
+    return tuple(
+        (p, args[p]) for p in spec['params']
+        if args.get(p) and not (spec.get('skip_all') and args[p] == 'All')
+    )
+
+def render_widget(name, args, version):
+    # (status, JSON body) from the widget's endpoint, cached per widget so a
+    # filter change only recomputes the widgets that depend on it
+    key = ('dashboard-widget', name, args, version)
+    hit = result_cache.get(key, version[0])
+    if hit is not None:
+        return hit
+
+    with current_app.test_request_context(WIDGETS[name]['path'], query_string=list(args)):
+        try:
+            response = current_app.make_response(current_app.view_functions[request.endpoint]())
+        except Exception as e:
+            try:
+                response = current_app.make_response(current_app.handle_user_exception(e))
+            except Exception:
+                # Unhandled error in the view: fail this widget, not the whole snapshot
+                logger.exception("Dashboard widget %s failed", name)
+                return (500, json.dumps({'error': f'{type(e).__name__} in {name} widget'}).encode())
+    result = (response.status_code, response.get_data())
+    if response.status_code == 200:
+        result_cache.set(key, result, version[0])
+    return result
+
+def build_snapshot(args, names, version):
+    # Widget bodies are spliced in as-is rather than parsed and re-encoded;
+    # also returns whether every widget rendered successfully
+    parts, complete = [], True
+    for name in names:
+        status, body = render_widget(name, widget_args(name, args), version)
+        complete = complete and status == 200
+        parts.append(b'%s:{"status":%d,"data":%s}' % (json.dumps(name).encode(), status, body or b'null'))
+    return b'{"data_version":%s,"widgets":{%s}}' % (json.dumps(version[0]).encode(), b','.join(parts)), complete
+
+def get_snapshot(args, names):
+    # (raw, gzip'd, etag). The ETag hashes the inputs rather than the body
+    # (which carries timings), so every server process agrees on it.
+    version = snapshot_version()
+    key = ('dashboard-snapshot', tuple(sorted(args.items())), tuple(names), version)
+    snapshot = result_cache.get(key, version[0])
+    if snapshot is None:
+        raw, complete = build_snapshot(args, names, version)
+        # No ETag (nor caching) while a widget failed, so clients refetch it
+        etag = hashlib.sha256(repr(key).encode()).hexdigest()[:32] if complete else None
+        snapshot = (raw, gzip.compress(raw, 6), etag)
+        if complete:
+            result_cache.set(key, snapshot, version[0])
+    return snapshot
+
+@dashboard_bp.route('/dashboard-snapshot', methods=['GET'])
+def get_dashboard_snapshot():
+    # Every dashboard widget in one gzip'd payload; If-None-Match gets a 304
+    # while neither the data, the model nor the filters have changed.
+    # Optional ?widgets=kpis,pricing limits the payload to some widgets.
+    names = [n for n in request.args.get('widgets', ','.join(WIDGETS)).split(',') if n in WIDGETS]
+    args = {**DEFAULTS, **{k: v for k, v in request.args.items() if v and k != 'widgets'}}
+    raw, compressed, etag = get_snapshot(args, names)
+
+    response = current_app.response_class(status=200, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    if etag:
+        response.set_etag(etag, weak=True)
+        if request.if_none_match.contains_weak(etag):
+            response.status_code = 304
+            return response
+    if 'gzip' in request.accept_encodings:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response.set_data(raw)
+    return response
+
+class SnapshotWarmer:
+    # Rebuilds the default snapshot as soon as an ETL run (or a model reload)
+    # changes its version, so the first dashboard load after it is a cache hit
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0
+        self.lazy = False
+        self._version = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config['DASHBOARD_WARM_INTERVAL']
+        # With LAZY_STARTUP building the snapshot would import the whole ML
+        # stack right after boot in every worker; start on a first request instead
+        self.lazy = app.config['LAZY_STARTUP']
+        if self.lazy:
+            app.before_request(self.start)
+        elif not app.config['DEFER_BACKGROUND_THREADS']:
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self.interval and self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='dashboard-warmer')
+                self._thread.start()
+
+    def after_fork(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        if not self.lazy:
+            self.start()
+
+    def warm(self):
+        with self.app.app_context():
+            version = snapshot_version()
+            if version != self._version:
+                start = time.perf_counter()
+                get_snapshot(dict(DEFAULTS), list(WIDGETS))
+                self._version = version
+                logger.info("Dashboard snapshot built in %.0f ms", (time.perf_counter() - start) * 1000)
+
+    def _run(self):
+        while True:
+            try:
+                self.warm()
+            except Exception:
+                logger.exception("Dashboard snapshot warm-up failed")
+            time.sleep(self.interval)
+
+snapshot_warmer = SnapshotWarmer()
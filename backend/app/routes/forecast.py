@@ -1,80 +1,295 @@
-from flask import Blueprint, jsonify, request
-import pickle
-import pandas as pd
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 import numpy as np
-import os
-from datetime import datetime, timedelta
+from datetime import datetime
+from ..services.model_registry import model_registry
+from ..utils.responses import table
 
 forecast_bp = Blueprint('forecast', __name__)
 
-MODEL_PATH = 'backend/static/models/demand_model.pkl'
-ENCODER_PATH = 'backend/static/models/encoders.pkl'
+FEATURES = ['Month', 'DayOfWeek', 'Year', 'Region_Encoded', 'Category_Encoded', 'Sub_Category_Encoded', 'Discount', 'Weather_Index', 'Is_Promo']
 
-model = None
-encoders = None
+# Driver assumptions for future days
+DEFAULT_DRIVERS = {'Discount': 0.1, 'Weather_Index': 80, 'Is_Promo': 0}
+# Allowed values per driver in a scenario grid, and at most how many
+DRIVER_RANGES = {'Discount': (0, 1), 'Weather_Index': (-np.inf, np.inf), 'Is_Promo': (0, 1)}
+MAX_DRIVER_VALUES = 1000
 
-def load_model():
-    global model, encoders
-    if model is None and os.path.exists(MODEL_PATH):
-        with open(MODEL_PATH, 'rb') as f:
-            model = pickle.load(f)
-    if encoders is None and os.path.exists(ENCODER_PATH):
-        with open(ENCODER_PATH, 'rb') as f:
-            encoders = pickle.load(f)
+def encode_series(current, series):
+    # Returns (region, category, sub_category) codes, or None for unknown or non-string labels
+    labels = (series.get('region'), series.get('category'), series.get('sub_category'))
+    if not all(isinstance(label, str) for label in labels):
+        return None
+    try:
+        return (
+            current.codes['region'][labels[0]],
+            current.codes['category'][labels[1]],
+            current.codes['subcategory'][labels[2]]
+        )
+    except KeyError:
+        return None
+
+def parse_days(value, minimum=1):
+    # Horizon from a query arg or JSON value; ValueError unless an integer in [minimum, FORECAST_MAX_DAYS]
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    days = int(value)
+    if not minimum <= days <= current_app.config['FORECAST_MAX_DAYS']:
+        raise ValueError(value)
+    return days
+
+def build_feature_matrix(encoded, horizons, start_date):
+    # One row per (series, day), series laid out back to back
+    horizons = np.asarray(horizons, dtype=np.int64)
+    total = int(horizons.sum())
+    series_start = np.repeat(np.cumsum(horizons) - horizons, horizons)
+    day_offset = np.arange(total) - series_start
+    dates = np.datetime64(start_date.date(), 'D') + day_offset
+
+    X = np.empty((total, len(FEATURES)), dtype=np.float32)
+    X[:, 0] = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    X[:, 1] = (dates.astype(np.int64) + 3) % 7 # 1970-01-01 was a Thursday, Monday = 0
+    X[:, 2] = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    X[:, 3:6] = np.repeat(np.asarray(encoded, dtype=np.float32).reshape(-1, 3), horizons, axis=0)
+    X[:, 6] = DEFAULT_DRIVERS['Discount']
+    X[:, 7] = DEFAULT_DRIVERS['Weather_Index']
+    X[:, 8] = DEFAULT_DRIVERS['Is_Promo']
+    return X, dates
+
+def driver_values(name, spec):
+    # A value, a list of values, or {"start", "stop", "num"} for num evenly
+    # spaced values (stop included); raises ValueError
+    if isinstance(spec, dict):
+        num = int(spec.get('num', 2))
+        if not 1 <= num <= MAX_DRIVER_VALUES:
+            raise ValueError(f'{name} num must be between 1 and {MAX_DRIVER_VALUES}')
+        values = np.linspace(float(spec['start']), float(spec['stop']), num)
+    else:
+        values = np.asarray(spec if isinstance(spec, list) else [spec], dtype=np.float64)
+    low, high = DRIVER_RANGES[name]
+    if values.ndim != 1 or not 1 <= len(values) <= MAX_DRIVER_VALUES or not np.all((values >= low) & (values <= high)):
+        raise ValueError(f'{name} needs one or more values between {low} and {high}')
+    if name == 'Is_Promo' and not np.all(np.isin(values, (0, 1))):
+        raise ValueError('Is_Promo values must be 0 or 1')
+    return values
+
+def scenario_grid(spec, max_scenarios):
+    # {driver: values per scenario} for every combination of the swept
+    # drivers; the others stay at DEFAULT_DRIVERS. The baseline (all
+    # defaults) is appended as the last scenario.
+    unknown = set(spec) - set(DEFAULT_DRIVERS)
+    if unknown:
+        raise ValueError(f"Unknown drivers: {', '.join(sorted(unknown))}")
+    axes = [driver_values(name, spec[name]) if name in spec else np.array([default], dtype=np.float64)
+            for name, default in DEFAULT_DRIVERS.items()]
+    if np.prod([len(values) for values in axes]) > max_scenarios:
+        raise ValueError(f'more than {max_scenarios} combinations')
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return {
+        name: np.append(values.ravel(), DEFAULT_DRIVERS[name])
+        for name, values in zip(DEFAULT_DRIVERS, mesh)
+    }
+
+def build_scenario_matrix(base, grid):
+    # base (rows of build_feature_matrix) repeated once per scenario, with the
+    # scenario's drivers filled in; scenario g owns rows g * len(base) onwards
+    scenarios = len(grid['Discount'])
+    X = np.empty((scenarios, len(base), len(FEATURES)), dtype=np.float32)
+    X[:] = base
+    for name, values in grid.items():
+        X[:, :, FEATURES.index(name)] = values[:, None]
+    return X.reshape(-1, len(FEATURES))
+
+def series_offsets(current, series, horizons):
+    # Per-row P10/P50/P90 residual offsets, one table lookup per series
+    offsets = current.interval_offsets([f"{s['region']}|{s['sub_category']}" for s in series])
+    if offsets is None:
+        return None
+    return np.repeat(offsets, horizons, axis=0)
+
+def format_points(dates, predictions, offsets=None):
+    # Vectorized rounding; rows (or ?shape=columns arrays) built by table()
+    preds = predictions.astype(np.float64)
+    forecast = np.maximum(0, np.round(preds, 1)) # No negative demand
+    dates = np.datetime_as_string(dates, unit='D')
+    if offsets is None:
+        # Models trained before interval calibration: fixed +/-20% band
+        return table({
+            'date': dates,
+            'forecast': forecast,
+            'lower_ci': np.maximum(0, np.round(preds * 0.8, 1)),
+            'upper_ci': np.round(preds * 1.2, 1)
+        })
+
+    # Conformal P10/P50/P90; lower_ci/upper_ci kept as the P10/P90 band
+    bands = np.maximum(0, np.round(preds[:, None] + offsets, 1))
+    return table({
+        'date': dates,
+        'forecast': forecast,
+        'lower_ci': bands[:, 0],
+        'upper_ci': bands[:, 2],
+        'p10': bands[:, 0],
+        'p50': bands[:, 1],
+        'p90': bands[:, 2]
+    })
 
 @forecast_bp.route('/demand-forecast', methods=['GET'])
 def get_forecast():
-    load_model()
-    if not model:
+    current = model_registry.current()
+    if current is None:
         return jsonify({'error': 'Model not trained'}), 503
-        
+
     # Parameters
-    region = request.args.get('region', 'North')
-    category = request.args.get('category', 'Furniture')
-    sub_category = request.args.get('sub_category', 'Chairs')
-    days = int(request.args.get('days', 30))
-    
-    # Generate future dates
-    start_date = datetime.now()
-    dates = [start_date + timedelta(days=i) for i in range(days)]
-    
-    # Prepare input dataframe
-    future_df = pd.DataFrame({
-        'Order_Date': dates,
-        'Region': [region] * days,
-        'Category': [category] * days,
-        'Sub_Category': [sub_category] * days,
-        'Discount': [0.1] * days, # Assumption
-        'Weather_Index': [80] * days, # Assumption
-        'Is_Promo': [0] * days # Assumption
-    })
-    
-    # Feature Engineering
-    future_df['Month'] = future_df['Order_Date'].dt.month
-    future_df['DayOfWeek'] = future_df['Order_Date'].dt.dayofweek
-    future_df['Year'] = future_df['Order_Date'].dt.year
-    
-    # Encode
+    series = {
+        'region': request.args.get('region', 'North'),
+        'category': request.args.get('category', 'Furniture'),
+        'sub_category': request.args.get('sub_category', 'Chairs')
+    }
     try:
-        future_df['Region_Encoded'] = encoders['region'].transform(future_df['Region'])
-        future_df['Category_Encoded'] = encoders['category'].transform(future_df['Category'])
-        future_df['Sub_Category_Encoded'] = encoders['subcategory'].transform(future_df['Sub_Category'])
+        days = parse_days(request.args.get('days', 30))
     except ValueError:
+        return jsonify({'error': f"days must be an integer from 1 to {current_app.config['FORECAST_MAX_DAYS']}"}), 400
+
+    encoded = encode_series(current, series)
+    if encoded is None:
         return jsonify({'error': 'Invalid category or region'}), 400
-        
-    X = future_df[['Month', 'DayOfWeek', 'Year', 'Region_Encoded', 'Category_Encoded', 'Sub_Category_Encoded', 'Discount', 'Weather_Index', 'Is_Promo']]
-    
+
+    X, dates = build_feature_matrix([encoded], [days], datetime.now())
+
     # Predict
-    predictions = model.predict(X)
-    
-    # Format response
-    result = []
-    for date, pred in zip(dates, predictions):
-        result.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'forecast': max(0, round(float(pred), 1)), # No negative demand
-            'lower_ci': max(0, round(float(pred) * 0.8, 1)),
-            'upper_ci': round(float(pred) * 1.2, 1)
-        })
-        
-    return jsonify(result)
+    predictions = current.predict(X)
+
+    return jsonify(format_points(dates, predictions, series_offsets(current, [series], [days])))
+
+@forecast_bp.route('/demand-forecast/batch', methods=['POST'])
+def get_forecast_batch():
+    # Body: {"series": [{"region", "category", "sub_category", "days"?}, ...], "days": 30}
+    # Returns results grouped by series; ?format=ndjson streams one series per line.
+    current = model_registry.current()
+    if current is None:
+        return jsonify({'error': 'Model not trained'}), 503
+
+    data = request.get_json(silent=True) or {}
+    series = data.get('series') or []
+    if not series:
+        return jsonify({'error': 'No series requested'}), 400
+    if not isinstance(series, list) or not all(isinstance(s, dict) for s in series):
+        return jsonify({'error': 'series must be a list of objects'}), 400
+
+    try:
+        default_days = parse_days(data.get('days', 30), 0)
+        horizons = [parse_days(s.get('days', default_days), 0) for s in series]
+    except ValueError:
+        return jsonify({'error': f"days must be an integer from 0 to {current_app.config['FORECAST_MAX_DAYS']}"}), 400
+    if sum(horizons) > current_app.config['FORECAST_BATCH_MAX_POINTS']:
+        return jsonify({'error': 'Batch too large'}), 400
+
+    encoded = [encode_series(current, s) for s in series]
+    valid = [i for i, e in enumerate(encoded) if e is not None]
+
+    # One feature matrix and one predict call for every valid series
+    predictions = np.empty(0, dtype=np.float32)
+    dates = np.empty(0, dtype='datetime64[D]')
+    offsets = None
+    if valid:
+        X, dates = build_feature_matrix([encoded[i] for i in valid], [horizons[i] for i in valid], datetime.now())
+        predictions = current.predict(X)
+        offsets = series_offsets(current, [series[i] for i in valid], [horizons[i] for i in valid])
+    bounds = np.cumsum([0] + [horizons[i] for i in valid])
+    slices = {i: (bounds[n], bounds[n + 1]) for n, i in enumerate(valid)}
+
+    def results():
+        for i, s in enumerate(series):
+            item = {
+                'region': s.get('region'),
+                'category': s.get('category'),
+                'sub_category': s.get('sub_category')
+            }
+            if i in slices:
+                lo, hi = slices[i]
+                item['forecast'] = format_points(dates[lo:hi], predictions[lo:hi], offsets[lo:hi] if offsets is not None else None)
+            else:
+                item['error'] = 'Invalid category or region'
+            yield item
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        lines = (current_app.json.dumps(item) + '\n' for item in results())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    return jsonify({'series': list(results())})
+
+@forecast_bp.route('/demand-forecast/scenarios', methods=['POST'])
+def get_forecast_scenarios():
+    # Body: {"series": [{"region", "category", "sub_category"}, ...], "days": 30,
+    #        "grid": {"Discount": {"start": 0, "stop": 0.5, "num": 11}, "Is_Promo": [0, 1], "Weather_Index": [60, 80, 100]}}
+    # Total demand over the horizon for every combination of drivers, per
+    # series, with the uplift over DEFAULT_DRIVERS; the whole grid is one predict call.
+    current = model_registry.current()
+    if current is None:
+        return jsonify({'error': 'Model not trained'}), 503
+
+    data = request.get_json(silent=True) or {}
+    series = data.get('series') or []
+    if not series:
+        return jsonify({'error': 'No series requested'}), 400
+    if not isinstance(series, list) or not all(isinstance(s, dict) for s in series):
+        return jsonify({'error': 'series must be a list of objects'}), 400
+    try:
+        days = parse_days(data.get('days', 30))
+    except ValueError:
+        return jsonify({'error': f"days must be an integer from 1 to {current_app.config['FORECAST_MAX_DAYS']}"}), 400
+    try:
+        grid = scenario_grid(data.get('grid') or {}, current_app.config['FORECAST_SCENARIO_MAX_ROWS'])
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid grid: {e}'}), 400
+
+    encoded = [encode_series(current, s) for s in series]
+    valid = [i for i, e in enumerate(encoded) if e is not None]
+    scenarios = len(grid['Discount'])
+    if scenarios * len(valid) * days > current_app.config['FORECAST_SCENARIO_MAX_ROWS']:
+        return jsonify({'error': 'Too many scenarios x series x days'}), 400
+
+    # (scenario, series) totals, negative daily demand counted as zero like the forecasts
+    totals = np.empty((scenarios, 0))
+    if valid:
+        base, _ = build_feature_matrix([encoded[i] for i in valid], [days] * len(valid), datetime.now())
+        # Days only differ in (Month, DayOfWeek, Year), so each distinct
+        # combination is predicted once and weighted by how often it occurs
+        _, first, counts = np.unique(base[:days, :3], axis=0, return_index=True, return_counts=True)
+        base = base.reshape(len(valid), days, -1)[:, first].reshape(len(valid) * len(first), -1)
+        predictions = current.predict(build_scenario_matrix(base, grid))
+        demand = np.maximum(predictions.astype(np.float64), 0).reshape(scenarios, len(valid), len(first))
+        totals = demand @ counts
+    baseline = totals[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uplift = np.where(baseline > 0, (totals[:-1] / baseline - 1) * 100, 0.0)
+
+    positions = {i: n for n, i in enumerate(valid)}
+    results = []
+    for i, s in enumerate(series):
+        item = {'region': s.get('region'), 'category': s.get('category'), 'sub_category': s.get('sub_category')}
+        if i in positions:
+            n = positions[i]
+            item['baseline_demand'] = round(float(baseline[n]), 1)
+            item['surface'] = table({
+                'discount': np.round(grid['Discount'][:-1], 4),
+                'weather_index': np.round(grid['Weather_Index'][:-1], 4),
+                'is_promo': grid['Is_Promo'][:-1].astype(np.int64),
+                'demand': np.round(totals[:-1, n], 1),
+                'avg_daily_demand': np.round(totals[:-1, n] / days, 2),
+                'uplift_pct': np.round(uplift[:, n], 1)
+            })
+        else:
+            item['error'] = 'Invalid category or region'
+        results.append(item)
+
+    return jsonify({
+        'days': days,
+        'baseline': DEFAULT_DRIVERS,
+        'scenarios': scenarios - 1,
+        'series': results
+    })
+
+@forecast_bp.route('/models', methods=['GET'])
+def get_models():
+    # Serving model version with its load time and prediction latency
+    return jsonify(model_registry.describe())
@@ -1,7 +1,23 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, Response
+from ..utils.cache import result_cache
+from ..utils.offload import analytics_pool
+from ..utils.metrics import render_metrics
 
 health_bp = Blueprint('health', __name__)
 
 @health_bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'version': '1.0.0'}), 200
+
+@health_bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.get_stats()), 200
+
+@health_bp.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    return jsonify(analytics_pool.get_stats()), 200
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition of this process's request/stage histograms
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
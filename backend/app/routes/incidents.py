@@ -1,35 +1,146 @@
-from flask import Blueprint, jsonify, request
-from ..utils.db import query_db, get_db
+from flask import Blueprint, jsonify, request, current_app
+from ..utils.db import query_db, write_db
 import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 incidents_bp = Blueprint('incidents', __name__)
 
-# Mock data for incidents since we don't have a table for it yet
-# In a real app, this would be in the DB
-MOCK_INCIDENTS = [
-    {'id': 1, 'type': 'Stockout', 'severity': 'High', 'description': 'Furniture stock critical in North Region', 'date': '2025-10-15', 'status': 'Open'},
-    {'id': 2, 'type': 'Delay', 'severity': 'Medium', 'description': 'Supplier A delivery delayed by 3 days', 'date': '2025-10-14', 'status': 'Investigating'},
-    {'id': 3, 'type': 'Price', 'severity': 'Low', 'description': 'Competitor price drop detected for Tables', 'date': '2025-10-12', 'status': 'Resolved'}
+# App-owned tables next to the ETL's; etl.py never drops them, so they survive
+# reloads and are shared by every worker process. Comment ids only grow
+# (AUTOINCREMENT), so (chart_id, id) orders a chart's comments by time and
+# doubles as the pagination cursor.
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS incidents (
+        id INTEGER PRIMARY KEY,
+        type TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        description TEXT NOT NULL,
+        date TEXT NOT NULL,
+        status TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_incidents_date ON incidents(date)',
+    '''CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chart_id TEXT,
+        user TEXT NOT NULL,
+        text TEXT NOT NULL,
+        timestamp TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_comments_chart ON comments(chart_id, id)',
+    'CREATE INDEX IF NOT EXISTS idx_comments_timestamp ON comments(timestamp)',
+]
+
+# Seeded once into an empty incidents table
+SEED_INCIDENTS = [
+    (1, 'Stockout', 'High', 'Furniture stock critical in North Region', '2025-10-15', 'Open'),
+    (2, 'Delay', 'Medium', 'Supplier A delivery delayed by 3 days', '2025-10-14', 'Investigating'),
+    (3, 'Price', 'Low', 'Competitor price drop detected for Tables', '2025-10-12', 'Resolved')
 ]
 
-MOCK_COMMENTS = []
+COMMENT_COLUMNS = 'id, user, text, chart_id, timestamp'
+
+# Wakes this process's long-polls on a new comment; inserts made by other
+# workers are picked up by re-checking the table every poll interval
+new_comment = threading.Condition()
+
+def init_store(app):
+    try:
+        with app.app_context(), write_db() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            if conn.execute('SELECT 1 FROM incidents LIMIT 1').fetchone() is None:
+                conn.executemany('INSERT INTO incidents VALUES (?, ?, ?, ?, ?, ?)', SEED_INCIDENTS)
+    except Exception:
+        logger.exception("Could not create the incidents/comments tables")
+
+def insert_comments(items):
+    # One transaction for the whole batch. Under the write lock (and SQLite's
+    # own write lock across processes) the new ids are consecutive.
+    timestamp = datetime.datetime.now().isoformat()
+    rows = [('Supply Chain Mgr', item['text'], item.get('chart_id'), timestamp) for item in items] # Mock user
+    with write_db() as conn:
+        conn.executemany('INSERT INTO comments (user, text, chart_id, timestamp) VALUES (?, ?, ?, ?)', rows)
+        last = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'comments'").fetchone()[0]
+    with new_comment:
+        new_comment.notify_all()
+    first = last - len(rows) + 1
+    return [
+        {'id': first + i, 'user': user, 'text': text, 'chart_id': chart_id, 'timestamp': ts}
+        for i, (user, text, chart_id, ts) in enumerate(rows)
+    ]
+
+def fetch_comments(chart_id, after, limit):
+    # Oldest first from the cursor; one extra row tells whether there is more
+    query = f'SELECT {COMMENT_COLUMNS} FROM comments WHERE id > ?'
+    params = [after]
+    if chart_id:
+        query += ' AND chart_id = ?'
+        params.append(chart_id)
+    rows = query_db(query + ' ORDER BY id LIMIT ?', params + [limit + 1])
+    comments = [dict(row) for row in rows[:limit]]
+    return {
+        'comments': comments,
+        'cursor': comments[-1]['id'] if comments else after,
+        'has_more': len(rows) > limit
+    }
+
+def page_args():
+    # (chart_id, after, limit) from the query string; ValueError unless after/limit are integers
+    limit = min(int(request.args.get('limit', current_app.config['COMMENTS_PAGE_SIZE'])), current_app.config['COMMENTS_MAX_PAGE'])
+    return request.args.get('chart_id'), max(int(request.args.get('after', 0)), 0), max(limit, 1)
+
+def invalid_page():
+    return jsonify({'error': 'after and limit must be integers, timeout a non-negative number'}), 400
 
 @incidents_bp.route('/incidents-log', methods=['GET'])
 def get_incidents():
-    return jsonify(MOCK_INCIDENTS)
+    rows = query_db('SELECT id, type, severity, description, date, status FROM incidents ORDER BY date DESC, id')
+    return jsonify([dict(row) for row in rows])
 
 @incidents_bp.route('/comments', methods=['GET', 'POST'])
 def handle_comments():
     if request.method == 'POST':
-        data = request.get_json()
-        comment = {
-            'id': len(MOCK_COMMENTS) + 1,
-            'user': 'Supply Chain Mgr', # Mock user
-            'text': data.get('text'),
-            'chart_id': data.get('chart_id'),
-            'timestamp': datetime.datetime.now().isoformat()
-        }
-        MOCK_COMMENTS.append(comment)
-        return jsonify(comment), 201
-        
-    return jsonify(MOCK_COMMENTS)
+        # A single comment, or a list of them inserted as one batch
+        data = request.get_json(silent=True)
+        items = data if isinstance(data, list) else [data]
+        if not items or len(items) > current_app.config['COMMENTS_MAX_BATCH']:
+            return jsonify({'error': 'Empty or oversized batch'}), 400
+        if not all(isinstance(item, dict) and isinstance(item.get('text'), str) and item['text'].strip() for item in items):
+            return jsonify({'error': 'Every comment needs a non-empty text'}), 400
+        if not all(isinstance(item.get('chart_id'), (str, type(None))) for item in items):
+            return jsonify({'error': 'chart_id must be a string'}), 400
+        comments = insert_comments(items)
+        return jsonify(comments if isinstance(data, list) else comments[0]), 201
+
+    # ?chart_id= filters, ?after=<cursor> continues from a previous page
+    try:
+        args = page_args()
+    except ValueError:
+        return invalid_page()
+    return jsonify(fetch_comments(*args))
+
+@incidents_bp.route('/comments/feed', methods=['GET'])
+def comments_feed():
+    # Long-poll: returns as soon as comments newer than ?after= exist, or an
+    # empty page (same cursor) after ?timeout= seconds
+    try:
+        chart_id, after, limit = page_args()
+        timeout = float(request.args.get('timeout', 25))
+        if not timeout >= 0: # also rejects nan
+            raise ValueError(timeout)
+    except ValueError:
+        return invalid_page()
+    timeout = min(timeout, current_app.config['COMMENTS_POLL_TIMEOUT'])
+    interval = current_app.config['COMMENTS_POLL_INTERVAL']
+    deadline = time.monotonic() + timeout
+    while True:
+        page = fetch_comments(chart_id, after, limit)
+        remaining = deadline - time.monotonic()
+        if page['comments'] or remaining <= 0:
+            return jsonify(page)
+        with new_comment:
+            new_comment.wait(min(interval, remaining))
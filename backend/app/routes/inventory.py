@@ -1,69 +1,180 @@
 from flask import Blueprint, jsonify, request
-import pulp
-from ..utils.db import query_db
+import functools
+import math
+import threading
+import time
+import numpy as np
+from ..utils.db import query_db, query_orders
+from ..utils.cache import cached
+from ..utils.offload import analytics_pool
+from ..utils.responses import table
+from ..utils.metrics import stage
 
 inventory_bp = Blueprint('inventory', __name__)
 
-@inventory_bp.route('/inventory-optimize', methods=['GET'])
-def optimize_inventory():
-    # Simplified Multi-Echelon Inventory Optimization
-    # Minimize Total Cost = Holding Cost + Ordering Cost + Shortage Cost
-    # Subject to: Service Level > 95%
-    
-    # Mock Data for Optimization
-    # In real app, fetch from DB
-    warehouses = ['WH_North', 'WH_South', 'WH_East', 'WH_West']
-    stores = [f'Store_{i}' for i in range(1, 11)]
-    
-    demand = {s: 100 for s in stores} # Avg daily demand
-    holding_cost = 0.5 # per unit per day
-    ordering_cost = 50 # per order
-    capacity = {w: 5000 for w in warehouses}
-    
+WAREHOUSES = ['WH_North', 'WH_South', 'WH_East', 'WH_West']
+WAREHOUSE_CAPACITY = 5000 # units per day
+LOCAL_COST = 2 # per unit, warehouse in the store's main region
+REMOTE_COST = 5
+
+def load_network(start_date, end_date):
+    # Avg daily demand per store, and the region each store sells most in
+    rows = query_orders(
+        [('Quantity', 'quantity')], start_date, end_date,
+        group_by=['Store_ID', 'Region'], order_by='Store_ID, Region'
+    )
+    days = query_db("SELECT julianday(?) - julianday(?) + 1 as days", [end_date, start_date], one=True)['days'] or 1
+
+    totals, home = {}, {}
+    for row in rows:
+        store = f"Store_{row['Store_ID']}"
+        totals[store] = totals.get(store, 0) + row['Quantity']
+        if row['Quantity'] > home.get(store, (None, -1))[1]:
+            home[store] = (row['Region'], row['Quantity'])
+
+    stores = tuple(totals)
+    # Shipments are whole units, so covering demand d needs ceil(d) units;
+    # integer demand keeps the LP's optimal vertex integral.
+    demand = tuple(math.ceil(totals[s] / days) for s in stores)
+    costs = tuple(
+        tuple(LOCAL_COST if w.split('_')[1] == home[s][0] else REMOTE_COST for s in stores)
+        for w in WAREHOUSES
+    )
+    return stores, demand, costs
+
+def solve_lp(demand, capacity, costs):
+    # Transportation problem as an LP. Its constraint matrix is totally
+    # unimodular, so with integer demand/capacity the simplex vertex is integral.
+    # Solver libraries are imported here, in the analytics pool's processes.
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    n_w, n_s = len(capacity), len(demand)
+    c = np.asarray(costs, dtype=float).ravel() # x[w, s] flattened row-major
+
+    var = np.arange(n_w * n_s)
+    # -sum_w x[w, s] <= -demand[s]
+    demand_rows = var % n_s
+    # sum_s x[w, s] <= capacity[w]
+    capacity_rows = n_s + var // n_s
+    A = coo_matrix((
+        np.concatenate([-np.ones(n_w * n_s), np.ones(n_w * n_s)]),
+        (np.concatenate([demand_rows, capacity_rows]), np.concatenate([var, var]))
+    ), shape=(n_s + n_w, n_w * n_s)).tocsr()
+    b = np.concatenate([-np.asarray(demand, dtype=float), np.asarray(capacity, dtype=float)])
+
+    res = linprog(c, A_ub=A, b_ub=b, bounds=(0, None), method='highs-ds')
+    if res.status == 2:
+        return 'Infeasible', None, None
+    if res.status != 0:
+        return 'Not Solved', None, None
+    return 'Optimal', res.x.reshape(n_w, n_s), res.fun
+
+def solve_cbc(demand, capacity, costs):
+    import pulp
+
+    n_w, n_s = len(capacity), len(demand)
+
     # Create Problem
     prob = pulp.LpProblem("Inventory_Optimization", pulp.LpMinimize)
-    
+
     # Variables
     # x[w][s] = amount shipped from warehouse w to store s
-    x = pulp.LpVariable.dicts("ship", (warehouses, stores), lowBound=0, cat='Integer')
-    
+    x = pulp.LpVariable.dicts("ship", (range(n_w), range(n_s)), lowBound=0, cat='Integer')
+
     # Objective Function: Minimize Transport Cost (proxy for total cost here)
-    # Cost matrix (mock)
-    costs = {}
-    for w in warehouses:
-        costs[w] = {}
-        for s in stores:
-            costs[w][s] = 2 if w.split('_')[1] in s else 5 # Cheaper if same region (mock logic)
-            
-    prob += pulp.lpSum([x[w][s] * costs[w][s] for w in warehouses for s in stores])
-    
+    prob += pulp.lpSum([x[w][s] * costs[w][s] for w in range(n_w) for s in range(n_s)])
+
     # Constraints
     # 1. Demand Satisfaction
-    for s in stores:
-        prob += pulp.lpSum([x[w][s] for w in warehouses]) >= demand[s]
-        
+    for s in range(n_s):
+        prob += pulp.lpSum([x[w][s] for w in range(n_w)]) >= demand[s]
+
     # 2. Warehouse Capacity
-    for w in warehouses:
-        prob += pulp.lpSum([x[w][s] for s in stores]) <= capacity[w]
-        
+    for w in range(n_w):
+        prob += pulp.lpSum([x[w][s] for s in range(n_s)]) <= capacity[w]
+
     # Solve
     prob.solve(pulp.PULP_CBC_CMD(msg=False))
-    
+
+    flows = np.array([[x[w][s].varValue or 0 for s in range(n_s)] for w in range(n_w)])
+    return pulp.LpStatus[prob.status], flows, pulp.value(prob.objective)
+
+def solve(demand, capacity, costs):
+    # Runs in the analytics process pool; CBC only runs if the LP relaxation
+    # comes back fractional, i.e. when integrality actually matters.
+    start = time.perf_counter()
+    status, flows, cost = solve_lp(demand, capacity, costs)
+    solver = 'lp'
+    if status == 'Optimal' and not np.allclose(flows, np.round(flows), atol=1e-6):
+        status, flows, cost = solve_cbc(demand, capacity, costs)
+        solver = 'cbc'
+    elif flows is not None:
+        flows = np.round(flows)
+    return status, flows, cost, solver, (time.perf_counter() - start) * 1000
+
+_solve_state = threading.local()
+
+@functools.lru_cache(maxsize=128)
+def memo_solve(demand, capacity, costs):
+    # Memoized on the (hashable) inputs; the body only runs on a miss
+    _solve_state.missed = True
+    return analytics_pool.run(solve, demand, capacity, costs)
+
+def solve_network(demand, capacity, costs):
+    # Solver result plus whether it came from the memo
+    _solve_state.missed = False
+    result = memo_solve(demand, capacity, costs)
+    return result, not _solve_state.missed
+
+@inventory_bp.route('/inventory-optimize', methods=['GET'])
+@cached
+def optimize_inventory():
+    # Simplified Multi-Echelon Inventory Optimization
+    # Minimize transport cost from warehouses to stores
+    # Subject to: store avg daily demand met, warehouse capacity
+    start_date = request.args.get('start_date', '2023-01-01')
+    end_date = request.args.get('end_date', '2025-12-31')
+    try:
+        capacity = int(request.args.get('capacity', WAREHOUSE_CAPACITY))
+        if capacity < 1:
+            raise ValueError(capacity)
+    except ValueError:
+        return jsonify({'error': 'capacity must be a positive integer'}), 400
+    capacity = tuple([capacity] * len(WAREHOUSES))
+
+    stores, demand, costs = load_network(start_date, end_date)
+    if not stores:
+        # No orders in the range: nothing to ship
+        return jsonify({
+            'status': 'No demand',
+            'total_cost': 0.0,
+            'network_flow': [],
+            'solver': None,
+            'solve_ms': 0,
+            'cached': False,
+            'service_level': '98.5%' # Mocked derived metric
+        })
+
+    with stage('solver'):
+        (status, flows, cost, solver, solve_ms), hit = solve_network(demand, capacity, costs)
+
     # Format Result
     network_flow = []
-    for w in warehouses:
-        for s in stores:
-            val = x[w][s].varValue
-            if val > 0:
-                network_flow.append({
-                    'source': w,
-                    'target': s,
-                    'value': val
-                })
-                
+    if flows is not None:
+        w, s = np.nonzero(flows > 0)
+        network_flow = table({
+            'source': np.asarray(WAREHOUSES)[w],
+            'target': np.asarray(stores)[s],
+            'value': flows[w, s].astype(np.float64)
+        })
+
     return jsonify({
-        'status': pulp.LpStatus[prob.status],
-        'total_cost': pulp.value(prob.objective),
+        'status': status,
+        'total_cost': float(cost) if cost is not None else None,
         'network_flow': network_flow,
+        'solver': solver,
+        'solve_ms': 0 if hit else round(solve_ms, 2),
+        'cached': hit,
         'service_level': '98.5%' # Mocked derived metric
     })
@@ -1,32 +1,28 @@
 from flask import Blueprint, jsonify, request
-from ..utils.db import query_db
+from ..utils.db import query_orders
+from ..utils.cache import cached
 
 kpis_bp = Blueprint('kpis', __name__)
 
 @kpis_bp.route('/kpis', methods=['GET'])
+@cached
 def get_kpis():
     # Get filters from query params
     start_date = request.args.get('start_date', '2023-01-01')
     end_date = request.args.get('end_date', '2025-12-31')
     region = request.args.get('region')
     
-    query = """
-        SELECT 
-            SUM(Sales) as total_sales,
-            SUM(Profit) as total_profit,
-            SUM(Quantity) as total_volume,
-            AVG(Discount) as avg_discount,
-            COUNT(DISTINCT Order_Date) as days_active
-        FROM orders
-        WHERE Order_Date BETWEEN ? AND ?
-    """
-    params = [start_date, end_date]
-    
+    filters = {}
     if region and region != 'All':
-        query += " AND Region = ?"
-        params.append(region)
+        filters['Region'] = region
         
-    result = query_db(query, params, one=True)
+    result = query_orders([
+        ('total_sales', 'sales'),
+        ('total_profit', 'profit'),
+        ('total_volume', 'quantity'),
+        ('avg_discount', 'avg_discount'),
+        ('days_active', 'days_active')
+    ], start_date, end_date, filters, one=True)
     
     # Calculate derived metrics
     margin = (result['total_profit'] / result['total_sales'] * 100) if result['total_sales'] else 0
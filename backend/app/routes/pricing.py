@@ -1,49 +1,48 @@
 from flask import Blueprint, jsonify, request
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from ..utils.db import query_db
+from ..utils.db import query_db, get_db
+from ..utils.cache import cached
+from ..utils.responses import table, not_built, precomputed
+from ..services.elasticity import fits_status
 
 pricing_bp = Blueprint('pricing', __name__)
 
 @pricing_bp.route('/pricing-elasticity', methods=['GET'])
+@cached
 def get_pricing_elasticity():
-    # Calculate Price Elasticity of Demand (PED)
-    # PED = % Change in Quantity / % Change in Price
-    
-    # Fetch historical price/quantity data
-    data = query_db("""
-        SELECT Sales/Quantity as Price, Quantity
-        FROM orders
-        WHERE Quantity > 0 AND Sales > 0
-        LIMIT 1000
-    """)
-    
-    prices = np.array([row['Price'] for row in data]).reshape(-1, 1)
-    quantities = np.array([row['Quantity'] for row in data])
-    
-    # Train simple Linear Regression on the fly (fast enough for 1000 rows)
-    model = LinearRegression()
-    model.fit(prices, quantities)
-    
-    slope = model.coef_[0]
-    intercept = model.intercept_
-    
-    # Generate Demand Curve points
-    price_range = np.linspace(min(prices), max(prices), 20)
-    demand_curve = []
-    
-    for p in price_range:
-        q = slope * p + intercept
-        elasticity = slope * (p / q) if q != 0 else 0
-        demand_curve.append({
-            'price': round(float(p), 2),
-            'predicted_quantity': max(0, round(float(q), 1)),
-            'elasticity': round(float(elasticity), 2)
-        })
-        
-    return jsonify({
-        'slope': round(float(slope), 4),
-        'intercept': round(float(intercept), 2),
-        'demand_curve': demand_curve,
-        'recommendation': 'Decrease price' if slope < -0.5 else 'Maintain price'
+    # Price Elasticity of Demand (PED) from a log-log fit:
+    # log(Quantity) = intercept + elasticity * log(Price)
+    # segment: 'All' (default), 'Category:<name>', 'Sub_Category:<name>' or 'Region:<name>'
+    # Fits are precomputed by etl.py after each load; GET handlers only read them.
+    status = fits_status(get_db())
+    if status is None:
+        return not_built('Price elasticity fits')
+
+    segment = request.args.get('segment', 'All')
+    fit = query_db("SELECT * FROM price_elasticity WHERE Segment = ?", [segment], one=True)
+    if fit is None:
+        available = [row['Segment'] for row in query_db("SELECT Segment FROM price_elasticity ORDER BY Level, Value")]
+        return jsonify({'error': 'Unknown segment', 'segments': available}), 400
+
+    slope = fit['Elasticity']
+    intercept = fit['Intercept']
+
+    # Generate Demand Curve points; constant elasticity along a log-log curve
+    price_range = np.linspace(fit['Min_Price'], fit['Max_Price'], 20)
+    quantities = np.exp(intercept) * price_range ** slope
+    demand_curve = table({
+        'price': np.round(price_range, 2),
+        'predicted_quantity': np.round(quantities, 1),
+        'elasticity': np.full(len(price_range), round(slope, 2))
     })
+
+    return precomputed({
+        'segment': segment,
+        'slope': round(slope, 4),
+        'intercept': round(intercept, 2),
+        'ci_low': round(fit['CI_Low'], 4),
+        'ci_high': round(fit['CI_High'], 4),
+        'observations': fit['N'],
+        'demand_curve': demand_curve,
+        'recommendation': 'Decrease price' if fit['CI_High'] < -1 else 'Maintain price' # Only when confidently elastic
+    }, status)
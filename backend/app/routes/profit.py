@@ -1,57 +1,51 @@
 from flask import Blueprint, jsonify, request
-from ..utils.db import query_db
+import numpy as np
+from ..utils.db import query_orders
+from ..utils.cache import cached
+from ..utils.responses import table
 
 profit_bp = Blueprint('profit', __name__)
 
 @profit_bp.route('/profit-diagnostic', methods=['GET'])
+@cached
 def get_profit_diagnostic():
     start_date = request.args.get('start_date', '2023-01-01')
     end_date = request.args.get('end_date', '2025-12-31')
     
     # Waterfall Chart Data (Simplified)
     # Revenue -> COGS -> Discounts -> Promo Cost -> Net Profit
+    # Rounded to cents so rollup and raw scans agree exactly
     
-    totals = query_db("""
-        SELECT 
-            SUM(Sales) as Revenue,
-            SUM(Sales) * 0.6 as COGS, -- Approx 60% COGS
-            SUM(Sales * Discount) as Discounts,
-            SUM(CASE WHEN Is_Promo = 1 THEN Sales * 0.1 ELSE 0 END) as Promo_Cost,
-            SUM(Profit) as Net_Profit
-        FROM orders
-        WHERE Order_Date BETWEEN ? AND ?
-    """, [start_date, end_date], one=True)
+    totals = query_orders([
+        ('Revenue', 'sales'),
+        ('COGS', 'cogs'), # Approx 60% COGS
+        ('Discounts', 'discounts'),
+        ('Promo_Cost', 'promo_cost'),
+        ('Net_Profit', 'profit')
+    ], start_date, end_date, one=True)
     
     waterfall = [
-        {'label': 'Gross Revenue', 'value': totals['Revenue'], 'type': 'positive'},
-        {'label': 'COGS', 'value': -totals['COGS'], 'type': 'negative'},
-        {'label': 'Discounts', 'value': -totals['Discounts'], 'type': 'negative'},
-        {'label': 'Promo Impact', 'value': -totals['Promo_Cost'], 'type': 'negative'},
-        {'label': 'Net Profit', 'value': totals['Net_Profit'], 'type': 'total'}
+        {'label': 'Gross Revenue', 'value': round(totals['Revenue'] or 0, 2), 'type': 'positive'},
+        {'label': 'COGS', 'value': -round(totals['COGS'] or 0, 2), 'type': 'negative'},
+        {'label': 'Discounts', 'value': -round(totals['Discounts'] or 0, 2), 'type': 'negative'},
+        {'label': 'Promo Impact', 'value': -round(totals['Promo_Cost'] or 0, 2), 'type': 'negative'},
+        {'label': 'Net Profit', 'value': round(totals['Net_Profit'] or 0, 2), 'type': 'total'}
     ]
     
     # Pareto Analysis (80/20 Rule) by Sub-Category
-    pareto_data = query_db("""
-        SELECT 
-            Sub_Category,
-            SUM(Profit) as Profit
-        FROM orders
-        WHERE Order_Date BETWEEN ? AND ?
-        GROUP BY 1
-        ORDER BY Profit DESC
-    """, [start_date, end_date])
+    pareto_data = query_orders(
+        [('Profit', 'profit')], start_date, end_date,
+        group_by=['Sub_Category'], order_by='Profit DESC'
+    )
     
-    pareto = []
-    cumulative_profit = 0
+    categories, profits = zip(*pareto_data) if pareto_data else ((), ())
+    profits = np.asarray(profits, dtype=np.float64)
     total_profit = totals['Net_Profit'] or 1
-    
-    for row in pareto_data:
-        cumulative_profit += row['Profit']
-        pareto.append({
-            'category': row['Sub_Category'],
-            'profit': row['Profit'],
-            'cumulative_percentage': round((cumulative_profit / total_profit) * 100, 1)
-        })
+    pareto = table({
+        'category': categories,
+        'profit': np.round(profits, 2),
+        'cumulative_percentage': np.round(np.cumsum(profits) / total_profit * 100, 1)
+    })
         
     return jsonify({
         'waterfall': waterfall,
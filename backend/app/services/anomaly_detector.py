@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ALL = 'All'
+
+def series_key(region=None, category=None):
+    return f"{region or ALL}|{category or ALL}"
+
+def robust_z(history, new, window):
+    # Score each new value against the median/MAD of the `window` values before
+    # it. NaN until a series has a full window of history.
+    values = np.concatenate([history, new])
+    out = np.full(len(new), np.nan)
+    if len(values) <= window:
+        return out
+
+    windows = sliding_window_view(values[:-1], window) # windows[i] precedes values[i + window]
+    median = np.median(windows, axis=1)
+    mad = np.median(np.abs(windows - median[:, None]), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = 0.6745 * (values[window:] - median) / np.where(mad > 0, mad, np.nan)
+
+    # values[p] for p >= window has its score at z[p - window]
+    positions = np.arange(len(history), len(values)) - window
+    valid = positions >= 0
+    out[valid] = z[positions[valid]]
+    return out
+
+class StreamingAnomalyDetector:
+    # Rolling robust z-scores over daily Sales for the global total and every
+    # Region, Category and Region x Category series. Seeded once from the full
+    # history, then only fed days after `last_date` (reseeded when a load
+    # changes earlier days); state lives in a JSON file so restarts pick up
+    # where they left off.
+
+    def __init__(self, path, window=28, threshold=3.5, high_threshold=5.0):
+        self.path = path
+        self.window = window
+        self.threshold = threshold
+        self.high_threshold = high_threshold
+        self.lock = threading.Lock()
+        self.reset()
+        self.load()
+
+    def reset(self):
+        self.last_date = None
+        self.data_version = None
+        self.base_version = None
+        self.history_version = None
+        self.series = {} # key -> {'tail': [...], 'anomalies': [[date, value, z], ...]}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('window') != self.window or state.get('threshold') != self.threshold:
+            return # Parameters changed, reseed
+        self.last_date = state['last_date']
+        self.data_version = state['data_version']
+        self.base_version = state['base_version']
+        self.history_version = state.get('history_version')
+        self.series = state['series']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                'window': self.window,
+                'threshold': self.threshold,
+                'last_date': self.last_date,
+                'data_version': self.data_version,
+                'base_version': self.base_version,
+                'history_version': self.history_version,
+                'series': self.series
+            }, f)
+        os.replace(tmp, self.path)
+
+    def update(self, daily):
+        # daily: DataFrame of Order_Date, Region, Category, Sales for days > last_date
+        if daily.empty:
+            return
+        frames = {series_key(): daily.groupby('Order_Date')['Sales'].sum()}
+        for region, s in daily.groupby(['Order_Date', 'Region'])['Sales'].sum().unstack().items():
+            frames[series_key(region=region)] = s.dropna()
+        for category, s in daily.groupby(['Order_Date', 'Category'])['Sales'].sum().unstack().items():
+            frames[series_key(category=category)] = s.dropna()
+        for (region, category), s in daily.groupby(['Order_Date', 'Region', 'Category'])['Sales'].sum().unstack([1, 2]).items():
+            frames[series_key(region, category)] = s.dropna()
+
+        for key, s in frames.items():
+            state = self.series.setdefault(key, {'tail': [], 'anomalies': []})
+            values = s.to_numpy(dtype=float)
+            z = robust_z(np.asarray(state['tail'], dtype=float), values, self.window)
+            flagged = np.abs(np.nan_to_num(z)) > self.threshold
+            state['anomalies'].extend(
+                [d, v, round(score, 2)]
+                for d, v, score in zip(s.index[flagged].tolist(), values[flagged].tolist(), z[flagged].tolist())
+            )
+            state['tail'] = (state['tail'] + values.tolist())[-self.window:]
+
+        self.last_date = max(self.last_date or '', daily['Order_Date'].max())
+
+    def anomalies(self, key):
+        state = self.series.get(key)
+        if state is None:
+            return None
+        # Column arrays; the route shapes them into rows (or not)
+        dates, values, scores = zip(*state['anomalies']) if state['anomalies'] else ((), (), ())
+        scores = np.asarray(scores, dtype=np.float64)
+        return {
+            'date': [date[:10] for date in dates],
+            'value': np.asarray(values, dtype=np.float64),
+            'score': scores,
+            'type': np.where(scores > 0, 'Sales Spike', 'Sales Drop'),
+            'severity': np.where(np.abs(scores) > self.high_threshold, 'High', 'Medium')
+        }
@@ -0,0 +1,102 @@
+import importlib.util
+import os
+import sqlite3
+import numpy as np
+
+# Columnar store is optional; callers fall back to SQLite. pyarrow (and
+# pandas) are only imported by the first read, keeping app startup light.
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Month-partitioned Parquet copy of `orders` written by etl.py
+# (<dir>/Order_Month=YYYY-MM/part-0.parquet) plus a marker file holding the
+# data_version it was exported from.
+PARQUET_DIR = 'backend/data/orders_parquet'
+VERSION_FILE = '_data_version'
+STRING_COLUMNS = ['Region', 'Segment', 'Ship_Mode', 'Category', 'Sub_Category']
+# Rows per record batch for full scans (iter_batches)
+BATCH_ROWS = 65536
+
+def dataset_version(path=PARQUET_DIR):
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def stored_version(conn):
+    # data_version of the rows currently in SQLite
+    try:
+        row = conn.execute("SELECT value FROM etl_state WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def is_current(path, data_version):
+    # Usable only if it was exported from the data currently in SQLite
+    return HAVE_PYARROW and data_version is not None and dataset_version(path) == str(data_version)
+
+def read_columns(path, columns, filters=None):
+    # Only the requested columns, memory-mapped. Numeric columns come back as
+    # numpy arrays (zero-copy when a column is a single chunk without nulls),
+    # string columns as pandas Categoricals built from the Parquet dictionaries.
+    import pyarrow.parquet as pq
+
+    strings = [c for c in columns if c in STRING_COLUMNS]
+    table = pq.read_table(
+        path,
+        columns=columns,
+        filters=filters,
+        memory_map=True,
+        read_dictionary=strings,
+        partitioning='hive'
+    )
+    return to_columns(table, columns, strings)
+
+def to_columns(table, columns, strings):
+    out = {}
+    for name in columns:
+        column = table.column(name)
+        if name in strings:
+            out[name] = column.to_pandas().astype('category').array
+        elif column.num_chunks == 1:
+            out[name] = column.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            out[name] = column.to_numpy()
+    return out
+
+def iter_batches(path, columns, batch_rows=BATCH_ROWS):
+    # read_columns in record batches of at most batch_rows, month partitions
+    # oldest first, so a full scan holds the same few MB however large the
+    # data set (or a single month) grows. Yields (month, columns).
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    strings = [c for c in columns if c in STRING_COLUMNS]
+    for name in sorted(os.listdir(path)):
+        if not name.startswith('Order_Month='):
+            continue
+        partition = os.path.join(path, name)
+        for file in sorted(os.listdir(partition)):
+            if not file.endswith('.parquet'):
+                continue
+            parquet = pq.ParquetFile(os.path.join(partition, file), memory_map=True, read_dictionary=strings)
+            for batch in parquet.iter_batches(batch_size=batch_rows, columns=columns):
+                yield name[len('Order_Month='):], to_columns(pa.Table.from_batches([batch]), columns, strings)
+
+def month_filter(start_date=None, end_date=None):
+    # Partition pruning on Order_Month for a date range
+    filters = []
+    if start_date:
+        filters.append(('Order_Month', '>=', start_date[:7]))
+    if end_date:
+        filters.append(('Order_Month', '<=', end_date[:7]))
+    return filters or None
+
+def category_codes(values):
+    # (codes, labels) for a Categorical or any array of labels
+    import pandas as pd
+
+    if isinstance(values, pd.Categorical):
+        return values.codes.astype(np.int64), list(values.categories)
+    labels, codes = np.unique(np.asarray(values), return_inverse=True)
+    return codes, labels.tolist()
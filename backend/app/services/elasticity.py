@@ -0,0 +1,178 @@
+import sqlite3
+import numpy as np
+
+try:
+    from .columnar import PARQUET_DIR, is_current, stored_version, iter_batches, category_codes
+except ImportError: # run as a script
+    from columnar import PARQUET_DIR, is_current, stored_version, iter_batches, category_codes
+
+# Config
+DB_PATH = 'backend/data/superstore_enhanced.db'
+LEVELS = ['Category', 'Sub_Category', 'Region']
+N_BLOCKS = 64 # random row blocks per segment, resampled by the bootstrap
+N_BOOTSTRAP = 500
+CHUNK_SIZE = 500000
+
+def segment_name(level, value):
+    return 'All' if level is None else f'{level}:{value}'
+
+def accumulate(levels, price, quantity, stats, rng):
+    # Adds one chunk's per-(segment, block) sufficient statistics for the
+    # log-log fit: n, Σx, Σy, Σxx, Σxy with x = log(price), y = log(quantity),
+    # plus price sum/min/max for the demand curve. levels: {level: (codes, labels)}
+    price = np.asarray(price, dtype=float)
+    x, y = np.log(price), np.log(np.asarray(quantity, dtype=float))
+    block = rng.integers(0, N_BLOCKS, len(price))
+    values = np.column_stack([np.ones_like(x), x, y, x * x, x * y, price])
+
+    groupings = [(None, np.zeros(len(price), dtype=np.int64), ['All'])]
+    for level in LEVELS:
+        codes, labels = levels[level]
+        groupings.append((level, codes, labels))
+
+    for level, codes, labels in groupings:
+        flat = codes * N_BLOCKS + block
+        size = len(labels) * N_BLOCKS
+        sums = np.column_stack([np.bincount(flat, weights=v, minlength=size) for v in values.T])
+        sums = sums.reshape(len(labels), N_BLOCKS, values.shape[1])
+        low = np.full(len(labels), np.inf)
+        high = np.full(len(labels), -np.inf)
+        np.minimum.at(low, codes, price)
+        np.maximum.at(high, codes, price)
+
+        for g, label in enumerate(labels):
+            if not sums[g, :, 0].any(): # dictionary label with no rows in this chunk
+                continue
+            key = segment_name(level, label)
+            if key not in stats:
+                stats[key] = {'level': level or 'All', 'value': label, 'sums': np.zeros((N_BLOCKS, values.shape[1])), 'min': np.inf, 'max': -np.inf}
+            entry = stats[key]
+            entry['sums'] += sums[g]
+            entry['min'] = min(entry['min'], low[g])
+            entry['max'] = max(entry['max'], high[g])
+
+def ols(s):
+    # Closed-form simple regression from sufficient statistics (last axis)
+    n, sx, sy, sxx, sxy = (s[..., i] for i in range(5))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    return slope, (sy - slope * sx) / n
+
+def fit_segments(stats, seed=42):
+    keys = list(stats)
+    sums = np.stack([stats[k]['sums'] for k in keys]) # (segments, blocks, stats)
+    slope, intercept = ols(sums.sum(axis=1))
+
+    # Block bootstrap: resample the random blocks with replacement, all
+    # replicates and segments at once.
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(N_BLOCKS, np.full(N_BLOCKS, 1 / N_BLOCKS), size=N_BOOTSTRAP)
+    boot_slope, _ = ols(np.einsum('bk,gkf->gbf', weights, sums))
+    ci_low, ci_high = np.nanpercentile(boot_slope, [2.5, 97.5], axis=1)
+
+    return [
+        (
+            key, stats[key]['level'], stats[key]['value'], int(sums[i, :, 0].sum()),
+            float(intercept[i]), float(slope[i]), float(ci_low[i]), float(ci_high[i]),
+            float(sums[i, :, 5].sum() / sums[i, :, 0].sum()), float(stats[key]['min']), float(stats[key]['max'])
+        )
+        for i, key in enumerate(keys)
+    ]
+
+def fits_current(conn):
+    # True when `price_elasticity` was fitted on the currently loaded data
+    try:
+        state = dict(conn.execute('SELECT key, value FROM etl_state').fetchall())
+        conn.execute('SELECT 1 FROM price_elasticity LIMIT 1')
+    except sqlite3.OperationalError:
+        return False
+    return 'elasticity_version' in state and state['elasticity_version'] == state.get('data_version')
+
+def scan_sqlite(conn, stats, rng):
+    # Stream the whole table in chunks; memory is bounded by the statistics
+    cur = conn.execute(f"""
+        SELECT {', '.join(LEVELS)}, Sales / Quantity as Price, Quantity
+        FROM orders
+        WHERE Quantity > 0 AND Sales > 0
+    """)
+    while True:
+        chunk = cur.fetchmany(CHUNK_SIZE)
+        if not chunk:
+            break
+        columns = list(zip(*chunk))
+        levels = {level: category_codes(columns[i]) for i, level in enumerate(LEVELS)}
+        accumulate(levels, columns[len(LEVELS)], columns[len(LEVELS) + 1], stats, rng)
+
+def scan_columnar(path, stats, rng):
+    # Same statistics from the memory-mapped Parquet columns, no row tuples,
+    # one record batch at a time
+    for _, data in iter_batches(path, LEVELS + ['Sales', 'Quantity']):
+        levels = {level: category_codes(data[level]) for level in LEVELS}
+        sales, quantity = data['Sales'], data['Quantity']
+        keep = (quantity > 0) & (sales > 0)
+        batch_levels = {level: (codes[keep], labels) for level, (codes, labels) in levels.items()}
+        accumulate(batch_levels, sales[keep] / quantity[keep], quantity[keep], stats, rng)
+
+def fits_status(conn):
+    # 'current', 'stale' (fitted on an earlier load, until etl.py refreshes
+    # it) or None when `price_elasticity` was never built
+    if fits_current(conn):
+        return 'current'
+    try:
+        conn.execute('SELECT 1 FROM price_elasticity LIMIT 1')
+    except sqlite3.OperationalError:
+        return None
+    return 'stale'
+
+def build_elasticity_table(conn, seed=42, parquet_dir=PARQUET_DIR):
+    # Fit the load seen on entry, then replace `price_elasticity` in one write
+    # transaction: readers see the old or the new fits, never a missing table,
+    # and concurrent builders queue on the lock. Returns the number of segments
+    # fitted, or None when another builder already stored fits for this load
+    # (or a newer load superseded it) while this one was scanning.
+    version = stored_version(conn)
+    rng = np.random.default_rng(seed)
+    stats = {}
+    if parquet_dir and is_current(parquet_dir, version):
+        scan_columnar(parquet_dir, stats, rng)
+    else:
+        scan_sqlite(conn, stats, rng)
+    fits = fit_segments(stats, seed) if stats else []
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if stored_version(conn) != version or fits_current(conn):
+            conn.execute('ROLLBACK')
+            return None
+        conn.execute('DROP TABLE IF EXISTS price_elasticity')
+        conn.execute('''
+            CREATE TABLE price_elasticity (
+                Segment TEXT PRIMARY KEY,
+                Level TEXT,
+                Value TEXT,
+                N INTEGER,
+                Intercept REAL,
+                Elasticity REAL,
+                CI_Low REAL,
+                CI_High REAL,
+                Mean_Price REAL,
+                Min_Price REAL,
+                Max_Price REAL
+            )
+        ''')
+        conn.executemany('INSERT INTO price_elasticity VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', fits)
+        conn.execute('CREATE TABLE IF NOT EXISTS etl_state (key TEXT PRIMARY KEY, value)')
+        conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('elasticity_version', ?)", [version])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return len(fits)
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    count = build_elasticity_table(conn)
+    conn.close()
+    print(f"Fitted {count} segments.")
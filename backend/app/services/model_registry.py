@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import deque
+import numpy as np
+from ..utils.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Written last (atomically) by train_models.py; points at the versioned artifacts
+MANIFEST = 'manifest.json'
+
+# Pickles shipped before the registry existed
+LEGACY_MODEL = 'demand_model.pkl'
+LEGACY_ENCODERS = 'encoders.pkl'
+
+class ModelVersion:
+    def __init__(self, version, model, classes, load_time_ms, intervals=None):
+        self.version = version
+        self.model = model
+        self.classes = classes
+        # Conformal residual quantiles from train_models.py, None for legacy models
+        self.intervals = intervals
+        # {encoder name: {label: code}}, avoids LabelEncoder.transform per request
+        self.codes = {name: {label: i for i, label in enumerate(labels)} for name, labels in classes.items()}
+        self.load_time_ms = load_time_ms
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self.stats = {'predict_calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+    def predict(self, X):
+        with stage('predict') as timer:
+            predictions = self.model.predict(X)
+        elapsed = timer.elapsed * 1000
+        with self._lock:
+            self.stats['predict_calls'] += 1
+            self.stats['rows'] += len(X)
+            self.stats['total_ms'] += elapsed
+            self.stats['max_ms'] = max(self.stats['max_ms'], elapsed)
+        return predictions
+
+    def interval_offsets(self, series_keys):
+        # (len(series_keys), 3) residual quantiles for P10/P50/P90, or None
+        if not self.intervals:
+            return None
+        table = self.intervals['series']
+        return np.array([table.get(key, self.intervals['global']) for key in series_keys], dtype=np.float64)
+
+    def describe(self):
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats['predict_calls']
+        return {
+            'version': self.version,
+            'load_time_ms': round(self.load_time_ms, 2),
+            # Legacy models get the route's fixed +/-20% band until a retrain
+            'intervals': 'conformal' if self.intervals else 'fixed',
+            'interval_coverage': self.intervals['coverage'] if self.intervals else None,
+            'interval_calibration': self.intervals.get('calibration') if self.intervals else None,
+            'loaded_at': self.loaded_at,
+            'predict_calls': calls,
+            'rows': stats['rows'],
+            'avg_predict_ms': round(stats['total_ms'] / calls, 3) if calls else None,
+            'max_predict_ms': round(stats['max_ms'], 3)
+        }
+
+def load_version(model_dir):
+    start = time.perf_counter()
+    manifest_path = os.path.join(model_dir, MANIFEST)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        from xgboost import XGBRegressor
+
+        model = XGBRegressor()
+        model.load_model(os.path.join(model_dir, manifest['model']))
+        with open(os.path.join(model_dir, manifest['encoders'])) as f:
+            classes = json.load(f)
+        intervals = None
+        if manifest.get('intervals'):
+            with open(os.path.join(model_dir, manifest['intervals'])) as f:
+                intervals = json.load(f)
+        version = manifest['version']
+    elif os.path.exists(os.path.join(model_dir, LEGACY_MODEL)):
+        with open(os.path.join(model_dir, LEGACY_MODEL), 'rb') as f:
+            model = pickle.load(f)
+        with open(os.path.join(model_dir, LEGACY_ENCODERS), 'rb') as f:
+            classes = {name: enc.classes_.tolist() for name, enc in pickle.load(f).items()}
+        intervals = None
+        version = 'legacy'
+    else:
+        return None
+
+    return ModelVersion(version, model, classes, (time.perf_counter() - start) * 1000, intervals)
+
+class ModelRegistry:
+    # Holds the serving ModelVersion. Readers grab `current()` once per request;
+    # a reload builds the new version off to the side and swaps the reference,
+    # so in-flight requests finish on the version they started with.
+
+    def __init__(self):
+        self.model_dir = None
+        self.interval = 0
+        self._current = None
+        self._stamp = None
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._retired = deque(maxlen=5)
+        self._watcher = None
+
+    def init_app(self, app):
+        self.model_dir = app.config['MODEL_DIR']
+        self.interval = app.config['MODEL_RELOAD_INTERVAL']
+        # With LAZY_STARTUP the first current() call (or the warm-up) loads it
+        if not app.config['LAZY_STARTUP']:
+            self.reload(force=True)
+        if not app.config['DEFER_BACKGROUND_THREADS']:
+            self.start_watcher()
+
+    def start_watcher(self):
+        if self.interval and self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(self.interval,), daemon=True, name='model-registry')
+            self._watcher.start()
+
+    def after_fork(self):
+        # A forked server worker keeps the preloaded model; the watcher thread
+        # and a possibly held lock don't carry over
+        self._lock = threading.RLock()
+        self._watcher = None
+        self.start_watcher()
+
+    def current(self):
+        if not self._loaded:
+            self.ensure_loaded()
+        return self._current
+
+    def ensure_loaded(self):
+        with self._lock:
+            if not self._loaded:
+                self.reload(force=True)
+
+    def _manifest_stamp(self):
+        try:
+            return os.stat(os.path.join(self.model_dir, MANIFEST)).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self, force=False):
+        with self._lock:
+            stamp = self._manifest_stamp()
+            if not force and stamp == self._stamp:
+                return False
+            version = load_version(self.model_dir)
+            self._stamp = stamp
+            self._loaded = True
+            if version is None:
+                return False
+            if self._current is not None:
+                self._retired.appendleft(self._current)
+            self._current = version
+            logger.info("Loaded demand model %s in %.1f ms", version.version, version.load_time_ms)
+            if not version.intervals:
+                logger.warning("Demand model %s has no calibrated intervals; serving a fixed +/-20%% band until train_models.py is rerun", version.version)
+            return True
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            if not self._loaded:
+                continue
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Model reload failed, keeping the current version")
+
+    def describe(self):
+        current = self.current()
+        return {
+            'current': current.describe() if current else None,
+            'previous': [v.describe() for v in list(self._retired)]
+        }
+
+model_registry = ModelRegistry()
@@ -0,0 +1,186 @@
+import sqlite3
+import numpy as np
+
+try:
+    from .columnar import PARQUET_DIR, is_current, stored_version, iter_batches
+except ImportError: # run as a script
+    from columnar import PARQUET_DIR, is_current, stored_version, iter_batches
+
+# Config
+DB_PATH = 'backend/data/superstore_enhanced.db'
+N_CLUSTERS = 4
+
+# Recency/Frequency/Monetary for every customer in one pass over orders
+RFM_QUERY = """
+    SELECT
+        Customer_ID,
+        MAX(Order_Date) as Last_Order,
+        (SELECT julianday(MAX(Order_Date)) FROM orders) - julianday(MAX(Order_Date)) as Recency,
+        COUNT(DISTINCT Order_Date) as Frequency,
+        SUM(Sales) as Monetary
+    FROM orders
+    GROUP BY 1
+"""
+
+# Same over the encoded schema (see etl.py), served by the (Customer_ID, Day_Key, Sales) index
+RFM_FACTS_QUERY = """
+    SELECT
+        f.Customer_ID,
+        CAST(d.Order_Date AS TEXT) as Last_Order,
+        (SELECT MAX(Day_Key) FROM order_facts) - f.Last_Day as Recency,
+        f.Frequency,
+        f.Monetary
+    FROM (
+        SELECT Customer_ID, MAX(Day_Key) as Last_Day, COUNT(DISTINCT Day_Key) as Frequency, SUM(Sales) as Monetary
+        FROM order_facts
+        GROUP BY 1
+    ) f
+    JOIN dim_date d ON d.Day_Key = f.Last_Day
+    ORDER BY 1
+"""
+
+CHURN_LEVELS = ['Low', 'Medium', 'High']
+VALUE_LEVELS = ['Low', 'Medium', 'High']
+# (Customer_ID << DAY_BITS) | days since 1970 keys a customer's order day
+DAY_BITS = 20
+
+def rfm_columnar(path):
+    # RFM_QUERY over the memory-mapped Parquet columns, one record batch at a
+    # time: last order and spend merge batch by batch, distinct order days are
+    # the month's unique (customer, day) pairs, as a day never spans two
+    # months. Memory follows the number of customers, not of orders.
+    import pandas as pd
+
+    def merge(parts):
+        return pd.concat(parts).groupby(level=0, sort=False).agg({'Last_Order': 'max', 'Frequency': 'sum', 'Monetary': 'sum'})
+
+    def month_days(keys):
+        ids, days = np.unique(keys >> DAY_BITS, return_counts=True)
+        return pd.DataFrame({'Frequency': days}, index=ids)
+
+    rfm, month, keys = None, None, None
+    for batch_month, data in iter_batches(path, ['Customer_ID', 'Order_Date', 'Sales']):
+        if batch_month != month and keys is not None:
+            rfm = merge([rfm, month_days(keys)])
+            keys = None
+        month = batch_month
+        customers = np.asarray(data['Customer_ID'], dtype=np.int64)
+        days = data['Order_Date'].astype('datetime64[D]').astype(np.int64)
+        batch_keys = np.unique((customers << DAY_BITS) | days)
+        keys = batch_keys if keys is None else np.union1d(keys, batch_keys)
+        batch = pd.DataFrame({'Last_Order': data['Order_Date'], 'Frequency': 0, 'Monetary': data['Sales']}, index=customers)
+        batch = batch.groupby(level=0, sort=False).agg({'Last_Order': 'max', 'Frequency': 'sum', 'Monetary': 'sum'})
+        rfm = batch if rfm is None else merge([rfm, batch])
+    if keys is not None:
+        rfm = merge([rfm, month_days(keys)])
+    if rfm is None:
+        return []
+    rfm = rfm.sort_index()
+    recency = (rfm['Last_Order'].max() - rfm['Last_Order']) / pd.Timedelta(days=1)
+    last_order = rfm['Last_Order'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return list(zip(
+        rfm.index.tolist(), last_order.tolist(), recency.tolist(),
+        rfm['Frequency'].tolist(), rfm['Monetary'].tolist()
+    ))
+
+def score_customers(rows, n_clusters=N_CLUSTERS):
+    import pandas as pd
+    from sklearn.cluster import MiniBatchKMeans
+
+    if not rows:
+        return None
+    ids, last_order, recency, frequency, monetary = zip(*rows)
+    recency = np.rint(np.asarray(recency, dtype=float)).astype(np.int64)
+    frequency = np.asarray(frequency, dtype=np.int64)
+    monetary = np.asarray(monetary, dtype=float)
+
+    # High Risk: High Recency (haven't bought in a while)
+    churn_risk = np.select([recency > 365, recency > 180], ['High', 'Medium'], 'Low')
+    # High Value: top tertile of Monetary
+    customer_value = pd.qcut(monetary, 3, labels=VALUE_LEVELS).astype(str)
+
+    # KMeans on standardized log-RFM; clusters renumbered so 0 = lowest avg Monetary
+    features = np.log1p(np.column_stack([recency, frequency, monetary]).astype(float))
+    features = (features - features.mean(axis=0)) / np.where(features.std(axis=0) > 0, features.std(axis=0), 1)
+    k = min(n_clusters, len(ids))
+    labels = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3).fit_predict(features)
+    order = np.argsort([monetary[labels == c].mean() if np.any(labels == c) else 0 for c in range(k)])
+    clusters = np.argsort(order)[labels]
+
+    return list(zip(
+        ids, last_order, recency.tolist(), frequency.tolist(), monetary.tolist(),
+        churn_risk.tolist(), customer_value.tolist(), clusters.tolist()
+    ))
+
+def scores_current(conn):
+    # True when `customer_rfm` was built from the currently loaded data
+    try:
+        state = dict(conn.execute('SELECT key, value FROM etl_state').fetchall())
+        conn.execute('SELECT 1 FROM customer_rfm LIMIT 1')
+    except sqlite3.OperationalError:
+        return False
+    return 'rfm_version' in state and state['rfm_version'] == state.get('data_version')
+
+def scores_status(conn):
+    # 'current', 'stale' (built from an earlier load, until etl.py refreshes
+    # it) or None when `customer_rfm` was never built
+    if scores_current(conn):
+        return 'current'
+    try:
+        conn.execute('SELECT 1 FROM customer_rfm LIMIT 1')
+    except sqlite3.OperationalError:
+        return None
+    return 'stale'
+
+def build_rfm_table(conn, n_clusters=N_CLUSTERS, parquet_dir=PARQUET_DIR):
+    # Score the load seen on entry, then replace `customer_rfm` in one write
+    # transaction: readers see the old or the new scores, never none, and
+    # concurrent builders queue on the lock. Returns the number of customers
+    # scored, or None when another builder already stored scores for this load
+    # (or a newer load superseded it) while this one was computing.
+    version = stored_version(conn)
+    if parquet_dir and is_current(parquet_dir, version):
+        rows = rfm_columnar(parquet_dir)
+    elif conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'order_facts'").fetchone():
+        rows = conn.execute(RFM_FACTS_QUERY).fetchall()
+    else:
+        rows = conn.execute(RFM_QUERY).fetchall()
+    scored = score_customers(rows, n_clusters) or []
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if stored_version(conn) != version or scores_current(conn):
+            conn.execute('ROLLBACK')
+            return None
+        conn.execute('DROP TABLE IF EXISTS customer_rfm')
+        conn.execute('''
+            CREATE TABLE customer_rfm (
+                Customer_ID INTEGER PRIMARY KEY,
+                Last_Order TEXT,
+                Recency INTEGER,
+                Frequency INTEGER,
+                Monetary REAL,
+                Churn_Risk TEXT,
+                Customer_Value TEXT,
+                Cluster INTEGER
+            )
+        ''')
+        conn.executemany('INSERT INTO customer_rfm VALUES (?, ?, ?, ?, ?, ?, ?, ?)', scored)
+        conn.execute('CREATE INDEX idx_rfm_segment ON customer_rfm(Churn_Risk, Customer_Value, Monetary)')
+        conn.execute('CREATE INDEX idx_rfm_cluster ON customer_rfm(Cluster, Monetary)')
+        # Remember which load the scores belong to, so the API can tell stale ones
+        conn.execute('CREATE TABLE IF NOT EXISTS etl_state (key TEXT PRIMARY KEY, value)')
+        conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('rfm_version', ?)", [version])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return len(scored)
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    count = build_rfm_table(conn)
+    conn.close()
+    print(f"Scored {count} customers.")
@@ -1,82 +1,365 @@
 import pandas as pd
 import numpy as np
 import sqlite3
-import pickle
+import json
 import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from datetime import datetime
 from xgboost import XGBRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
 
-# Config
+try:
+    from .columnar import PARQUET_DIR, is_current, stored_version, read_columns
+except ImportError: # run as a script
+    from columnar import PARQUET_DIR, is_current, stored_version, read_columns
+
+# Config (paths relative to the repo root: python -m backend.app.services.train_models)
 DB_PATH = 'backend/data/superstore_enhanced.db'
 MODEL_DIR = 'backend/static/models'
-os.makedirs(MODEL_DIR, exist_ok=True)
+QUANTILES = [0.1, 0.5, 0.9]
+CHUNK_SIZE = 500000
+
+FEATURES = ['Month', 'DayOfWeek', 'Year', 'Region_Encoded', 'Category_Encoded', 'Sub_Category_Encoded', 'Discount', 'Weather_Index', 'Is_Promo']
+CATEGORICALS = ['Region', 'Category', 'Sub_Category']
+NUMERIC_TYPES = {'Quantity': 'int16', 'Discount': 'float32', 'Weather_Index': 'float32', 'Is_Promo': 'int8'}
+
+# Rolling-origin validation: N_FOLDS consecutive FOLD_DAYS windows at the end of
+# the history, each scored by a model trained only on the days before it
+N_FOLDS = 3
+FOLD_DAYS = 90
+
+# Hyperparameter search space, sampled without replacement
+SEARCH_SPACE = {
+    'n_estimators': [100, 200, 400],
+    'learning_rate': [0.05, 0.1, 0.2],
+    'max_depth': [4, 5, 6, 8],
+    'min_child_weight': [1, 5, 20],
+    'subsample': [0.8, 1.0],
+    'colsample_bytree': [0.8, 1.0]
+}
+DEFAULT_PARAMS = {'n_estimators': 100, 'learning_rate': 0.1, 'max_depth': 5}
+
+MODEL_COLUMNS = ['Order_Date'] + CATEGORICALS + list(NUMERIC_TYPES)
 
-def load_data():
+def load_columnar(path):
+    # Memory-mapped Parquet columns; categoricals come straight from the dictionaries
+    df = pd.DataFrame(read_columns(path, MODEL_COLUMNS))
+    for col, dtype in NUMERIC_TYPES.items():
+        df[col] = df[col].astype(dtype, copy=False)
+    for col in CATEGORICALS:
+        df[col] = df[col].cat.set_categories(sorted(df[col].cat.categories))
+    return df
+
+def load_data(chunksize=CHUNK_SIZE):
+    # Only the columns the model needs: from the Parquet copy when it matches
+    # the database, otherwise read in chunks with compact dtypes; strings
+    # become categoricals per chunk and are unioned at the end.
     conn = sqlite3.connect(DB_PATH)
+    if is_current(PARQUET_DIR, stored_version(conn)):
+        conn.close()
+        return load_columnar(PARQUET_DIR)
+    
     query = """
         SELECT 
-            Order_Date, Region, Category, Sub_Category, Sales, Quantity, Discount, Profit,
-            Weather_Index, Is_Promo, Holiday_Flag
-        FROM orders
-    """
-    # Note: Holiday_Flag might not exist in my ETL, let's check. 
-    # Actually I didn't add Holiday_Flag in ETL. I added Weather_Index, Is_Promo.
-    # Let's adjust query.
-    query = """
-        SELECT 
-            Order_Date, Region, Category, Sub_Category, Sales, Quantity, Discount, Profit,
+            Order_Date, Region, Category, Sub_Category, Quantity, Discount,
             Weather_Index, Is_Promo
         FROM orders
     """
-    df = pd.read_sql(query, conn)
+    parts = []
+    for chunk in pd.read_sql(query, conn, chunksize=chunksize, dtype=NUMERIC_TYPES):
+        chunk['Order_Date'] = pd.to_datetime(chunk['Order_Date'], format='%Y-%m-%d %H:%M:%S')
+        for col in CATEGORICALS:
+            chunk[col] = chunk[col].astype('category')
+        parts.append(chunk)
     conn.close()
+    
+    df = pd.concat([p.drop(columns=CATEGORICALS) for p in parts], ignore_index=True)
+    for col in CATEGORICALS:
+        # Sorted categories give the same codes LabelEncoder would
+        df[col] = pd.api.types.union_categoricals([p[col] for p in parts], sort_categories=True)
     return df
 
-def train_demand_model():
+def build_features(df):
+    # Date-sorted float32 feature matrix, target, day numbers and series keys
+    df = df.sort_values('Order_Date', kind='stable', ignore_index=True)
+    X = np.empty((len(df), len(FEATURES)), dtype=np.float32)
+    X[:, 0] = df['Order_Date'].dt.month
+    X[:, 1] = df['Order_Date'].dt.dayofweek
+    X[:, 2] = df['Order_Date'].dt.year
+    X[:, 3] = df['Region'].cat.codes
+    X[:, 4] = df['Category'].cat.codes
+    X[:, 5] = df['Sub_Category'].cat.codes
+    X[:, 6] = df['Discount']
+    X[:, 7] = df['Weather_Index']
+    X[:, 8] = df['Is_Promo']
+    y = df['Quantity'].to_numpy(dtype=np.float32) # Forecasting Demand (Quantity)
+    days = df['Order_Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    series = (df['Region'].astype(str) + '|' + df['Sub_Category'].astype(str)).to_numpy()
+    classes = {
+        'region': df['Region'].cat.categories.tolist(),
+        'category': df['Category'].cat.categories.tolist(),
+        'subcategory': df['Sub_Category'].cat.categories.tolist()
+    }
+    return X, y, days, series, classes
+
+def rolling_origin_folds(days, n_folds=N_FOLDS, fold_days=FOLD_DAYS):
+    # (train_end, valid_end) row offsets into the date-sorted arrays
+    if len(days) == 0:
+        return []
+    last = days[-1]
+    folds = []
+    for k in range(n_folds, 0, -1):
+        start = np.searchsorted(days, last - k * fold_days + 1)
+        end = np.searchsorted(days, last - (k - 1) * fold_days + 1)
+        if start > 0 and end > start:
+            folds.append((int(start), int(end)))
+    return folds
+
+def sample_params(n_trials, seed=42):
+    rng = np.random.default_rng(seed)
+    trials, seen = [dict(DEFAULT_PARAMS)], {tuple(sorted(DEFAULT_PARAMS.items()))}
+    for _ in range(n_trials * 20):
+        if len(trials) >= n_trials:
+            break
+        params = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACE.items()}
+        params = {k: v.item() if hasattr(v, 'item') else v for k, v in params.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+    return trials[:n_trials]
+
+def make_model(params, n_jobs):
+    return XGBRegressor(tree_method='hist', n_jobs=n_jobs, random_state=42, **params)
+
+# Per-worker arrays, memory-mapped from the parent's temp files
+_shared = {}
+
+def _init_worker(data_dir):
+    _shared['X'] = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    _shared['y'] = np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r')
+
+def run_trial(params, folds, n_jobs, max_rows, deadline=None):
+    # Mean validation RMSE across the rolling-origin folds. Training windows
+    # are capped to the most recent `max_rows` rows to bound trial time.
+    # Returns None if the search deadline (epoch seconds) passes between folds.
+    start = time.perf_counter()
+    X, y = _shared['X'], _shared['y']
+    fold_rmse = []
+    for train_end, valid_end in folds:
+        if deadline is not None and time.time() > deadline:
+            return None
+        train_start = max(0, train_end - max_rows)
+        model = make_model(params, n_jobs)
+        model.fit(X[train_start:train_end], y[train_start:train_end])
+        residuals = y[train_end:valid_end] - model.predict(X[train_end:valid_end])
+        fold_rmse.append(float(np.sqrt(np.mean(residuals ** 2))))
+    return {
+        'params': params,
+        'rmse': float(np.mean(fold_rmse)),
+        'fold_rmse': fold_rmse,
+        'seconds': round(time.perf_counter() - start, 2)
+    }
+
+def search(X, y, folds, n_trials, workers, search_budget, max_rows):
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or max(1, cores // 2), n_trials))
+    # Split the remaining cores between concurrent trials
+    n_jobs = max(1, cores // workers)
+    print(f"Running {n_trials} trials on {workers} worker(s) x {n_jobs} thread(s), search budget {search_budget}s...")
+    
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        np.save(os.path.join(data_dir, 'X.npy'), X)
+        np.save(os.path.join(data_dir, 'y.npy'), y)
+        
+        deadline = time.time() + search_budget
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,))
+        futures = [executor.submit(run_trial, p, folds, n_jobs, max_rows, deadline) for p in sample_params(n_trials)]
+        try:
+            for future in as_completed(futures, timeout=search_budget):
+                result = future.result()
+                if result is None:
+                    continue
+                results.append(result)
+                print(f"  rmse {result['rmse']:.4f} in {result['seconds']}s {result['params']}")
+        except FuturesTimeout:
+            print(f"Search budget reached, keeping {len(results)} finished trial(s).")
+        finally:
+            # Pending trials are dropped and running ones stop at their next
+            # fold, so each worker overruns by at most one fold fit
+            executor.shutdown(wait=True, cancel_futures=True)
+    return results, workers, n_jobs
+
+def train_demand_model(n_trials=8, workers=None, search_budget=600, max_trial_rows=2000000):
+    # search_budget bounds the hyperparameter search only; the holdout and
+    # final fits run after it and are timed separately in the report
     print("Training Demand Forecast Model (XGBoost)...")
-    df = load_data()
+    started = time.perf_counter()
     
-    # Feature Engineering
-    df['Order_Date'] = pd.to_datetime(df['Order_Date'])
-    df['Month'] = df['Order_Date'].dt.month
-    df['DayOfWeek'] = df['Order_Date'].dt.dayofweek
-    df['Year'] = df['Order_Date'].dt.year
+    X, y, days, series, classes = build_features(load_data())
+    folds = rolling_origin_folds(days)
+    if not folds:
+        span = int(days[-1] - days[0]) + 1 if len(days) else 0
+        raise ValueError(f"Need more than {FOLD_DAYS} days of order history to validate on, found {span}.")
+    print(f"Loaded {len(y)} rows, {len(folds)} rolling-origin folds.")
     
-    # Encode Categoricals
-    le_region = LabelEncoder()
-    df['Region_Encoded'] = le_region.fit_transform(df['Region'])
+    search_started = time.perf_counter()
+    results, workers, n_jobs = search(X, y, folds, n_trials, workers, search_budget, max_trial_rows)
+    search_time = time.perf_counter() - search_started
+    best = min(results, key=lambda r: r['rmse']) if results else {'params': dict(DEFAULT_PARAMS), 'rmse': None}
+    print(f"Best params: {best['params']}")
     
-    le_category = LabelEncoder()
-    df['Category_Encoded'] = le_category.fit_transform(df['Category'])
+    cores = os.cpu_count() or 1
     
-    le_subcategory = LabelEncoder()
-    df['Sub_Category_Encoded'] = le_subcategory.fit_transform(df['Sub_Category'])
+    fits_started = time.perf_counter()
+    # Holdout = last fold, trained on everything before it. Its first half
+    # calibrates the intervals, the second half measures coverage.
+    train_end, valid_end = folds[-1]
+    model = make_model(best['params'], cores)
+    model.fit(X[:train_end], y[:train_end])
+    predictions = model.predict(X[train_end:valid_end])
+    y_valid, s_valid = y[train_end:valid_end], series[train_end:valid_end]
+    residuals = y_valid - predictions
+    score = float(1 - np.sum(residuals ** 2) / np.sum((y_valid - y_valid.mean()) ** 2))
+    print(f"Model R2 Score: {score:.4f}")
     
-    # Features & Target
-    X = df[['Month', 'DayOfWeek', 'Year', 'Region_Encoded', 'Category_Encoded', 'Sub_Category_Encoded', 'Discount', 'Weather_Index', 'Is_Promo']]
-    y = df['Quantity'] # Forecasting Demand (Quantity)
+    n_cal = len(y_valid) // 2
+    intervals = conformal_table(residuals[:n_cal], s_valid[:n_cal])
+    coverage = interval_coverage(intervals, y_valid[n_cal:], predictions[n_cal:], s_valid[n_cal:])
+    intervals['coverage'] = coverage
+    # The served model below is refit on every row, holdout included, so no
+    # unseen rows are left to calibrate it on: its bands are the holdout
+    # model's residual quantiles, and `coverage` was measured for that model
+    intervals['calibration'] = {
+        'model': 'holdout',
+        'holdout_train_rows': int(train_end),
+        'served_train_rows': int(len(y)),
+        'calibration_rows': int(n_cal),
+        'coverage_rows': int(len(y_valid) - n_cal)
+    }
+    print(f"P10-P90 coverage: {coverage['overall']:.3f} (target {coverage['target']:.2f})")
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Served model: best params refit on the full history
+    model = make_model(best['params'], cores)
+    model.fit(X, y)
     
-    model = XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=5)
-    model.fit(X_train, y_train)
+    report = {
+        'rows': int(len(y)),
+        'folds': [{'train_rows': a, 'valid_rows': b - a} for a, b in folds],
+        'workers': workers,
+        'n_jobs': n_jobs,
+        'trials': sorted(results, key=lambda r: r['rmse']),
+        'best_params': best['params'],
+        'best_cv_rmse': best['rmse'],
+        'holdout_r2': score,
+        'holdout_rmse': float(np.sqrt(np.mean(residuals ** 2))),
+        'interval_coverage': coverage,
+        'search_budget_s': search_budget,
+        'search_time_s': round(search_time, 2),
+        'final_fits_s': round(time.perf_counter() - fits_started, 2),
+        'wall_time_s': round(time.perf_counter() - started, 2)
+    }
     
-    score = model.score(X_test, y_test)
-    print(f"Model R2 Score: {score:.4f}")
+    save_artifacts(model, classes, {
+        'r2': score,
+        'cv_rmse': best['rmse'],
+        'interval_coverage': coverage['overall'],
+        # r2 and the interval metrics are the holdout model's, not the refit one's
+        'evaluated_on': 'holdout'
+    }, intervals, report)
     
-    # Save Model & Encoders
-    with open(f'{MODEL_DIR}/demand_model.pkl', 'wb') as f:
-        pickle.dump(model, f)
-        
-    with open(f'{MODEL_DIR}/encoders.pkl', 'wb') as f:
-        pickle.dump({
-            'region': le_region,
-            'category': le_category,
-            'subcategory': le_subcategory
-        }, f)
-        
-    print("Model saved.")
+    print(f"Model saved in {report['wall_time_s']}s.")
+
+def conformal_quantiles(residuals):
+    # Finite-sample split-conformal levels, rounded outwards so the band covers
+    # at least its nominal rate even with few (and integer-valued) residuals
+    n = len(residuals)
+    levels = np.clip(0.5 + (np.array(QUANTILES) - 0.5) * (n + 1) / n, 0, 1)
+    return [
+        float(np.quantile(residuals, level, method='lower' if level < 0.5 else 'higher' if level > 0.5 else 'linear'))
+        for level in levels
+    ]
+
+def conformal_table(residuals, series, min_samples=100):
+    # Split-conformal residual quantiles per Region|Sub_Category series, with a
+    # global row for sparse series. The API adds these offsets to the point
+    # forecast, so bands cost a lookup rather than extra model passes.
+    table = {
+        'quantiles': QUANTILES,
+        'global': conformal_quantiles(residuals),
+        'series': {}
+    }
+    frame = pd.DataFrame({'series': series, 'residual': residuals})
+    for key, group in frame.groupby('series')['residual']:
+        if len(group) >= min_samples:
+            table['series'][key] = conformal_quantiles(group.to_numpy())
+    return table
+
+def interval_offsets(table, series):
+    offsets = np.array([table['series'].get(key, table['global']) for key in np.unique(series)])
+    return offsets[np.unique(series, return_inverse=True)[1]]
+
+def interval_coverage(table, y, predictions, series):
+    # Share of held-out orders inside [P10, P90], overall and per series
+    offsets = interval_offsets(table, series)
+    inside = (y >= predictions + offsets[:, 0]) & (y <= predictions + offsets[:, -1])
+    per_series = pd.Series(inside).groupby(series).mean()
+    return {
+        'target': QUANTILES[-1] - QUANTILES[0],
+        'overall': float(inside.mean()),
+        'series_min': float(per_series.min()),
+        'series_max': float(per_series.max())
+    }
+
+def save_artifacts(model, classes, metrics, intervals=None, report=None, keep=2):
+    # Versioned XGBoost binary + encoder classes, then the manifest last via an
+    # atomic rename; the API's model registry hot-swaps when the manifest changes.
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    model_file = f'demand_model-{version}.ubj'
+    encoders_file = f'encoders-{version}.json'
+    
+    intervals_file = f'intervals-{version}.json'
+    report_file = f'training_report-{version}.json'
+    
+    model.save_model(os.path.join(MODEL_DIR, model_file))
+    with open(os.path.join(MODEL_DIR, encoders_file), 'w') as f:
+        json.dump(classes, f)
+    if intervals is not None:
+        with open(os.path.join(MODEL_DIR, intervals_file), 'w') as f:
+            json.dump(intervals, f)
+    if report is not None:
+        with open(os.path.join(MODEL_DIR, report_file), 'w') as f:
+            json.dump({'version': version, **report}, f, indent=2)
+    
+    manifest_path = os.path.join(MODEL_DIR, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump({
+            'version': version,
+            'model': model_file,
+            'encoders': encoders_file,
+            'intervals': intervals_file if intervals is not None else None,
+            'report': report_file if report is not None else None,
+            'metrics': metrics
+        }, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    
+    # Keep the newest `keep` versions so a reader mid-load never loses its files
+    for prefix, suffix in (('demand_model-', '.ubj'), ('encoders-', '.json'), ('intervals-', '.json'), ('training_report-', '.json')):
+        versions = sorted(f for f in os.listdir(MODEL_DIR) if f.startswith(prefix) and f.endswith(suffix))
+        for old in versions[:-keep]:
+            os.remove(os.path.join(MODEL_DIR, old))
 
 if __name__ == "__main__":
-    train_demand_model()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trials', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent trials (default: half the cores)')
+    # --time-budget is the old name, kept for existing scripts
+    parser.add_argument('--search-budget', '--time-budget', type=float, default=600,
+                        help='Seconds allowed for the hyperparameter search (soft: running trials finish their current fold); the holdout and final fits come on top')
+    parser.add_argument('--max-trial-rows', type=int, default=2000000, help='Most recent rows used per trial fit')
+    args = parser.parse_args()
+    train_demand_model(args.trials, args.workers, args.search_budget, args.max_trial_rows)
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import jwt
+from flask import g, request, jsonify
+from .db import write_db, query_db
+from .metrics import stage
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'HS256'
+
+USERS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        role TEXT NOT NULL,
+        active INTEGER NOT NULL DEFAULT 1
+    )
+'''
+SEED_USERS = [('admin', 'CEO')]
+
+class AuthError(Exception):
+    pass
+
+class KeyRing:
+    # Signing keys by kid. Without JWT_KEYS_FILE there is one key,
+    # JWT_SECRET_KEY. The file ({"current": kid, "keys": {kid: secret}}) is
+    # re-read when it changes: new tokens are signed with `current`, tokens of
+    # any listed kid still verify, and dropping a kid revokes its tokens.
+
+    def __init__(self, default_secret=None, path=None, check_interval=1.0):
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self.configure(default_secret, path)
+
+    def configure(self, default_secret, path):
+        self.default_secret = default_secret
+        self.path = path
+        self.keys = {'default': default_secret}
+        self.current = 'default'
+        self._stamp = None
+        self._checked = float('-inf')
+        self.refresh()
+
+    def refresh(self):
+        # True when the keys changed; stat()s the file at most every check_interval
+        now = time.monotonic()
+        if not self.path or now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            self._checked = now
+            try:
+                stamp = os.stat(self.path).st_mtime_ns
+            except OSError:
+                stamp = None
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            if stamp is None:
+                keys, current = {'default': self.default_secret}, 'default'
+            else:
+                try:
+                    with open(self.path) as f:
+                        data = json.load(f)
+                    keys, current = data['keys'], data['current']
+                    # Signing with a kid that has no secret would fail every login
+                    if not isinstance(keys, dict) or not all(isinstance(k, str) and k for k in keys.values()):
+                        raise ValueError("'keys' must map kids to non-empty secrets")
+                    if not isinstance(current, str) or current not in keys:
+                        raise ValueError(f"'current' ({current!r}) is not one of the keys")
+                except (OSError, ValueError, KeyError, TypeError):
+                    logger.exception("Invalid JWT keys file %s, keeping the current keys", self.path)
+                    return False
+            self.keys, self.current = keys, current
+            self.version += 1
+            logger.info("Loaded JWT keys %s (signing with %s)", sorted(keys), current)
+            return True
+
+    def signing_key(self):
+        self.refresh()
+        return self.current, self.keys[self.current]
+
+class TokenVerifier:
+    # Verified tokens are cached, with their claims and the user's database
+    # row, until the token expires, in a bounded LRU. A cache hit is a dict
+    # lookup plus an expiry check instead of an HMAC and a query. Changes to
+    # a user (role, deactivation) therefore apply to tokens issued after
+    # them; dropping a signing key applies at once (the cache is cleared).
+
+    def __init__(self, keyring, max_entries=4096, leeway=0):
+        self.keyring = keyring
+        self.max_entries = max_entries
+        self.leeway = leeway
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'rejected': 0}
+
+    def configure(self, max_entries, leeway):
+        with self._lock:
+            self.max_entries = max_entries
+            self.leeway = leeway
+            self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def verify(self, token):
+        # -> (claims, user), raises AuthError
+        if self.keyring.refresh():
+            self.clear()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(token)
+                self.stats['hits'] += 1
+                return entry[1], entry[2]
+            if entry is not None:
+                del self._entries[token]
+
+        try:
+            with stage('auth'):
+                claims, user = self._decode(token)
+        except AuthError:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise
+        with self._lock:
+            self.stats['misses'] += 1
+            self._entries[token] = (claims['exp'] + self.leeway, claims, user)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims, user
+
+    def _decode(self, token):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid', 'default')
+            key = self.keyring.keys.get(kid)
+            if key is None:
+                raise AuthError('Unknown signing key')
+            claims = jwt.decode(token, key, algorithms=[ALGORITHM], options={'require': ['exp']}, leeway=self.leeway)
+        except jwt.InvalidTokenError as e:
+            raise AuthError(str(e))
+
+        row = query_db('SELECT username, role FROM users WHERE username = ? AND active = 1', [claims.get('user')], one=True)
+        if row is None:
+            raise AuthError('Unknown or inactive user')
+        return claims, {'username': row['username'], 'role': row['role']}
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'key_version': self.keyring.version,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0
+            }
+
+keyring = KeyRing()
+verifier = TokenVerifier(keyring)
+
+def issue_token(username, lifetime):
+    kid, secret = keyring.signing_key()
+    return jwt.encode({'user': username, 'exp': int(time.time() + lifetime)}, secret, algorithm=ALGORITHM, headers={'kid': kid})
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    return header[7:].strip() if header[:7].lower() == 'bearer ' else None
+
+def init_auth(app):
+    keyring.configure(app.config['JWT_SECRET_KEY'], app.config['JWT_KEYS_FILE'])
+    verifier.configure(app.config['AUTH_CACHE_MAX_ENTRIES'], app.config['JWT_LEEWAY'])
+
+    try:
+        with app.app_context(), write_db() as conn:
+            conn.execute(USERS_SCHEMA)
+            conn.executemany('INSERT OR IGNORE INTO users (username, role) VALUES (?, ?)', SEED_USERS)
+    except Exception:
+        logger.exception("Could not create the users table")
+
+    required = app.config['AUTH_REQUIRED']
+    exempt = set(app.config['AUTH_EXEMPT'])
+
+    @app.before_request
+    def authenticate():
+        # Every /api/* call with a bearer token gets it verified; without one
+        # it is rejected only when AUTH_REQUIRED is set
+        g.user = None
+        if request.method == 'OPTIONS' or not request.path.startswith('/api/') or request.endpoint in exempt:
+            return None
+        token = bearer_token()
+        if token is None:
+            if required:
+                return jsonify({'message': 'Missing bearer token'}), 401
+            return None
+        try:
+            g.claims, g.user = verifier.verify(token)
+        except AuthError as e:
+            return jsonify({'message': 'Invalid token', 'detail': str(e)}), 401
+        return None
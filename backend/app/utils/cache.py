@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from flask import request, current_app
+from .db import get_data_version
+
+class ResultCache:
+    # Two tiers: an in-process LRU with TTL, and optional pickle files on disk
+    # so results survive a restart. Keys already contain the data version, so
+    # an ETL run invalidates everything without any explicit purge. On disk,
+    # entries live in one directory per data version, with the entry's expiry
+    # as the file's mtime; prune_disk() drops other versions and expired files.
+
+    def __init__(self, max_entries=256, ttl=3600, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_version = None
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'disk_pruned': 0}
+
+    def configure(self, max_entries, ttl, disk_dir):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self.disk_dir = disk_dir
+            self._entries.clear()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key, version):
+        return os.path.join(self.disk_dir, str(version), hashlib.sha256(repr(key).encode()).hexdigest() + '.pkl')
+
+    def get(self, key, version=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key, version), 'rb') as f:
+                    expires, value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                expires = 0
+            if expires > now:
+                self._store(key, expires, value)
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key, value, version=None):
+        # version: the data version the value was computed from
+        expires = time.time() + self.ttl
+        self._store(key, expires, value)
+        if self.disk_dir:
+            if version != self._disk_version:
+                # First write since an ETL run (or since startup) in this process
+                self.prune_disk(version)
+            # Write-then-rename so a concurrent reader never sees a partial file
+            path = self._disk_path(key, version)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.utime(tmp, (expires, expires))
+            os.replace(tmp, path)
+
+    def prune_disk(self, version):
+        # Deletes the entries of every data version but `version`, and its
+        # expired ones. Temp files are left alone until they are a TTL old, as
+        # another process may still be writing them.
+        self._disk_version = version
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return 0
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if name != str(version):
+                if os.path.isdir(path):
+                    removed += len(os.listdir(path))
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            for entry in os.scandir(path):
+                try:
+                    mtime = entry.stat().st_mtime
+                    if mtime < now - self.ttl or (entry.name.endswith('.pkl') and mtime < now):
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self.stats['disk_pruned'] += removed
+        return removed
+
+    def _store(self, key, expires, value):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_enabled': bool(self.disk_dir),
+                'hit_rate': round((self.stats['hits'] + self.stats['disk_hits']) / lookups, 4) if lookups else 0
+            }
+
+result_cache = ResultCache()
+
+def init_cache(app):
+    result_cache.configure(
+        app.config['CACHE_MAX_ENTRIES'],
+        app.config['CACHE_TTL'],
+        app.config['CACHE_DIR']
+    )
+    if app.config['CACHE_DIR']:
+        # Files left by earlier runs: other data versions and expired entries
+        try:
+            with app.app_context():
+                version = get_data_version()
+        except Exception:
+            version = None
+        result_cache.prune_disk(version)
+
+def make_key(endpoint, args, data_version):
+    # Order-insensitive, ignores empty params so ?a=1&b= and ?b=&a=1 share an entry
+    normalized = tuple(sorted((k, tuple(sorted(v))) for k, v in args.lists() if any(v)))
+    return (endpoint, normalized, data_version)
+
+def cached(view):
+    # Caches successful responses of a view, keyed on endpoint + query args + data version
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version = get_data_version()
+        key = make_key(request.endpoint, request.args, version)
+        hit = result_cache.get(key, version)
+        if hit is not None:
+            body, status, mimetype = hit
+            response = current_app.response_class(body, status=status, mimetype=mimetype)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        response = current_app.make_response(view(*args, **kwargs))
+        # no-store: the view served something that will change without a new data version
+        if response.status_code == 200 and not response.cache_control.no_store:
+            result_cache.set(key, (response.get_data(), response.status_code, response.mimetype), version)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
@@ -1,22 +1,348 @@
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from flask import g, current_app
+from .metrics import stage, check_slow_query
+
+# Daily x Region x Sub_Category x Is_Promo rollup of `orders`, built by etl.py.
+# Category rides along as it is fully determined by Sub_Category.
+ROLLUP_TABLE = 'daily_rollup'
+ROLLUP_DIMENSIONS = ('Order_Date', 'Region', 'Category', 'Sub_Category', 'Is_Promo')
+
+# Encoded storage behind the `orders` view (see etl.py): text columns are
+# integer keys into dimension tables, Order_Date is a Day_Key into dim_date.
+FACTS_TABLE = 'order_facts'
+FACT_KEYS = {
+    'Order_Date': ('dim_date', 'Day_Key'),
+    'Region': ('dim_region', 'Region_Key'),
+    'Segment': ('dim_segment', 'Segment_Key'),
+    'Ship_Mode': ('dim_ship_mode', 'Ship_Mode_Key'),
+    'Category': ('dim_category', 'Category_Key'),
+    'Sub_Category': ('dim_sub_category', 'Sub_Category_Key'),
+}
+
+# order_facts is a view over one table per quarter, listed with its Day_Key
+# range in this catalog (see etl.py); databases without it are unpartitioned
+PARTITIONS_TABLE = 'order_partitions'
+
+# Named measures as (expression over orders, over the rollup, over order_facts)
+MEASURES = {
+    'sales': ('SUM(Sales)', 'SUM(Sales)', 'SUM(Sales)'),
+    'profit': ('SUM(Profit)', 'SUM(Profit)', 'SUM(Profit)'),
+    'quantity': ('SUM(Quantity)', 'SUM(Quantity)', 'SUM(Quantity)'),
+    'cogs': ('SUM(Sales) * 0.6', 'SUM(Sales) * 0.6', 'SUM(Sales) * 0.6'),
+    'avg_discount': ('AVG(Discount)', 'SUM(Discount) / SUM(Order_Count)', 'AVG(Discount)'),
+    'discounts': ('SUM(Sales * Discount)', 'SUM(Discounted_Sales)', 'SUM(Sales * Discount)'),
+    'promo_cost': ('SUM(CASE WHEN Is_Promo = 1 THEN Sales * 0.1 ELSE 0 END)',
+                   'SUM(CASE WHEN Is_Promo = 1 THEN Sales * 0.1 ELSE 0 END)',
+                   'SUM(CASE WHEN Is_Promo = 1 THEN Sales * 0.1 ELSE 0 END)'),
+    'days_active': ('COUNT(DISTINCT Order_Date)', 'COUNT(DISTINCT Order_Date)', 'COUNT(DISTINCT Day_Key)'),
+    'order_count': ('COUNT(*)', 'SUM(Order_Count)', 'COUNT(*)'),
+}
+
+# Measures that aren't a plain SUM over partitions: the partial aggregates each
+# partition returns, and how to combine them ({0}, {1}... are the partials).
+# A day never spans two partitions, so distinct day counts add up.
+PARTIALS = {
+    'avg_discount': (('SUM(Discount)', 'COUNT(*)'), 'SUM({0}) / SUM({1})'),
+    'cogs': (('SUM(Sales)',), 'SUM({0}) * 0.6'),
+}
+
+class ConnectionPool:
+    # Read-only connections are reused across requests so their page cache,
+    # mmap and per-connection statement cache (cached_statements) stay warm.
+    # All writes go through one separate writer connection; with WAL enabled
+    # readers never block on it.
+
+    def __init__(self, path, size=8, mmap_size=268435456, cache_size=-65536, statement_cache=256):
+        self.path = path
+        self.size = size
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.statement_cache = statement_cache
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._writer = None
+        self.write_lock = threading.Lock()
+
+    def _connect(self, read_only):
+        uri = f"file:{self.path}{'?mode=ro' if read_only else ''}"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+            timeout=30
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    @property
+    def writer(self):
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+            # WAL is persistent in the file, so readers opened afterwards use it too
+            self._writer.execute('PRAGMA journal_mode = WAL')
+            self._writer.execute('PRAGMA synchronous = NORMAL')
+        return self._writer
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # Make sure the file is in WAL mode before the first reader opens it
+            if self._writer is None:
+                with self.write_lock:
+                    self.writer
+            return self._connect(read_only=True)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            # Overflow connection opened under load; don't keep it around
+            conn.close()
+
+    def after_fork(self, warm=0):
+        # SQLite connections must not cross a fork: drop (without closing) any
+        # inherited from the preloading parent, then open `warm` fresh readers
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._writer = None
+        self.write_lock = threading.Lock()
+        if warm:
+            with self.write_lock:
+                self.writer
+        for _ in range(min(warm, self.size)):
+            self._idle.put_nowait(self._connect(read_only=True))
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+class PartitionExecutor:
+    # Threads running one partition's query each on their own pooled
+    # connection; sqlite3 releases the GIL while a statement runs. Started on
+    # first use in each process, so a preloading server's workers get their own.
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+
+    def map(self, fn, items):
+        if self.workers <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='partition-query')
+        return list(self._executor.map(fn, items))
+
+def init_db(app):
+    app.extensions['db_pool'] = ConnectionPool(
+        app.config['DATABASE_URI'],
+        size=app.config['DB_POOL_SIZE'],
+        mmap_size=app.config['DB_MMAP_SIZE'],
+        cache_size=app.config['DB_CACHE_SIZE']
+    )
+    app.extensions['partition_executor'] = PartitionExecutor(app.config['PARTITION_WORKERS'])
+    app.teardown_appcontext(close_db)
+    atexit.register(app.extensions['db_pool'].close_all)
+
+def get_pool():
+    return current_app.extensions['db_pool']
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE_URI'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
+
+@contextmanager
+def write_db():
+    # Serialized access to the pool's writer connection; commits on success
+    pool = get_pool()
+    with pool.write_lock:
+        conn = pool.writer
+        with conn:
+            yield conn
 
 def query_db(query, args=(), one=False):
-    cur = get_db().execute(query, args)
-    rv = cur.fetchall()
-    cur.close()
+    conn = get_db()
+    with stage('sql') as timer:
+        cur = conn.execute(query, args)
+        rv = cur.fetchall()
+        cur.close()
+    check_slow_query(conn, query, args, timer.elapsed)
     return (rv[0] if rv else None) if one else rv
+
+def table_exists(name):
+    # Views count: order_facts is one over the partitions
+    return query_db("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", [name], one=True) is not None
+
+def get_etl_state():
+    # Key/value state written by etl.py (watermark, data/base versions); empty for older databases
+    try:
+        return {row['key']: row['value'] for row in query_db("SELECT key, value FROM etl_state")}
+    except sqlite3.OperationalError:
+        return {}
+
+def get_data_version():
+    # Stamp bumped by etl.py on every load; None for databases built before it existed
+    return get_etl_state().get('data_version')
+
+def plan_source(columns):
+    # The rollup can answer a query only if every filtered/grouped column is one of its dimensions
+    if all(c in ROLLUP_DIMENSIONS for c in columns) and table_exists(ROLLUP_TABLE):
+        return ROLLUP_TABLE
+    return 'orders'
+
+def query_orders(measures, start_date, end_date, filters=None, group_by=None, order_by=None, one=False):
+    # measures: list of (alias, measure name), filters: {column: value}
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    group_by = list(group_by or [])
+    source = plan_source(list(filters) + group_by)
+    if source == 'orders' and table_exists(FACTS_TABLE):
+        return query_facts(measures, start_date, end_date, filters, group_by, order_by, one)
+    side = 1 if source == ROLLUP_TABLE else 0
+
+    select = group_by + [f"{MEASURES[m][side]} as {alias}" for alias, m in measures]
+    query = f"SELECT {', '.join(select)} FROM {source} WHERE Order_Date BETWEEN ? AND ?"
+    params = [start_date, end_date]
+    for column, value in filters.items():
+        query += f" AND {column} = ?"
+        params.append(value)
+    if group_by:
+        query += f" GROUP BY {', '.join(group_by)}"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+
+    return query_db(query, params, one=one)
+
+def get_partitions():
+    # [(name, first_day, last_day)] in date order; empty when unpartitioned
+    if not table_exists(PARTITIONS_TABLE):
+        return []
+    return query_db(f'SELECT name, first_day, last_day FROM {PARTITIONS_TABLE} ORDER BY first_day')
+
+def fact_filters(filters):
+    where, params = '', []
+    for column, value in filters.items():
+        if column in FACT_KEYS:
+            table, key = FACT_KEYS[column]
+            where += f" AND {key} = (SELECT {key} FROM {table} WHERE {column} = ?)"
+        else:
+            where += f" AND {column} = ?"
+        params.append(value)
+    return where, params
+
+def label_groups(query, measures, group_by, order_by):
+    # Join the grouped keys' labels back on and sort
+    if group_by:
+        labels = [f"{FACT_KEYS[c][0]}.{c} as {c}" if c in FACT_KEYS else f"g.{c} as {c}" for c in group_by]
+        joins = ' '.join(
+            f"JOIN {FACT_KEYS[c][0]} ON {FACT_KEYS[c][0]}.{FACT_KEYS[c][1]} = g.{FACT_KEYS[c][1]}"
+            for c in group_by if c in FACT_KEYS
+        )
+        query = f"SELECT {', '.join(labels + [f'g.{alias} as {alias}' for alias, _ in measures])} FROM ({query}) g {joins}"
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    return query
+
+def query_facts(measures, start_date, end_date, filters, group_by, order_by, one):
+    # query_orders against order_facts: the date range and filters become key
+    # lookups served by its covering indexes, labels are joined back after
+    # grouping. Partitioned databases only read the quarters overlapping the
+    # range, several of them in parallel (see query_partitions).
+    keys = [FACT_KEYS[c][1] if c in FACT_KEYS else c for c in group_by]
+    where, filter_params = fact_filters(filters)
+    group = f" GROUP BY {', '.join(keys)}" if keys else ''
+
+    days = query_db("""
+        SELECT (SELECT MIN(Day_Key) FROM dim_date WHERE Order_Date >= ?) as first_day,
+            (SELECT MAX(Day_Key) FROM dim_date WHERE Order_Date <= ?) as last_day
+    """, [start_date, end_date], one=True)
+    partitions = [
+        name for name, first_day, last_day in get_partitions()
+        if days['first_day'] is not None and days['last_day'] is not None
+        and first_day <= days['last_day'] and last_day >= days['first_day']
+    ]
+    params = [days['first_day'], days['last_day']] + filter_params
+
+    if len(partitions) > 1:
+        rows = query_partitions(partitions, measures, keys, where, params, group_by, order_by)
+        if rows is not None:
+            return (rows[0] if rows else None) if one else rows
+
+    # A single partition, or the whole view
+    source = partitions[0] if len(partitions) == 1 else FACTS_TABLE
+    select = keys + [f"{MEASURES[m][2]} as {alias}" for alias, m in measures]
+    query = f"SELECT {', '.join(select)} FROM {source} WHERE Day_Key BETWEEN ? AND ?{where}{group}"
+    return query_db(label_groups(query, measures, group_by, order_by), params, one=one)
+
+def query_partitions(partitions, measures, keys, where, params, group_by, order_by):
+    # Fan out: each partition aggregates its rows into partials, grouped by
+    # the same keys; the partial rows are then combined in one more statement.
+    # None when there are too many partial rows to bind, the caller then
+    # queries the whole view instead.
+    partials, combined = [], []
+    for alias, m in measures:
+        exprs, combine = PARTIALS.get(m, ((MEASURES[m][2],), 'SUM({0})'))
+        names = [f'{alias}_{i}' for i in range(len(exprs))]
+        partials += [f'{expr} as {name}' for expr, name in zip(exprs, names)]
+        combined.append(f'{combine.format(*names)} as {alias}')
+    group = f" GROUP BY {', '.join(keys)}" if keys else ''
+    queries = [
+        (f"SELECT {', '.join(keys + partials)} FROM {name} WHERE Day_Key BETWEEN ? AND ?{where}{group}", params)
+        for name in partitions
+    ]
+
+    pool = get_pool()
+    def run(item):
+        query, args = item
+        conn = pool.acquire()
+        try:
+            start = time.perf_counter()
+            rows = conn.execute(query, args).fetchall()
+            return rows, time.perf_counter() - start
+        finally:
+            pool.release(conn)
+
+    with stage('sql'):
+        results = current_app.extensions['partition_executor'].map(run, queries)
+    for (query, args), (_, seconds) in zip(queries, results):
+        check_slow_query(get_db(), query, args, seconds)
+
+    values = [tuple(row) for rows, _ in results for row in rows]
+    if not values:
+        return []
+    columns = keys + [p.rsplit(' as ', 1)[1] for p in partials]
+    if len(values) * len(columns) > get_db().getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER):
+        return None
+    placeholders = ', '.join(['(' + ', '.join('?' * len(columns)) + ')'] * len(values))
+    query = f"""
+        WITH p({', '.join(columns)}) AS (VALUES {placeholders})
+        SELECT {', '.join(keys + combined)} FROM p{group}
+    """
+    return query_db(label_groups(query, measures, group_by, order_by), [v for row in values for v in row])
@@ -0,0 +1,337 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request, has_request_context, current_app
+
+logger = logging.getLogger(__name__)
+
+# Seconds; Prometheus' default buckets plus a finer low end for cache hits
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def format_labels(names, values):
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+class Histogram:
+    def __init__(self, name, description, labels, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values, seconds):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            return {values: [list(counts), total, count] for values, (counts, total, count) in self._series.items()}
+
+    def add(self, into, values, data):
+        # Sums another process's series into `into` (see ProcessSnapshots)
+        series = into.setdefault(values, [[0] * len(self.buckets), 0.0, 0])
+        series[0] = [a + b for a, b in zip(series[0], data[0])]
+        series[1] += data[1]
+        series[2] += data[2]
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def render(self, series=None):
+        series = self.collect() if series is None else series
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for values, (counts, total, count) in sorted(series.items()):
+            for bound, n in zip(self.buckets + ('+Inf',), counts + [count]):
+                lines.append(f"{self.name}_bucket{format_labels(self.labels + ('le',), values + (bound,))} {n}")
+            lines.append(f'{self.name}_sum{format_labels(self.labels, values)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, values)} {count}')
+        return lines
+
+class CounterMetric:
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._series = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, values):
+        with self._lock:
+            self._series[values] += 1
+
+    def collect(self):
+        with self._lock:
+            return dict(self._series)
+
+    def add(self, into, values, data):
+        into[values] = into.get(values, 0) + data
+
+    def reset(self):
+        with self._lock:
+            self._series = Counter()
+
+    def render(self, series=None):
+        series = self.collect() if series is None else series
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{format_labels(self.labels, values)} {n}' for values, n in sorted(series.items())]
+        return lines
+
+# Per process; with METRICS_MULTIPROC_DIR /api/metrics adds up every worker's (ProcessSnapshots)
+request_duration = Histogram('praxis_request_duration_seconds', 'Request latency', ('blueprint', 'endpoint', 'method', 'status'))
+stage_duration = Histogram('praxis_stage_duration_seconds', 'Time spent per stage of a request', ('blueprint', 'stage'))
+slow_queries = CounterMetric('praxis_slow_queries_total', 'SQL queries slower than SLOW_QUERY_MS', ('blueprint',))
+METRICS = [request_duration, stage_duration, slow_queries]
+
+def current_blueprint():
+    # Work outside a request (warm-up threads, startup) is labelled 'background'
+    if has_request_context():
+        return request.blueprint or 'app'
+    return 'background'
+
+class StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        stage_duration.observe((current_blueprint(), self.name), self.elapsed)
+        if has_request_context():
+            stages = g.setdefault('stages', {})
+            stages[self.name] = stages.get(self.name, 0.0) + self.elapsed
+        return False
+
+def stage(name):
+    # with stage('sql'): ... -- adds to the stage histogram and this
+    # request's Server-Timing header
+    return StageTimer(name)
+
+def check_slow_query(conn, query, args, seconds):
+    # Logs queries over SLOW_QUERY_MS with the plan SQLite chose for them
+    threshold = current_app.config['SLOW_QUERY_MS']
+    if not threshold or seconds * 1000 < threshold:
+        return
+    slow_queries.inc((current_blueprint(),))
+    try:
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, args)]
+    except Exception as e:
+        plan = [f'(unavailable: {e})']
+    logger.warning(
+        "Slow query (%.0f ms) in %s: %s\n  plan: %s",
+        seconds * 1000, current_blueprint(), ' '.join(query.split()), '\n        '.join(plan)
+    )
+
+class ProcessSnapshots:
+    # Multi-process exposition (METRICS_MULTIPROC_DIR, set by gunicorn.conf.py):
+    # each worker writes its series to <dir>/<pid>.json at most every
+    # `interval` seconds after a request, and whichever worker serves
+    # /api/metrics adds up all the files, so a scrape covers every worker.
+    # Files of exited (recycled) workers stay, keeping their counts in the
+    # totals; the server clears the directory when it starts.
+
+    def __init__(self):
+        self.directory = None
+        self.interval = 1.0
+        self._last = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def configure(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # A recycled worker's last requests, still within the interval
+            atexit.register(self.flush)
+
+    def after_fork(self):
+        self._last = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def request_flush(self):
+        # Flush now, or schedule one for when the interval is up, so an idle
+        # worker's last requests still reach the files
+        if not self.directory:
+            return
+        with self._lock:
+            wait = self._last + self.interval - time.monotonic()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._timed_flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._last = time.monotonic()
+        self.flush()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            self._last = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        # Skipped once the server has removed the directory on shutdown
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        state = {metric.name: [[list(values), data] for values, data in metric.collect().items()] for metric in METRICS}
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{path}.tmp', path)
+
+    def merged(self):
+        metrics = {metric.name: metric for metric in METRICS}
+        totals = {name: {} for name in metrics}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for metric_name, entries in state.items():
+                if metric_name in metrics:
+                    for values, data in entries:
+                        metrics[metric_name].add(totals[metric_name], tuple(values), data)
+        return totals
+
+snapshots = ProcessSnapshots()
+
+def render_metrics():
+    totals = None
+    if snapshots.directory:
+        snapshots.flush()
+        totals = snapshots.merged()
+    lines = []
+    for metric in METRICS:
+        lines += metric.render(totals[metric.name] if totals is not None else None)
+    return '\n'.join(lines) + '\n'
+
+def after_fork():
+    # Observations made before the fork (a preloading parent's warm-up) would
+    # otherwise be counted again by every worker
+    for metric in METRICS:
+        metric.reset()
+    snapshots.after_fork()
+
+class SamplingProfiler:
+    # Opt-in (PROFILE_THRESHOLD_MS): one thread samples the stacks of the
+    # threads serving requests every PROFILE_INTERVAL_MS. Requests slower
+    # than the threshold get their samples written in collapsed form
+    # ("frame;frame;frame count"), the input of flamegraph.pl and speedscope.
+
+    def __init__(self):
+        self.threshold = None
+        self.interval = 0.005
+        self.directory = None
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def configure(self, threshold_ms, interval_ms, directory):
+        self.threshold = threshold_ms
+        self.interval = interval_ms / 1000
+        self.directory = directory
+
+    def start_request(self):
+        if self.threshold is None:
+            return
+        # Started lazily so a preloading server parent never runs it
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='sampling-profiler')
+            self._thread.start()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def finish_request(self, seconds, name):
+        if self.threshold is None:
+            return
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and seconds * 1000 >= self.threshold:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{seconds * 1000:.0f}ms.folded")
+            with open(path, 'w') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in samples.items())
+            logger.info("Profiled slow request %s (%.0f ms) to %s", name, seconds * 1000, path)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+profiler = SamplingProfiler()
+
+def init_metrics(app):
+    # Registered before the response layer, so its after_request runs last
+    # and the timings include serialization and compression
+    profiler.configure(app.config['PROFILE_THRESHOLD_MS'], app.config['PROFILE_INTERVAL_MS'], app.config['PROFILE_DIR'])
+    snapshots.configure(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        profiler.start_request()
+
+    def record(status):
+        start = g.pop('request_start', None)
+        if start is None:
+            return None
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        request_duration.observe((request.blueprint or 'app', endpoint, request.method, status), elapsed)
+        profiler.finish_request(elapsed, endpoint)
+        snapshots.request_flush()
+        return elapsed
+
+    @app.after_request
+    def record_request(response):
+        elapsed = record(response.status_code)
+        if elapsed is None:
+            return response
+        timings = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.pop('stages', {}).items()]
+        response.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={elapsed * 1000:.1f}'])
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        # after_request is skipped when an exception propagates (or another
+        # after_request handler raises): count those as 500s, and release
+        # the profiler's samples for the thread
+        record(500)
@@ -0,0 +1,104 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from flask import jsonify
+
+class Saturated(Exception):
+    pass
+
+class JobTimeout(Exception):
+    pass
+
+class AnalyticsPool:
+    # Bounded process pool for CPU-heavy analytics (model fits, MILP solves) so
+    # they don't hold the GIL of the serving process. At most `max_pending`
+    # jobs are admitted at once; beyond that callers get Saturated (HTTP 429).
+    # A timed-out job keeps its slot until it actually finishes.
+
+    def __init__(self, workers=2, max_pending=4, timeout=30):
+        self.configure(workers, max_pending, timeout)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'rejected': 0, 'timed_out': 0}
+
+    def configure(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _get_executor(self):
+        # Created lazily in each server process (never inherited across a fork);
+        # forkserver children don't inherit the server's threads or sockets.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def run(self, fn, *args, timeout=None):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self._count('rejected')
+            raise Saturated()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        self._count('submitted')
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FuturesTimeout:
+            future.cancel()
+            self._count('timed_out')
+            raise JobTimeout()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+            raise
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({'workers': self.workers, 'max_pending': self.max_pending, 'timeout': self.timeout})
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+analytics_pool = AnalyticsPool()
+
+def init_offload(app):
+    analytics_pool.configure(
+        app.config['ANALYTICS_WORKERS'],
+        app.config['ANALYTICS_MAX_PENDING'],
+        app.config['ANALYTICS_TIMEOUT']
+    )
+    atexit.register(analytics_pool.shutdown)
+
+    @app.errorhandler(Saturated)
+    def saturated(e):
+        response = jsonify({'error': 'Analytics workers are busy, retry shortly'})
+        response.status_code = 429
+        response.headers['Retry-After'] = '1'
+        return response
+
+    @app.errorhandler(JobTimeout)
+    def timed_out(e):
+        return jsonify({'error': 'Analytics job timed out'}), 504
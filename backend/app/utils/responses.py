@@ -0,0 +1,108 @@
+import gzip
+import numpy as np
+from flask import request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from .metrics import stage
+
+try:
+    import orjson
+except ImportError: # stdlib json through Flask's default provider
+    orjson = None
+
+try:
+    import brotli
+except ImportError: # gzip only
+    brotli = None
+
+COMPRESSIBLE = {'application/json', 'application/x-ndjson', 'text/plain', 'text/csv'}
+
+class JSONProvider(DefaultJSONProvider):
+    # Flask's provider, timed as the 'serialize' stage
+    def response(self, *args, **kwargs):
+        with stage('serialize'):
+            return super().response(*args, **kwargs)
+
+class OrjsonProvider(JSONProvider):
+    # jsonify() through orjson: numpy arrays/scalars serialize natively and the
+    # body is built as bytes. Keys stay sorted and datetimes keep Flask's format.
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def _options(self):
+        options = self.options | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        with stage('serialize'):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(
+                orjson.dumps(obj, default=self.default, option=self._options()) + b'\n',
+                mimetype=self.mimetype
+            )
+
+def table(columns):
+    # {name: values} with equal lengths -> list of row objects, or with
+    # ?shape=columns the arrays themselves, skipping per-row objects entirely
+    if request.args.get('shape') == 'columns':
+        return {
+            name: np.ascontiguousarray(values) if orjson and isinstance(values, np.ndarray) and values.dtype.kind in 'biuf' else
+            values.tolist() if isinstance(values, np.ndarray) else list(values)
+            for name, values in columns.items()
+        }
+    names = list(columns)
+    values = [v.tolist() if isinstance(v, np.ndarray) else v for v in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def not_built(name):
+    # 503 for a table etl.py precomputes that has not been built yet
+    return jsonify({'error': f'{name} not built yet; run etl.py'}), 503
+
+def precomputed(body, status):
+    # A precomputed table's response, status from scores_status / fits_status.
+    # Stale results (an earlier load's, until etl.py refreshes them) are
+    # flagged and kept out of the result cache, which would otherwise hold
+    # them past the refresh: the data version does not change then.
+    response = jsonify(dict(body, stale=status == 'stale'))
+    response.cache_control.no_store = status == 'stale'
+    return response
+
+def compress_response(response, min_size=1024, gzip_level=6, brotli_quality=5):
+    # Negotiated br/gzip for buffered text responses above min_size
+    if (
+        response.status_code != 200 or response.is_streamed or response.direct_passthrough
+        or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        with stage('compress'):
+            response.set_data(brotli.compress(data, quality=brotli_quality))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        with stage('compress'):
+            response.set_data(gzip.compress(data, gzip_level))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_responses(app):
+    app.json = OrjsonProvider(app) if orjson is not None else JSONProvider(app)
+
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    if min_size is not None:
+        app.after_request(lambda response: compress_response(
+            response, min_size, app.config['COMPRESS_GZIP_LEVEL'], app.config['COMPRESS_BROTLI_QUALITY']
+        ))
@@ -0,0 +1,105 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Libraries the request handlers import on first use. The solver stack
+# (scipy, pulp) and IsolationForest are only ever imported by the analytics
+# process pool, so they are not listed.
+HEAVY_MODULES = ['pandas', 'pyarrow.parquet', 'sklearn.cluster', 'xgboost']
+# Imported at boot in both modes, and not deferred: the response layer and
+# most route and service modules use numpy at module level (~70 ms here)
+BOOT_MODULES = ['numpy']
+
+def import_modules(names):
+    # {name: ms} for the modules this call actually had to import
+    timings = {}
+    for name in names:
+        if name in sys.modules:
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError: # optional (pyarrow)
+            continue
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+class Startup:
+    # Eager mode (default) imports the heavy libraries and loads the model in
+    # create_app, which is what a preloading server wants: workers fork with
+    # everything in place. LAZY_STARTUP skips both for fast boots; the
+    # warm-up thread then imports them in the background once serving.
+
+    def __init__(self):
+        self.app = None
+        self.lazy = False
+        self.warmup = False
+        self.report = None
+        self._thread = None
+
+    def init_app(self, app, boot_start, create_start):
+        # Called last in create_app, with when the app package started
+        # importing and when create_app was entered
+        self.app = app
+        self.lazy = app.config['LAZY_STARTUP']
+        self.warmup = self.lazy and app.config['WARMUP_IMPORTS']
+
+        imported = {} if self.lazy else import_modules(HEAVY_MODULES)
+        if not self.lazy:
+            from ..services.model_registry import model_registry
+            model_registry.ensure_loaded()
+
+        now = time.perf_counter()
+        self.report = {
+            'mode': 'lazy' if self.lazy else 'eager',
+            'total_ms': round((now - boot_start) * 1000, 1),
+            'import_ms': round((create_start - boot_start) * 1000, 1),
+            'create_app_ms': round((now - create_start) * 1000, 1),
+            'heavy_imports_ms': imported,
+            'deferred': [name for name in HEAVY_MODULES if name not in sys.modules],
+            'boot_imports': [name for name in BOOT_MODULES if name in sys.modules],
+            'budget_ms': app.config['STARTUP_BUDGET_MS']
+        }
+        app.extensions['startup'] = self.report
+        over = self.report['budget_ms'] and self.report['total_ms'] > self.report['budget_ms']
+        logger.log(
+            logging.WARNING if over else logging.INFO,
+            "%s startup took %.0f ms (imports %.0f ms, create_app %.0f ms; budget %s ms)%s%s",
+            self.report['mode'].capitalize(), self.report['total_ms'], self.report['import_ms'],
+            self.report['create_app_ms'], self.report['budget_ms'],
+            ''.join(f'; {name} {ms:.0f} ms' for name, ms in imported.items()),
+            f"; deferred: {', '.join(self.report['deferred'])}" if self.report['deferred'] else ''
+        )
+
+        if self.warmup and not app.config['DEFER_BACKGROUND_THREADS']:
+            self.start()
+
+    def start(self):
+        if self.warmup and self._thread is None:
+            self._thread = threading.Thread(target=self.warm_up, daemon=True, name='startup-warmup')
+            self._thread.start()
+
+    def after_fork(self):
+        self._thread = None
+        self.start()
+
+    def warm_up(self):
+        from ..services.model_registry import model_registry
+
+        start = time.perf_counter()
+        try:
+            timings = import_modules(HEAVY_MODULES)
+            model_registry.ensure_loaded()
+        except Exception:
+            logger.exception("Startup warm-up failed")
+            return
+        logger.info(
+            "Warm-up done in %.0f ms%s", (time.perf_counter() - start) * 1000,
+            ''.join(f'; {name} {ms:.0f} ms' for name, ms in timings.items())
+        )
+
+startup = Startup()
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# gunicorn -c backend/gunicorn.conf.py, from the repository root (paths in
+# app/config.py are relative to the working directory)
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:5002')
+
+# Threaded workers: SQLite reads, XGBoost predict and numpy release the GIL;
+# CPU-bound fits/solves go to each worker's analytics process pool
+# (ANALYTICS_WORKERS processes per server worker).
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.environ.get('THREADS', 8))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth, staggered by jitter
+max_requests = int(os.environ.get('MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+# Load the app (models, libraries, connection pool config) before forking;
+# background threads are started per worker in post_fork
+preload_app = True
+os.environ.setdefault('DEFER_BACKGROUND_THREADS', '1')
+
+# Workers write their metrics here so any worker's /api/metrics reports the
+# whole server (app/utils/metrics.py); one directory per server run
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'praxis-metrics-{os.getpid()}'))
+
+def on_starting(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.after_fork()
+
+def on_exit(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
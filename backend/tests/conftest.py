@@ -0,0 +1,52 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'backend')]
+
+import etl
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    # A small data set built by etl.py's own loader, shared by every test
+    directory = tmp_path_factory.mktemp('data')
+    etl.DB_PATH = str(directory / 'superstore_enhanced.db')
+    etl.PARQUET_DIR = str(directory / 'orders_parquet')
+    etl.ARCHIVE_DIR = str(directory / 'archive')
+    etl.load_to_db(etl.generate_data(3000, seed=7))
+    return directory
+
+@pytest.fixture
+def scratch_etl(data_dir, tmp_path, monkeypatch):
+    # etl.py writing to an empty directory of its own, for tests that load or
+    # archive; the session data set is restored afterwards
+    monkeypatch.setattr(etl, 'DB_PATH', str(tmp_path / 'superstore_enhanced.db'))
+    monkeypatch.setattr(etl, 'PARQUET_DIR', str(tmp_path / 'orders_parquet'))
+    monkeypatch.setattr(etl, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    return etl
+
+@pytest.fixture(scope='session')
+def app(data_dir):
+    from app import create_app
+    from app.config import Config
+
+    class TestConfig(Config):
+        TESTING = True
+        DATABASE_URI = str(data_dir / 'superstore_enhanced.db')
+        PARQUET_DIR = str(data_dir / 'orders_parquet')
+        ANOMALY_STATE_PATH = str(data_dir / 'anomaly_state.json')
+        MODEL_DIR = os.path.join(ROOT, 'backend', 'static', 'models')
+        PROFILE_DIR = str(data_dir / 'profiles')
+        CACHE_DIR = None
+        MODEL_RELOAD_INTERVAL = 0
+        DASHBOARD_WARM_INTERVAL = 0
+        AUTH_REQUIRED = False
+        JWT_SECRET_KEY = 'test-secret-key-of-at-least-32-bytes'
+        PROFILE_THRESHOLD_MS = None
+
+    return create_app(TestConfig)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
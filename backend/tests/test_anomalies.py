@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from app.routes import anomalies
+from app.services.anomaly_detector import StreamingAnomalyDetector, series_key
+
+def test_anomaly_alerts(client):
+    res = client.get('/api/anomaly-alerts?region=North')
+    assert res.status_code == 200
+    assert all({'date', 'value', 'type', 'severity'} <= set(a) for a in res.get_json())
+
+def test_anomaly_alerts_isolation_forest(client):
+    res = client.get('/api/anomaly-alerts?mode=isolation_forest')
+    assert res.status_code == 200
+    assert len(res.get_json()) > 0
+
+def test_anomaly_alerts_unknown_series(client):
+    assert client.get('/api/anomaly-alerts?region=Atlantis').status_code == 400
+
+def test_isolation_forest_unknown_series(client):
+    res = client.get('/api/anomaly-alerts?mode=isolation_forest&region=Atlantis')
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
+
+def test_changed_history_reseeds_detector(app, tmp_path, monkeypatch):
+    days = pd.date_range('2024-01-01', periods=60).strftime('%Y-%m-%d 00:00:00')
+    daily = pd.DataFrame({'Order_Date': days, 'Region': 'North', 'Category': 'Furniture', 'Sales': 100.0 + np.arange(60) % 7})
+    state = {'data_version': '1', 'base_version': '1'}
+    monkeypatch.setattr(anomalies, 'get_etl_state', lambda: dict(state))
+    monkeypatch.setattr(anomalies, 'load_daily_sales', lambda after=None: daily[daily['Order_Date'] > after] if after else daily)
+    detector = StreamingAnomalyDetector(str(tmp_path / 'state.json'))
+
+    with app.test_request_context():
+        anomalies.refresh(detector)
+        assert detector.anomalies(series_key())['date'] == []
+
+        # An incremental load spikes a day the detector has already scored
+        daily.loc[40, 'Sales'] = 10000.0
+        state.update(data_version='2', history_version='2', history_from=days[40])
+        anomalies.refresh(detector)
+    assert detector.anomalies(series_key())['date'] == [days[40][:10]]
+    assert detector.history_version == '2'
@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+import pytest
+from app.utils.auth import verifier, AuthError, KeyRing
+
+def login(client, password='admin'):
+    return client.post('/api/auth/login', json={'username': 'admin', 'password': password})
+
+def test_login_and_cached_verification(client):
+    res = login(client)
+    assert res.status_code == 200
+    headers = {'Authorization': f"Bearer {res.get_json()['token']}"}
+    before = client.get('/api/auth/stats').get_json()
+
+    assert client.get('/api/kpis', headers=headers).status_code == 200
+    assert client.get('/api/kpis', headers=headers).status_code == 200
+    after = client.get('/api/auth/stats').get_json()
+    assert after['misses'] == before['misses'] + 1
+    assert after['hits'] == before['hits'] + 1
+
+def test_bad_credentials(client):
+    assert login(client, 'wrong').status_code == 401
+
+def test_invalid_token_is_rejected(client):
+    before = client.get('/api/auth/stats').get_json()['rejected']
+    res = client.get('/api/kpis', headers={'Authorization': 'Bearer not-a-jwt'})
+    assert res.status_code == 401
+    assert res.get_json()['message'] == 'Invalid token'
+    assert client.get('/api/auth/stats').get_json()['rejected'] == before + 1
+
+def test_concurrent_rejections_are_all_counted():
+    before = verifier.get_stats()['rejected']
+
+    def reject():
+        for _ in range(200):
+            with pytest.raises(AuthError):
+                verifier.verify('not-a-jwt')
+    threads = [threading.Thread(target=reject) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert verifier.get_stats()['rejected'] == before + 1600
+
+@pytest.mark.parametrize('contents', [
+    '{"current": "k3", "keys": {"k2": "second-secret"}}',
+    '{"current": ["k2"], "keys": {"k2": "second-secret"}}',
+    '{"current": "k2", "keys": {"k2": ""}}',
+    '{"current": "k2", "keys": ["k2"]}',
+    '{"current": "k2"',
+])
+def test_invalid_keys_file_keeps_the_previous_keys(tmp_path, contents):
+    path = tmp_path / 'jwt_keys.json'
+    path.write_text('{"current": "k1", "keys": {"k1": "first-secret"}}')
+    ring = KeyRing('default-secret', str(path), check_interval=0)
+    assert ring.signing_key() == ('k1', 'first-secret')
+
+    path.write_text(contents)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert ring.refresh() is False
+    assert ring.signing_key() == ('k1', 'first-secret')
@@ -0,0 +1,44 @@
+import os
+import time
+from app.utils.cache import ResultCache
+
+def disk_files(directory):
+    return sorted(os.path.relpath(os.path.join(d, f), directory) for d, _, files in os.walk(directory) for f in files)
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.set(('kpis', (), 1), b'payload', version=1)
+
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    assert restarted.get(('kpis', (), 1), version=1) == b'payload'
+    assert restarted.stats['disk_hits'] == 1
+
+def test_new_data_version_prunes_old_files(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.set(('kpis', (), 1), b'old', version=1)
+    cache.set(('profit', (), 1), b'old', version=1)
+    assert len(disk_files(tmp_path)) == 2
+
+    cache.set(('kpis', (), 2), b'new', version=2)
+    assert [os.path.dirname(f) for f in disk_files(tmp_path)] == ['2']
+    assert cache.stats['disk_pruned'] == 2
+
+def test_prune_removes_expired_files(tmp_path):
+    cache = ResultCache(ttl=60, disk_dir=str(tmp_path))
+    cache.set(('kpis', (), 1), b'fresh', version=1)
+    cache.set(('profit', (), 1), b'stale', version=1)
+    stale = os.path.join(tmp_path, '1', sorted(os.listdir(os.path.join(tmp_path, '1')))[0])
+    os.utime(stale, (time.time() - 1, time.time() - 1))
+
+    assert cache.prune_disk(1) == 1
+    assert len(disk_files(tmp_path)) == 1
+
+def test_cache_stats(client):
+    response = client.get('/api/cache-stats')
+    assert response.status_code == 200
+    assert {'hits', 'misses', 'entries', 'disk_pruned', 'hit_rate'} <= set(response.get_json())
+
+def test_cached_endpoint_hits_on_repeat(client):
+    path = '/api/kpis?start_date=2024-01-01&end_date=2024-06-30'
+    assert client.get(path).headers['X-Cache'] == 'MISS'
+    assert client.get(path).headers['X-Cache'] == 'HIT'
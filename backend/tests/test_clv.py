@@ -0,0 +1,121 @@
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services import columnar, rfm
+from app.services.rfm import build_rfm_table, scores_current, rfm_columnar, RFM_FACTS_QUERY
+
+def test_etl_precomputes_scores(data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        assert scores_current(conn)
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('batch_rows', [columnar.BATCH_ROWS, 7])
+def test_columnar_rfm_matches_sql(data_dir, monkeypatch, batch_rows):
+    # Small batches split customers and days across batches
+    monkeypatch.setattr(rfm, 'iter_batches', functools.partial(columnar.iter_batches, batch_rows=batch_rows))
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        expected = conn.execute(RFM_FACTS_QUERY).fetchall()
+    finally:
+        conn.close()
+    rows = rfm_columnar(str(data_dir / 'orders_parquet'))
+    assert [row[:2] + row[3:4] for row in rows] == [row[:2] + row[3:4] for row in expected]
+    assert [row[2] for row in rows] == pytest.approx([row[2] for row in expected])
+    assert [row[4] for row in rows] == pytest.approx([row[4] for row in expected])
+
+def test_rebuild_replaces_the_table(data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        before = conn.execute('SELECT COUNT(*) FROM customer_rfm').fetchone()[0]
+        with conn:
+            conn.execute("DELETE FROM etl_state WHERE key = 'rfm_version'")
+        assert build_rfm_table(conn, parquet_dir=None) == before
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'customer_rfm%' OR name LIKE 'idx_rfm%'")}
+        assert tables == {'customer_rfm', 'idx_rfm_segment', 'idx_rfm_cluster'}
+        assert scores_current(conn) and not conn.in_transaction
+        # Already built for this load: nothing to do
+        assert build_rfm_table(conn, parquet_dir=None) is None
+    finally:
+        conn.close()
+
+def test_concurrent_rebuilds(data_dir):
+    # Builders race to store the same load; one stores it, the rest find it current
+    path = data_dir / 'superstore_enhanced.db'
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM etl_state WHERE key = 'rfm_version'")
+    conn.close()
+
+    def build():
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            return build_rfm_table(conn, parquet_dir=None)
+        finally:
+            conn.close()
+    with ThreadPoolExecutor(4) as pool:
+        counts = list(pool.map(lambda _: build(), range(4)))
+    assert len([count for count in counts if count is not None]) == 1
+    conn = sqlite3.connect(path)
+    try:
+        assert scores_current(conn)
+    finally:
+        conn.close()
+
+def test_stale_scores_are_served_uncached(client, data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        with conn:
+            conn.execute("DELETE FROM etl_state WHERE key = 'rfm_version'")
+        for _ in range(2):
+            res = client.get('/api/clv-churn/customers?limit=7')
+            assert res.status_code == 200 and res.get_json()['stale'] is True
+            assert res.headers['X-Cache'] == 'MISS'
+        # GET handlers don't rebuild; etl.py does
+        assert not scores_current(conn)
+        build_rfm_table(conn, parquet_dir=None)
+        assert client.get('/api/clv-churn/customers?limit=7').get_json()['stale'] is False
+    finally:
+        conn.close()
+
+def test_missing_scores_return_503(client, data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        with conn:
+            conn.execute('ALTER TABLE customer_rfm RENAME TO customer_rfm_saved')
+        res = client.get('/api/clv-churn')
+        assert res.status_code == 503 and 'error' in res.get_json()
+    finally:
+        with conn:
+            conn.execute('ALTER TABLE customer_rfm_saved RENAME TO customer_rfm')
+        conn.close()
+
+def test_clv_churn(client):
+    res = client.get('/api/clv-churn')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['total_customers'] > 0
+    assert sum(s['count'] for s in body['segments']) == body['total_customers']
+    assert sum(c['customers'] for c in body['clusters']) == body['total_customers']
+
+def test_clv_customers(client):
+    res = client.get('/api/clv-churn/customers?churn_risk=Low&limit=5&offset=2')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert (body['limit'], body['offset']) == (5, 2)
+    monetary = [c['Monetary'] for c in body['customers']]
+    assert monetary == sorted(monetary, reverse=True)
+    assert all(c['Churn_Risk'] == 'Low' for c in body['customers'])
+
+def test_clv_customers_clamps_limit(client):
+    body = client.get('/api/clv-churn/customers?limit=-1&offset=-5').get_json()
+    assert (body['limit'], body['offset']) == (1, 0)
+    assert len(body['customers']) == 1
+
+@pytest.mark.parametrize('args', ['limit=abc', 'offset=1.5'])
+def test_clv_customers_rejects_invalid_paging(client, args):
+    res = client.get(f'/api/clv-churn/customers?{args}')
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
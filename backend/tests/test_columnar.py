@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from app.services.columnar import is_current, stored_version, read_columns, iter_batches, month_filter, VERSION_FILE
+
+def read(path, query, args=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(query, args).fetchall()
+    finally:
+        conn.close()
+
+def version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return stored_version(conn)
+    finally:
+        conn.close()
+
+def test_export_matches_orders(data_dir):
+    db, parquet = str(data_dir / 'superstore_enhanced.db'), str(data_dir / 'orders_parquet')
+    assert is_current(parquet, version(db))
+    months = [row[0] for row in read(db, 'SELECT DISTINCT substr(Order_Date, 1, 7) FROM orders ORDER BY 1')]
+    assert sorted(name for name in os.listdir(parquet) if name.startswith('Order_Month=')) == [f'Order_Month={m}' for m in months]
+
+    data = read_columns(parquet, ['Order_ID', 'Region', 'Sales'])
+    assert isinstance(data['Order_ID'], np.ndarray) and isinstance(data['Region'], pd.Categorical)
+    order = np.argsort(data['Order_ID'])
+    columnar = list(zip(data['Order_ID'][order].tolist(), np.asarray(data['Region'])[order].tolist(), data['Sales'][order].tolist()))
+    assert columnar == read(db, 'SELECT Order_ID, Region, Sales FROM orders ORDER BY Order_ID')
+
+def test_month_filter_reads_only_those_months(data_dir):
+    db, parquet = str(data_dir / 'superstore_enhanced.db'), str(data_dir / 'orders_parquet')
+    data = read_columns(parquet, ['Order_Date'], filters=month_filter('2024-03-10', '2024-05-02'))
+    months = set(pd.DatetimeIndex(data['Order_Date']).strftime('%Y-%m'))
+    assert months == {'2024-03', '2024-04', '2024-05'}
+    assert [(len(data['Order_Date']),)] == read(db, "SELECT COUNT(*) FROM orders WHERE Order_Date >= '2024-03-01' AND Order_Date < '2024-06-01'")
+
+def test_batches_cover_every_row_once(data_dir):
+    parquet = str(data_dir / 'orders_parquet')
+    ids = [data['Order_ID'] for _, data in iter_batches(parquet, ['Order_ID'], batch_rows=50)]
+    assert max(len(batch) for batch in ids) == 50
+    assert np.sort(np.concatenate(ids)).tolist() == np.sort(read_columns(parquet, ['Order_ID'])['Order_ID']).tolist()
+
+def test_incremental_load_rewrites_only_affected_months(scratch_etl):
+    scratch_etl.load_to_db(scratch_etl.generate_data(1000, seed=1))
+    partition = os.path.join(scratch_etl.PARQUET_DIR, 'Order_Month=2023-02', 'part-0.parquet')
+    before = os.stat(partition).st_mtime_ns
+
+    delta = scratch_etl.generate_data(50, start_id=1001, seed=2)
+    delta['Order_Date'] = pd.Timestamp('2024-06-15')
+    scratch_etl.load_incremental(delta)
+    assert os.stat(partition).st_mtime_ns == before
+    assert is_current(scratch_etl.PARQUET_DIR, version(scratch_etl.DB_PATH))
+    june = read_columns(os.path.join(scratch_etl.PARQUET_DIR, 'Order_Month=2024-06'), ['Order_ID'])['Order_ID']
+    assert set(range(1001, 1051)) <= set(june.tolist())
+
+def test_stale_export_is_not_used(data_dir, tmp_path):
+    parquet = data_dir / 'orders_parquet'
+    current = version(str(data_dir / 'superstore_enhanced.db'))
+    assert is_current(str(parquet), current)
+    assert not is_current(str(parquet), f'{current}0')
+    assert not is_current(str(tmp_path), current) # no export at all
+    assert (parquet / VERSION_FILE).read_text().strip() == str(current)
@@ -0,0 +1,47 @@
+import gzip
+import json
+import pytest
+from flask import Flask
+from app.routes.dashboard import WIDGETS, SnapshotWarmer
+from app.utils.cache import result_cache
+
+def test_snapshot(client):
+    res = client.get('/api/dashboard-snapshot')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert set(body['widgets']) == set(WIDGETS)
+    assert all(w['status'] == 200 for w in body['widgets'].values())
+    assert client.get('/api/dashboard-snapshot', headers={'If-None-Match': res.headers['ETag']}).status_code == 304
+
+def test_snapshot_gzip_and_widget_filter(client):
+    res = client.get('/api/dashboard-snapshot?widgets=kpis,pricing,unknown', headers={'Accept-Encoding': 'gzip'})
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert set(json.loads(gzip.decompress(res.data))['widgets']) == {'kpis', 'pricing'}
+
+def test_failing_widget_does_not_fail_snapshot(app, client, monkeypatch):
+    def broken():
+        raise RuntimeError('boom')
+    monkeypatch.setitem(app.view_functions, 'clv.get_clv_churn', broken)
+    result_cache.clear()
+
+    res = client.get('/api/dashboard-snapshot?widgets=kpis,clv_churn')
+    assert res.status_code == 200
+    assert 'ETag' not in res.headers
+    widgets = res.get_json()['widgets']
+    assert widgets['kpis']['status'] == 200
+    assert widgets['clv_churn']['status'] == 500
+    assert 'error' in widgets['clv_churn']['data']
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_warmer_waits_for_a_request_in_lazy_mode(monkeypatch, lazy):
+    app = Flask(__name__)
+    app.config.update(LAZY_STARTUP=lazy, DASHBOARD_WARM_INTERVAL=5, DEFER_BACKGROUND_THREADS=True)
+    app.route('/ping')(lambda: 'pong')
+    warmer = SnapshotWarmer()
+    monkeypatch.setattr(warmer, '_run', lambda: None)
+
+    warmer.init_app(app)
+    warmer.after_fork() # a server worker starting
+    assert (warmer._thread is None) == lazy
+    app.test_client().get('/ping')
+    assert warmer._thread is not None
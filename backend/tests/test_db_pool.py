@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+import pytest
+from app.utils.db import ConnectionPool
+
+@pytest.fixture
+def pool(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'pool.db')
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=2)
+    yield pool
+    pool.close_all()
+
+def test_connections_are_reused(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+
+def test_readers_are_read_only_and_writer_uses_wal(pool):
+    conn = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute('INSERT INTO t VALUES (1)')
+    assert pool.writer.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    pool.release(conn)
+
+def test_release_rolls_back_open_transactions(pool):
+    conn = pool.acquire()
+    conn.execute('BEGIN')
+    conn.execute('SELECT * FROM t').fetchall()
+    pool.release(conn)
+    assert not conn.in_transaction
+
+def test_overflow_connections_are_closed(pool):
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[-1].execute('SELECT 1')
+    assert pool.acquire() is conns[1]
+
+def test_readers_see_committed_writes(pool):
+    reader = pool.acquire()
+    with pool.write_lock, pool.writer as writer:
+        writer.execute('INSERT INTO t VALUES (1)')
+    assert reader.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 1
+    pool.release(reader)
+
+def test_concurrent_readers(pool):
+    errors = []
+
+    def read():
+        try:
+            for _ in range(50):
+                conn = pool.acquire()
+                conn.execute('SELECT COUNT(*) FROM t').fetchone()
+                pool.release(conn)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+def test_after_fork_drops_inherited_connections(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    writer = pool.writer
+    pool.after_fork(warm=1)
+    assert pool.acquire() is not conn
+    assert pool.writer is not writer
@@ -0,0 +1,99 @@
+import sqlite3
+import pandas as pd
+import pytest
+
+ROLLUP = '''
+    SELECT CAST(Order_Date AS TEXT), Region, Category, Sub_Category, Is_Promo,
+        COUNT(*), ROUND(SUM(Sales), 6), ROUND(SUM(Profit), 6), SUM(Quantity), ROUND(SUM(Discount), 6), ROUND(SUM(Sales * Discount), 6)
+    FROM orders GROUP BY 1, 2, 3, 4, 5 ORDER BY 1, 2, 3, 4, 5
+'''
+STORED_ROLLUP = '''
+    SELECT CAST(Order_Date AS TEXT), Region, Category, Sub_Category, Is_Promo,
+        Order_Count, ROUND(Sales, 6), ROUND(Profit, 6), Quantity, ROUND(Discount, 6), ROUND(Discounted_Sales, 6)
+    FROM daily_rollup ORDER BY 1, 2, 3, 4, 5
+'''
+MONTHLY = "SELECT strftime('%Y-%m', Order_Date), ROUND(SUM(Sales), 6), ROUND(SUM(Profit), 6) FROM orders GROUP BY 1 ORDER BY 1"
+STORED_MONTHLY = 'SELECT Month, ROUND(Total_Sales, 6), ROUND(Total_Profit, 6) FROM monthly_sales ORDER BY 1'
+
+def read(etl, query, args=()):
+    conn = sqlite3.connect(etl.DB_PATH)
+    try:
+        return conn.execute(query, args).fetchall()
+    finally:
+        conn.close()
+
+def assert_summaries_consistent(etl):
+    assert read(etl, STORED_ROLLUP) == read(etl, ROLLUP)
+    assert read(etl, STORED_MONTHLY) == read(etl, MONTHLY)
+
+@pytest.fixture
+def loaded(scratch_etl):
+    scratch_etl.load_to_db(scratch_etl.generate_data(1000, seed=1))
+    return scratch_etl
+
+def delta(etl):
+    # 200 new orders plus 20 changed ones, half of them moved to another day
+    new = etl.generate_data(200, start_id=1001, seed=2)
+    changed = pd.DataFrame(read(etl, 'SELECT * FROM orders WHERE Order_ID <= 20 ORDER BY Order_ID'), columns=new.columns)
+    changed['Order_Date'] = pd.to_datetime(changed['Order_Date'])
+    changed['Sales'] = changed['Sales'] * 2
+    changed.loc[changed['Order_ID'] <= 10, 'Order_Date'] = pd.Timestamp('2024-06-15')
+    return pd.concat([new, changed], ignore_index=True)
+
+def test_full_load_sets_watermark(loaded):
+    conn = sqlite3.connect(loaded.DB_PATH)
+    assert loaded.get_watermark(conn) == 1000
+    conn.close()
+    assert_summaries_consistent(loaded)
+
+def test_incremental_merge(loaded):
+    before = dict(read(loaded, 'SELECT Order_ID, Sales FROM orders WHERE Order_ID <= 20'))
+    base = read(loaded, "SELECT value FROM etl_state WHERE key = 'base_version'")
+
+    loaded.load_incremental(delta(loaded))
+    assert read(loaded, 'SELECT COUNT(*), MAX(Order_ID) FROM orders') == [(1200, 1200)]
+    assert read(loaded, "SELECT value FROM etl_state WHERE key = 'order_id_watermark'") == [(1200,)]
+    after = dict(read(loaded, 'SELECT Order_ID, Sales FROM orders WHERE Order_ID <= 20'))
+    assert after == pytest.approx({k: v * 2 for k, v in before.items()})
+    assert read(loaded, "SELECT COUNT(*) FROM orders WHERE Order_ID <= 10 AND Order_Date LIKE '2024-06-15%'") == [(10,)]
+    # Incremental loads keep the base version, so streaming consumers don't reseed
+    assert read(loaded, "SELECT value FROM etl_state WHERE key = 'base_version'") == base
+    assert_summaries_consistent(loaded)
+
+def test_reloading_a_delta_is_idempotent(loaded):
+    changes = delta(loaded)
+    loaded.load_incremental(changes)
+    orders = read(loaded, 'SELECT * FROM orders ORDER BY Order_ID')
+    version = read(loaded, "SELECT value FROM etl_state WHERE key = 'data_version'")
+
+    loaded.load_incremental(changes)
+    assert read(loaded, 'SELECT * FROM orders ORDER BY Order_ID') == orders
+    assert read(loaded, "SELECT value FROM etl_state WHERE key = 'data_version'") != version
+    assert_summaries_consistent(loaded)
+
+def test_incremental_without_watermark_does_a_full_load(scratch_etl):
+    scratch_etl.load_incremental(scratch_etl.generate_data(300, seed=4))
+    assert read(scratch_etl, 'SELECT COUNT(*) FROM orders') == [(300,)]
+    assert_summaries_consistent(scratch_etl)
+
+def test_streaming_load(scratch_etl):
+    scratch_etl.load_streaming(2500, chunk_size=1000, seed=5)
+    assert read(scratch_etl, 'SELECT COUNT(*), MIN(Order_ID), MAX(Order_ID) FROM orders') == [(2500, 1, 2500)]
+    assert_summaries_consistent(scratch_etl)
+    # Scores and fits were refreshed from the chunked Parquet scan
+    state = dict(read(scratch_etl, 'SELECT key, value FROM etl_state'))
+    assert state['rfm_version'] == state['elasticity_version'] == state['data_version']
+
+def test_history_version_marks_changes_to_past_days(loaded):
+    # Appending later days leaves the loaded history alone...
+    appended = loaded.generate_data(50, start_id=1001, seed=3)
+    appended['Order_Date'] = pd.Timestamp('2026-01-05')
+    loaded.load_incremental(appended)
+    assert read(loaded, "SELECT COUNT(*) FROM etl_state WHERE key LIKE 'history_%'") == [(0,)]
+
+    # ...changing or back-dating orders does not
+    loaded.load_incremental(delta(loaded))
+    state = dict(read(loaded, 'SELECT key, value FROM etl_state'))
+    assert state['history_version'] == state['data_version']
+    assert state['history_from'] <= '2024-06-15 00:00:00'
+    assert_summaries_consistent(loaded)
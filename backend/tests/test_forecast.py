@@ -0,0 +1,101 @@
+import json
+import pytest
+
+SERIES = {'region': 'North', 'category': 'Furniture', 'sub_category': 'Chairs'}
+
+def test_forecast(client):
+    res = client.get('/api/demand-forecast?days=14')
+    assert res.status_code == 200
+    rows = res.get_json()
+    assert len(rows) == 14
+    assert all(r['lower_ci'] <= r['forecast'] <= r['upper_ci'] for r in rows)
+
+@pytest.mark.parametrize('days', ['-1', '0', 'abc', '100000'])
+def test_forecast_rejects_invalid_days(client, days):
+    res = client.get(f'/api/demand-forecast?days={days}')
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
+
+def test_forecast_unknown_series(client):
+    assert client.get('/api/demand-forecast?region=Atlantis').status_code == 400
+
+def test_batch(client):
+    res = client.post('/api/demand-forecast/batch', json={'series': [SERIES, dict(SERIES, region='Atlantis', days=3)], 'days': 7})
+    assert res.status_code == 200
+    first, second = res.get_json()['series']
+    assert 'forecast' in first and 'error' in second
+
+@pytest.mark.parametrize('endpoint', ['batch', 'scenarios'])
+def test_non_string_labels_are_per_item_errors(client, endpoint):
+    series = [SERIES, dict(SERIES, region=['x']), dict(SERIES, category={'a': 1}), dict(SERIES, sub_category=None)]
+    res = client.post(f'/api/demand-forecast/{endpoint}', json={'series': series, 'days': 5})
+    assert res.status_code == 200
+    items = res.get_json()['series']
+    assert 'error' not in items[0]
+    assert all(item['error'] == 'Invalid category or region' for item in items[1:])
+
+def test_batch_ndjson(client):
+    res = client.post('/api/demand-forecast/batch?format=ndjson', json={'series': [SERIES, SERIES], 'days': 5})
+    assert res.status_code == 200
+    assert res.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in res.get_data(as_text=True).splitlines()]
+    assert len(lines) == 2 and all('forecast' in line for line in lines)
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'series': ['x']},
+    {'series': {'region': 'North'}},
+    {'series': [SERIES], 'days': 'abc'},
+    {'series': [dict(SERIES, days=-1)]},
+    {'series': [dict(SERIES, days=7.5)]},
+    {'series': [dict(SERIES, days=[7])]},
+    {'series': [SERIES] * 1000, 'days': 730}
+])
+def test_batch_rejects_invalid_body(client, body):
+    res = client.post('/api/demand-forecast/batch', json=body)
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
+
+def test_models_reports_predict_calls(client):
+    before = client.get('/api/models').get_json()['current']['predict_calls']
+    client.get('/api/demand-forecast?days=3')
+    current = client.get('/api/models').get_json()['current']
+    assert current['version']
+    assert current['predict_calls'] == before + 1
+    assert current['avg_predict_ms'] is not None
+    # The shipped legacy model has no calibrated intervals
+    assert current['intervals'] == 'fixed' and current['interval_calibration'] is None
+
+def test_scenarios(client):
+    grid = {'Discount': {'start': 0, 'stop': 0.3, 'num': 4}, 'Is_Promo': [0, 1]}
+    res = client.post('/api/demand-forecast/scenarios', json={'series': [SERIES, dict(SERIES, region='Atlantis')], 'days': 14, 'grid': grid})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['scenarios'] == 8 and body['days'] == 14
+    known, unknown = body['series']
+    assert len(known['surface']) == 8 and 'error' in unknown
+    assert {s['discount'] for s in known['surface']} == {0, 0.1, 0.2, 0.3}
+
+def test_scenario_baseline_matches_forecast(client):
+    res = client.post('/api/demand-forecast/scenarios', json={'series': [SERIES], 'days': 10, 'grid': {'Discount': 0.1}})
+    surface = res.get_json()['series'][0]['surface'][0]
+    forecast = client.get('/api/demand-forecast?days=10').get_json()
+    assert surface['uplift_pct'] == 0
+    assert surface['demand'] == pytest.approx(sum(r['forecast'] for r in forecast), abs=1)
+
+@pytest.mark.parametrize('body', [
+    {'series': []},
+    {'series': ['x']},
+    {'series': [SERIES], 'days': 'abc'},
+    {'series': [SERIES], 'days': 0},
+    {'series': [SERIES], 'grid': {'Temperature': [1]}},
+    {'series': [SERIES], 'grid': {'Discount': [2]}},
+    {'series': [SERIES], 'grid': {'Is_Promo': [0.5]}},
+    {'series': [SERIES], 'grid': {'Discount': {'start': 0, 'stop': 1, 'num': 5000}}},
+    {'series': [SERIES], 'grid': {'Discount': {'start': None, 'stop': 1}}},
+    {'series': [SERIES] * 100, 'days': 730, 'grid': {'Discount': {'start': 0, 'stop': 1, 'num': 100}}}
+])
+def test_scenarios_reject_invalid_body(client, body):
+    res = client.post('/api/demand-forecast/scenarios', json=body)
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
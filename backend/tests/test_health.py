@@ -0,0 +1,19 @@
+import threading
+from app.utils.offload import analytics_pool
+
+def test_health(client):
+    assert client.get('/api/health').get_json()['status'] == 'healthy'
+
+def test_pool_stats(client):
+    stats = client.get('/api/pool-stats').get_json()
+    assert {'submitted', 'rejected', 'timed_out', 'workers', 'max_pending', 'timeout'} <= set(stats)
+
+def test_saturated_pool_returns_429(client, monkeypatch):
+    monkeypatch.setattr(analytics_pool, '_slots', threading.BoundedSemaphore(1))
+    analytics_pool._slots.acquire()
+    rejected = analytics_pool.get_stats()['rejected']
+
+    res = client.get('/api/anomaly-alerts?mode=isolation_forest&region=South')
+    assert res.status_code == 429
+    assert res.headers['Retry-After'] == '1'
+    assert client.get('/api/pool-stats').get_json()['rejected'] == rejected + 1
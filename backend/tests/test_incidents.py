@@ -0,0 +1,61 @@
+import threading
+import time
+import pytest
+
+def test_incidents_log(client):
+    incidents = client.get('/api/incidents-log').get_json()
+    dates = [i['date'] for i in incidents]
+    assert len(incidents) >= 3 and dates == sorted(dates, reverse=True)
+
+def test_post_and_page_comments(client):
+    first = client.post('/api/comments', json={'text': 'Check North stock', 'chart_id': 'paging'})
+    assert first.status_code == 201
+    batch = client.post('/api/comments', json=[{'text': f'note {i}', 'chart_id': 'paging'} for i in range(3)])
+    ids = [c['id'] for c in batch.get_json()]
+    assert ids == list(range(first.get_json()['id'] + 1, first.get_json()['id'] + 4))
+
+    page = client.get('/api/comments?chart_id=paging&limit=2').get_json()
+    assert [c['text'] for c in page['comments']] == ['Check North stock', 'note 0']
+    assert page['has_more']
+    rest = client.get(f"/api/comments?chart_id=paging&after={page['cursor']}").get_json()
+    assert [c['id'] for c in rest['comments']] == ids[1:] and not rest['has_more']
+
+def test_feed_returns_new_comment(client, app):
+    cursor = client.get('/api/comments?chart_id=feed').get_json()['cursor']
+
+    def post():
+        time.sleep(0.2)
+        app.test_client().post('/api/comments', json={'text': 'late', 'chart_id': 'feed'})
+    threading.Thread(target=post).start()
+
+    page = client.get(f'/api/comments/feed?chart_id=feed&after={cursor}&timeout=5').get_json()
+    assert [c['text'] for c in page['comments']] == ['late']
+
+def test_feed_times_out_with_same_cursor(client):
+    page = client.get('/api/comments/feed?chart_id=nothing&after=7&timeout=0').get_json()
+    assert page == {'comments': [], 'cursor': 7, 'has_more': False}
+
+@pytest.mark.parametrize('url', [
+    '/api/comments?after=abc',
+    '/api/comments?limit=ten',
+    '/api/comments/feed?after=1.5',
+    '/api/comments/feed?timeout=soon',
+    '/api/comments/feed?timeout=nan',
+    '/api/comments/feed?timeout=-1'
+])
+def test_invalid_paging_returns_400(client, url):
+    res = client.get(url)
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
+
+@pytest.mark.parametrize('body', [
+    None,
+    [],
+    {'text': '  '},
+    {'text': 'ok', 'chart_id': {'id': 1}},
+    [{'text': 'ok'}, {'text': 'ok', 'chart_id': ['a']}]
+])
+def test_invalid_comments_return_400(client, body):
+    res = client.post('/api/comments', json=body)
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
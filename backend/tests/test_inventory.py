@@ -0,0 +1,37 @@
+import pytest
+from app.routes.inventory import memo_solve
+from app.utils.cache import result_cache
+
+def test_optimize_inventory(client):
+    memo_solve.cache_clear()
+    res = client.get('/api/inventory-optimize')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['status'] == 'Optimal'
+    assert body['cached'] is False
+    assert body['total_cost'] > 0
+    assert {f['source'] for f in body['network_flow']} <= {'WH_North', 'WH_South', 'WH_East', 'WH_West'}
+
+def test_repeat_solve_reports_memo_hit(client):
+    client.get('/api/inventory-optimize?end_date=2024-12-31')
+    result_cache.clear()
+    body = client.get('/api/inventory-optimize?end_date=2024-12-31').get_json()
+    assert body['cached'] is True
+    assert body['solve_ms'] == 0
+
+def test_empty_date_range_returns_empty_plan(client):
+    res = client.get('/api/inventory-optimize?start_date=2030-01-01&end_date=2030-02-01')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['status'] == 'No demand'
+    assert body['network_flow'] == []
+    assert body['total_cost'] == 0
+
+@pytest.mark.parametrize('capacity', ['abc', '-5', '0', '2.5'])
+def test_invalid_capacity_returns_400(client, capacity):
+    res = client.get(f'/api/inventory-optimize?capacity={capacity}')
+    assert res.status_code == 400
+    assert 'error' in res.get_json()
+
+def test_too_little_capacity_is_infeasible(client):
+    assert client.get('/api/inventory-optimize?capacity=1').get_json()['status'] == 'Infeasible'
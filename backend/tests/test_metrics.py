@@ -0,0 +1,75 @@
+import os
+import re
+import threading
+import pytest
+from flask import Flask
+from app.utils import metrics
+
+def test_metrics_exposition(client):
+    client.get('/api/kpis')
+    res = client.get('/api/metrics')
+    assert res.status_code == 200
+    assert res.mimetype == 'text/plain'
+    text = res.get_data(as_text=True)
+    assert '# TYPE praxis_request_duration_seconds histogram' in text
+    count = re.search(r'praxis_request_duration_seconds_count\{blueprint="kpis",endpoint="kpis.get_kpis",method="GET",status="200"\} (\d+)', text)
+    assert count and int(count.group(1)) >= 1
+    assert 'praxis_stage_duration_seconds_bucket{blueprint="kpis",stage="sql",le="+Inf"}' in text
+
+def test_server_timing_header(client):
+    res = client.get('/api/profit-diagnostic?start_date=2024-01-01')
+    timings = dict(part.split(';dur=') for part in res.headers['Server-Timing'].split(', '))
+    assert 'total' in timings and 'sql' in timings
+    assert float(timings['sql']) <= float(timings['total'])
+
+def failing_app(testing):
+    # A bare app with only the instrumentation and a view that raises
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=testing, PROFILE_THRESHOLD_MS=None, PROFILE_INTERVAL_MS=5, PROFILE_DIR=None,
+        METRICS_MULTIPROC_DIR=None, METRICS_FLUSH_INTERVAL=1
+    )
+    metrics.init_metrics(app)
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+    return app
+
+@pytest.mark.parametrize('testing', [True, False])
+def test_unhandled_errors_are_recorded(monkeypatch, testing):
+    app = failing_app(testing)
+    # Profiling on, with a threshold no request reaches
+    monkeypatch.setattr(metrics.profiler, 'threshold', 60000)
+    key = ('app', 'boom', 'GET', 500)
+    before = metrics.request_duration.collect().get(key, [None, 0, 0])[2]
+
+    client = app.test_client()
+    if testing: # the exception propagates and after_request never runs
+        with pytest.raises(RuntimeError):
+            client.get('/boom')
+    else:
+        assert client.get('/boom').status_code == 500
+    assert metrics.request_duration.collect()[key][2] == before + 1
+    assert threading.get_ident() not in metrics.profiler._active
+
+def test_workers_metrics_are_summed(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.snapshots, 'directory', str(tmp_path))
+    key = ('app', 'worker-test', 'GET', 200)
+
+    # A forked "worker" observes one request and exits
+    pid = os.fork()
+    if pid == 0:
+        try:
+            metrics.after_fork()
+            metrics.request_duration.observe(key, 0.01)
+            metrics.snapshots.flush()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    metrics.request_duration.observe(key, 0.02)
+    text = client.get('/api/metrics').get_data(as_text=True)
+    count = re.search(r'praxis_request_duration_seconds_count\{blueprint="app",endpoint="worker-test",method="GET",status="200"\} (\d+)', text)
+    assert int(count.group(1)) == 2
+    assert {f'{pid}.json', f'{os.getpid()}.json'} <= set(os.listdir(tmp_path))
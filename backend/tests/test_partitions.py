@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from app.utils.db import query_orders, query_db, get_partitions
+
+MEASURES = [('sales', 'sales'), ('volume', 'quantity'), ('discount', 'avg_discount'), ('days', 'days_active')]
+
+def direct(start_date, end_date, where='', params=(), group_by=None):
+    group = f' GROUP BY {group_by} ORDER BY {group_by}' if group_by else ''
+    select = f'{group_by + ", " if group_by else ""}SUM(Sales), SUM(Quantity), AVG(Discount), COUNT(DISTINCT Order_Date)'
+    return query_db(f'SELECT {select} FROM orders WHERE Order_Date BETWEEN ? AND ?{where}{group}', [start_date, end_date, *params])
+
+def same(rows, expected):
+    assert len(rows) == len(expected)
+    for row, other in zip(rows, expected):
+        assert tuple(row) == pytest.approx(tuple(other))
+
+def test_loader_writes_quarterly_partitions(app):
+    with app.app_context():
+        partitions = get_partitions()
+    assert len(partitions) == 12
+    assert [p[0] for p in partitions[:2]] == ['order_facts_2023q1', 'order_facts_2023q2']
+
+@pytest.mark.parametrize('start_date, end_date', [
+    ('2024-02-10', '2024-03-20'), # one quarter
+    ('2023-11-15', '2025-02-01'), # spans several
+    ('2023-01-01', '2025-12-31')
+])
+def test_pruned_queries_match_the_view(app, start_date, end_date):
+    with app.app_context():
+        same([query_orders(MEASURES, start_date, end_date, {'Segment': 'Consumer'}, one=True)],
+             direct(start_date, end_date, ' AND Segment = ?', ['Consumer']))
+        same(query_orders(MEASURES, start_date, end_date, group_by=['Store_ID'], order_by='Store_ID'),
+             direct(start_date, end_date, group_by='Store_ID'))
+
+def test_range_without_orders(app, client):
+    with app.app_context():
+        assert query_orders(MEASURES, '2030-01-01', '2030-02-01', group_by=['Store_ID']) == []
+    assert client.get('/api/kpis?start_date=2030-01-01&end_date=2030-02-01').get_json()['revenue'] == 0
+
+def test_archive_moves_old_quarters(scratch_etl, tmp_path):
+    etl = scratch_etl
+    etl.load_to_db(etl.generate_data(500, seed=3))
+    conn = sqlite3.connect(etl.DB_PATH)
+    total = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    conn.close()
+
+    etl.archive_partitions('2024-01-01')
+    conn = sqlite3.connect(etl.DB_PATH)
+    try:
+        assert conn.execute('SELECT MIN(Order_Date) FROM orders').fetchone()[0] >= '2024-01-01'
+        assert conn.execute('SELECT COUNT(*) FROM order_partitions').fetchone()[0] == 8
+        live = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    finally:
+        conn.close()
+    archived = 0
+    for quarter in range(1, 5):
+        archive = sqlite3.connect(tmp_path / 'archive' / f'order_facts_2023q{quarter}.db')
+        archived += archive.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+        archive.close()
+    assert live + archived == total
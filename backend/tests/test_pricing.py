@@ -0,0 +1,82 @@
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.services import columnar, elasticity
+from app.services.elasticity import build_elasticity_table, fits_current, fit_segments, scan_columnar, scan_sqlite
+
+def test_etl_precomputes_fits(data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        assert fits_current(conn)
+        assert build_elasticity_table(conn, parquet_dir=None) is None # nothing to do
+        before = conn.execute('SELECT COUNT(*) FROM price_elasticity').fetchone()[0]
+        with conn:
+            conn.execute("DELETE FROM etl_state WHERE key = 'elasticity_version'")
+        assert build_elasticity_table(conn, parquet_dir=None) == before
+        assert fits_current(conn) and not conn.in_transaction
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('batch_rows', [columnar.BATCH_ROWS, 7])
+def test_columnar_scan_matches_sqlite(data_dir, monkeypatch, batch_rows):
+    # Point estimates agree; the bootstrap blocks depend on the scan order
+    monkeypatch.setattr(elasticity, 'iter_batches', functools.partial(columnar.iter_batches, batch_rows=batch_rows))
+    parquet, sql = {}, {}
+    scan_columnar(str(data_dir / 'orders_parquet'), parquet, np.random.default_rng(0))
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        scan_sqlite(conn, sql, np.random.default_rng(0))
+    finally:
+        conn.close()
+    parquet = {fit[0]: fit[3:6] + fit[8:] for fit in fit_segments(parquet)}
+    sql = {fit[0]: fit[3:6] + fit[8:] for fit in fit_segments(sql)}
+    assert parquet.keys() == sql.keys()
+    for key in sql:
+        assert parquet[key] == pytest.approx(sql[key])
+
+def test_concurrent_refits(data_dir):
+    path = data_dir / 'superstore_enhanced.db'
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM etl_state WHERE key = 'elasticity_version'")
+    conn.close()
+
+    def build():
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            return build_elasticity_table(conn, parquet_dir=None)
+        finally:
+            conn.close()
+    with ThreadPoolExecutor(4) as pool:
+        counts = list(pool.map(lambda _: build(), range(4)))
+    assert len([count for count in counts if count is not None]) == 1
+
+def test_stale_fits_are_served_uncached(client, data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    try:
+        with conn:
+            conn.execute("DELETE FROM etl_state WHERE key = 'elasticity_version'")
+        for _ in range(2):
+            res = client.get('/api/pricing-elasticity?segment=Region:North')
+            assert res.status_code == 200 and res.get_json()['stale'] is True
+            assert res.headers['X-Cache'] == 'MISS'
+        assert not fits_current(conn)
+        build_elasticity_table(conn, parquet_dir=None)
+        assert client.get('/api/pricing-elasticity?segment=Region:North').get_json()['stale'] is False
+    finally:
+        conn.close()
+
+def test_pricing_elasticity(client):
+    res = client.get('/api/pricing-elasticity?segment=Category:Technology')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['segment'] == 'Category:Technology'
+    assert body['ci_low'] <= body['slope'] <= body['ci_high']
+    assert len(body['demand_curve']) == 20
+
+def test_pricing_elasticity_unknown_segment(client):
+    res = client.get('/api/pricing-elasticity?segment=Region:Atlantis')
+    assert res.status_code == 400
+    assert 'All' in res.get_json()['segments']
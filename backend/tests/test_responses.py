@@ -0,0 +1,20 @@
+import gzip
+import json
+
+def test_large_responses_are_gzipped(client):
+    plain = client.get('/api/demand-forecast?days=60')
+    res = client.get('/api/demand-forecast?days=60', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in res.headers['Vary']
+    assert json.loads(gzip.decompress(res.data)) == plain.get_json()
+
+def test_small_responses_stay_uncompressed(client):
+    res = client.get('/api/health', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in res.headers
+
+def test_columns_shape(client):
+    rows = client.get('/api/demand-forecast?days=5').get_json()
+    columns = client.get('/api/demand-forecast?days=5&shape=columns').get_json()
+    assert columns['date'] == [r['date'] for r in rows]
+    assert columns['forecast'] == [r['forecast'] for r in rows]
@@ -0,0 +1,46 @@
+import pytest
+from app.utils import db
+from app.utils.cache import result_cache
+
+MEASURES = [(m, m) for m in db.MEASURES]
+
+def raw_scan(monkeypatch):
+    # Route every query past daily_rollup to the order rows
+    monkeypatch.setattr(db, 'plan_source', lambda columns: 'orders')
+    result_cache.clear()
+
+def rows(result):
+    return [tuple(row) for row in (result if isinstance(result, list) else [result])]
+
+@pytest.mark.parametrize('filters, group_by', [
+    ({}, []),
+    ({'Region': 'North'}, []),
+    ({'Category': 'Technology', 'Is_Promo': 1}, []),
+    ({'Region': 'West', 'Sub_Category': 'Chairs', 'Is_Promo': 0}, []),
+    ({}, ['Sub_Category']),
+    ({'Region': 'South'}, ['Category', 'Is_Promo']),
+    ({'Is_Promo': 1}, ['Region', 'Category', 'Sub_Category'])
+])
+@pytest.mark.parametrize('start_date, end_date', [('2023-01-01', '2025-12-31'), ('2024-03-15', '2024-09-02')])
+def test_rollup_matches_raw_scan(app, monkeypatch, filters, group_by, start_date, end_date):
+    order_by = ', '.join(group_by) or None
+    with app.app_context():
+        assert db.plan_source(list(filters) + group_by) == db.ROLLUP_TABLE
+        rollup = rows(db.query_orders(MEASURES, start_date, end_date, filters, group_by, order_by, one=not group_by))
+        raw_scan(monkeypatch)
+        raw = rows(db.query_orders(MEASURES, start_date, end_date, filters, group_by, order_by, one=not group_by))
+    assert len(rollup) == len(raw) > 0
+    for a, b in zip(rollup, raw):
+        assert a == pytest.approx(b)
+
+@pytest.mark.parametrize('url', [
+    '/api/kpis',
+    '/api/kpis?region=Central&start_date=2024-01-01',
+    '/api/profit-diagnostic',
+    '/api/profit-diagnostic?start_date=2025-02-01&end_date=2025-06-30'
+])
+def test_endpoints_match_raw_scan(client, monkeypatch, url):
+    result_cache.clear()
+    rollup = client.get(url).get_json()
+    raw_scan(monkeypatch)
+    assert client.get(url).get_json() == rollup
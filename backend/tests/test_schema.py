@@ -0,0 +1,52 @@
+import sqlite3
+import pandas as pd
+import pytest
+import etl
+
+LEGACY_COLUMNS = [
+    'Order_ID', 'Order_Date', 'Region', 'Segment', 'Ship_Mode', 'Category', 'Sub_Category', 'Sales', 'Quantity',
+    'Discount', 'Profit', 'Weather_Index', 'Supplier_Reliability', 'Lead_Time_Days', 'Is_Promo', 'Customer_ID', 'Store_ID'
+]
+
+@pytest.fixture
+def db(data_dir):
+    conn = sqlite3.connect(data_dir / 'superstore_enhanced.db')
+    yield conn
+    conn.close()
+
+def plan(conn, query, args=()):
+    return ' | '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, args))
+
+def test_orders_view_round_trips_the_loaded_rows(scratch_etl):
+    df = scratch_etl.generate_data(500, seed=3)
+    scratch_etl.load_to_db(df)
+    conn = sqlite3.connect(scratch_etl.DB_PATH)
+    try:
+        stored = pd.read_sql('SELECT * FROM orders ORDER BY Order_ID', conn)
+    finally:
+        conn.close()
+    assert sorted(stored.columns) == sorted(LEGACY_COLUMNS) == sorted(df.columns)
+    stored['Order_Date'] = pd.to_datetime(stored['Order_Date'])
+    expected = df.sort_values('Order_ID', ignore_index=True)[stored.columns]
+    pd.testing.assert_frame_equal(stored, expected, check_dtype=False)
+
+def test_facts_store_keys_not_labels(db):
+    for column, table in etl.DIMENSIONS:
+        assert db.execute(f'SELECT COUNT(*) = COUNT(DISTINCT {column}) FROM {table}').fetchone()[0]
+    name = db.execute('SELECT name FROM order_partitions LIMIT 1').fetchone()[0]
+    types = {row[1]: row[2] for row in db.execute(f'PRAGMA table_info({name})')}
+    assert 'TEXT' not in types.values()
+    assert all(types[c] == 'INTEGER' for c in types if c.endswith('_Key'))
+
+@pytest.mark.parametrize('query, index', [
+    # /api/kpis, /api/profit-diagnostic: day range, per Sub_Category and promo
+    ('SELECT Sub_Category_Key, Is_Promo, SUM(Sales), SUM(Profit) FROM {p} WHERE Day_Key BETWEEN ? AND ? GROUP BY 1, 2', 'day'),
+    # /api/kpis?region=...
+    ('SELECT SUM(Sales), SUM(Profit), SUM(Quantity) FROM {p} WHERE Region_Key = 1 AND Day_Key BETWEEN ? AND ?', 'region_day'),
+    # RFM scan
+    ('SELECT Customer_ID, MAX(Day_Key), COUNT(DISTINCT Day_Key), SUM(Sales) FROM {p} GROUP BY Customer_ID', 'customer')
+])
+def test_queries_are_served_by_covering_indexes(db, query, index):
+    name, first_day, last_day = db.execute('SELECT name, first_day, last_day FROM order_partitions LIMIT 1').fetchone()
+    args = (first_day, last_day) if '?' in query else ()
+    assert f'USING COVERING INDEX idx_{name}_{index}' in plan(db, query.format(p=name), args)
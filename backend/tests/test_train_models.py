@@ -0,0 +1,64 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import train_models
+
+def orders(days):
+    dates = pd.date_range('2025-01-01', periods=days, freq='D')
+    return pd.DataFrame({
+        'Order_Date': dates,
+        'Region': pd.Categorical(['North'] * days),
+        'Category': pd.Categorical(['Furniture'] * days),
+        'Sub_Category': pd.Categorical(['Chairs'] * days),
+        'Quantity': np.arange(days, dtype=np.int16) % 7 + 1,
+        'Discount': np.float32(0.1),
+        'Weather_Index': np.float32(80),
+        'Is_Promo': np.int8(0)
+    })
+
+def test_rolling_origin_folds():
+    _, _, days, _, _ = train_models.build_features(orders(400))
+    folds = train_models.rolling_origin_folds(days)
+    assert len(folds) == train_models.N_FOLDS
+    assert all(a < b for a, b in folds)
+    assert train_models.rolling_origin_folds(days[:0]) == []
+
+def test_short_history_fails_clearly(monkeypatch):
+    monkeypatch.setattr(train_models, 'load_data', lambda: orders(60))
+    with pytest.raises(ValueError, match='days of order history'):
+        train_models.train_demand_model(n_trials=1)
+
+def test_trial_stops_after_deadline(monkeypatch):
+    X, y, days, _, _ = train_models.build_features(orders(400))
+    monkeypatch.setitem(train_models._shared, 'X', X)
+    monkeypatch.setitem(train_models._shared, 'y', y)
+    folds = train_models.rolling_origin_folds(days)
+    params = dict(train_models.DEFAULT_PARAMS, n_estimators=5)
+
+    assert train_models.run_trial(params, folds, 1, 1000, deadline=time.time() - 1) is None
+    result = train_models.run_trial(params, folds, 1, 1000, deadline=time.time() + 60)
+    assert len(result['fold_rmse']) == len(folds)
+
+def test_artifacts_state_how_intervals_were_calibrated(monkeypatch, tmp_path):
+    monkeypatch.setattr(train_models, 'load_data', lambda: orders(400))
+    monkeypatch.setattr(train_models, 'MODEL_DIR', str(tmp_path))
+    monkeypatch.setattr(train_models, 'DEFAULT_PARAMS', dict(train_models.DEFAULT_PARAMS, n_estimators=5))
+    train_models.train_demand_model(n_trials=1, workers=1)
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert manifest['metrics']['evaluated_on'] == 'holdout'
+    calibration = json.loads((tmp_path / manifest['intervals']).read_text())['calibration']
+    assert calibration['model'] == 'holdout'
+    assert calibration['holdout_train_rows'] < calibration['served_train_rows'] == 400
+
+def test_report_times_search_and_final_fits(monkeypatch, tmp_path):
+    monkeypatch.setattr(train_models, 'load_data', lambda: orders(400))
+    monkeypatch.setattr(train_models, 'MODEL_DIR', str(tmp_path))
+    train_models.train_demand_model(n_trials=1, workers=1, search_budget=30)
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    report = json.loads((tmp_path / manifest['report']).read_text())
+    assert report['search_budget_s'] == 30
+    assert report['search_time_s'] + report['final_fits_s'] <= report['wall_time_s']
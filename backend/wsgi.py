@@ -0,0 +1,27 @@
+import os
+from app import create_app
+from app.services.model_registry import model_registry
+from app.routes.dashboard import snapshot_warmer
+from app.utils.startup import startup
+from app.utils import metrics
+
+# Production entry point, run from the repository root:
+#   gunicorn -c backend/gunicorn.conf.py     (Linux/macOS, multi-process)
+#   python backend/wsgi.py                   (Windows, waitress)
+# Building the app here loads the models and imports the heavy libraries once;
+# with preload_app the server workers fork from this process and share them.
+# LAZY_STARTUP=1 boots without them and warms up in each worker instead.
+app = create_app()
+
+def after_fork():
+    # Per-process state the forked workers must not share with the parent
+    app.extensions['db_pool'].after_fork(warm=int(os.environ.get('DB_POOL_WARM', 2)))
+    model_registry.after_fork()
+    snapshot_warmer.after_fork()
+    startup.after_fork()
+    metrics.after_fork()
+
+if __name__ == '__main__':
+    from waitress import serve
+    serve(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5002)),
+          threads=int(os.environ.get('THREADS', 8)))
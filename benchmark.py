@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import etl
+
+try:
+    import resource
+except ImportError: # Windows: peak RSS only from /proc, i.e. not reported
+    resource = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# One database (and Parquet copy) per scale, reused while rows/seed match
+BENCH_DIR = os.path.join(ROOT, 'backend', 'data', 'bench')
+OUTPUT_PATH = os.path.join(BENCH_DIR, 'results.json')
+SCALES = {'50k': 50000, '1M': 1000000, '10M': 10000000}
+SEED = 42
+
+# Every route with a representative request. Defaults match the frontend's.
+ENDPOINTS = [
+    {'name': 'health', 'path': '/api/health'},
+    {'name': 'cache_stats', 'path': '/api/cache-stats'},
+    {'name': 'pool_stats', 'path': '/api/pool-stats'},
+    {'name': 'login', 'method': 'POST', 'path': '/api/auth/login', 'json': {'username': 'admin', 'password': 'admin'}},
+    {'name': 'auth_stats', 'path': '/api/auth/stats'},
+    {'name': 'kpis', 'path': '/api/kpis?start_date=2023-01-01&end_date=2025-12-31'},
+    {'name': 'kpis_region', 'path': '/api/kpis?start_date=2024-01-01&end_date=2024-12-31&region=West'},
+    {'name': 'profit_diagnostic', 'path': '/api/profit-diagnostic?start_date=2023-01-01&end_date=2025-12-31'},
+    {'name': 'incidents_log', 'path': '/api/incidents-log'},
+    {'name': 'comments', 'path': '/api/comments?chart_id=kpis'},
+    {'name': 'comments_post', 'method': 'POST', 'path': '/api/comments', 'json': {'text': 'benchmark', 'chart_id': 'kpis'}},
+    {'name': 'comments_feed', 'path': '/api/comments/feed?chart_id=kpis&timeout=0'},
+    {'name': 'demand_forecast', 'path': '/api/demand-forecast?days=90'},
+    {'name': 'demand_forecast_batch', 'method': 'POST', 'path': '/api/demand-forecast/batch', 'json': {
+        'days': 90,
+        'series': [
+            {'region': region, 'category': category, 'sub_category': sub_category}
+            for region in etl.REGIONS for category, subs in etl.SUB_CATEGORIES.items() for sub_category in subs
+        ]
+    }},
+    {'name': 'demand_forecast_scenarios', 'method': 'POST', 'path': '/api/demand-forecast/scenarios', 'json': {
+        'days': 30,
+        'series': [
+            {'region': region, 'category': category, 'sub_category': sub_category}
+            for region in etl.REGIONS for category, subs in etl.SUB_CATEGORIES.items() for sub_category in subs
+        ],
+        'grid': {'Discount': {'start': 0, 'stop': 0.5, 'num': 11}, 'Is_Promo': [0, 1], 'Weather_Index': [40, 60, 80, 100]}
+    }},
+    {'name': 'models', 'path': '/api/models'},
+    {'name': 'inventory_optimize', 'path': '/api/inventory-optimize?start_date=2023-01-01&end_date=2025-12-31'},
+    {'name': 'pricing_elasticity', 'path': '/api/pricing-elasticity'},
+    {'name': 'clv_churn', 'path': '/api/clv-churn'},
+    {'name': 'clv_customers', 'path': '/api/clv-churn/customers?churn_risk=Low&limit=200'},
+    {'name': 'anomaly_alerts', 'path': '/api/anomaly-alerts'},
+    {'name': 'anomaly_isolation_forest', 'path': '/api/anomaly-alerts?mode=isolation_forest&region=West'},
+    {'name': 'dashboard_snapshot', 'path': '/api/dashboard-snapshot'},
+]
+
+def parse_scale(value):
+    if value in SCALES:
+        return SCALES[value]
+    return int(float(value.lower().rstrip('km')) * {'k': 1e3, 'm': 1e6}.get(value[-1].lower(), 1))
+
+def build_database(rows, seed):
+    # etl.py's own loaders, pointed at the scale's directory
+    directory = os.path.join(BENCH_DIR, str(rows))
+    marker = os.path.join(directory, '_bench_build')
+    stamp = f'{rows}:{seed}'
+    if os.path.exists(marker) and open(marker).read() == stamp:
+        return directory, None
+
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith('superstore') or name == 'anomaly_state.json':
+            os.remove(os.path.join(directory, name))
+    etl.DB_PATH = os.path.join(directory, 'superstore_enhanced.db')
+    etl.PARQUET_DIR = os.path.join(directory, 'orders_parquet')
+
+    start = time.perf_counter()
+    if rows <= etl.CHUNK_SIZE:
+        etl.load_to_db(etl.generate_data(rows, seed=seed))
+    else:
+        etl.load_streaming(rows, seed=seed)
+    with open(marker, 'w') as f:
+        f.write(stamp)
+    return directory, time.perf_counter() - start
+
+def peak_rss_mb(pid='self'):
+    # High-water mark of the resident set, resettable per endpoint on Linux
+    if pid is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is not None and pid == 'self':
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return None
+
+def reset_peak_rss(pid='self'):
+    if pid is None:
+        return
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def make_client(app=None, url=None):
+    # request(endpoint) -> status code, body fully read
+    if app is not None:
+        local = threading.local()
+
+        def request(endpoint):
+            if not hasattr(local, 'client'):
+                local.client = app.test_client()
+            response = local.client.open(endpoint['path'], method=endpoint.get('method', 'GET'), json=endpoint.get('json'))
+            response.get_data()
+            return response.status_code
+        return request
+
+    def request(endpoint):
+        body = json.dumps(endpoint['json']).encode() if 'json' in endpoint else None
+        req = urllib.request.Request(
+            url.rstrip('/') + endpoint['path'], data=body, method=endpoint.get('method', 'GET'),
+            headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+    return request
+
+def run_endpoint(request, endpoint, requests, concurrency, warmup, rss_pid='self'):
+    for _ in range(warmup):
+        request(endpoint)
+    reset_peak_rss(rss_pid)
+
+    def timed(_):
+        start = time.perf_counter()
+        status = request(endpoint)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': requests,
+        'errors': sum(n for status, n in statuses.items() if not status.startswith('2')),
+        'statuses': statuses,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'throughput_rps': round(requests / wall, 1),
+        'peak_rss_mb': peak_rss_mb(rss_pid)
+    }
+
+def run_endpoints(request, args, rss_pid='self'):
+    selected = [e for e in ENDPOINTS if not args.endpoints or e['name'] in args.endpoints]
+    results = {}
+    for endpoint in selected:
+        results[endpoint['name']] = stats = run_endpoint(request, endpoint, args.requests, args.concurrency, args.warmup, rss_pid)
+        print(f"  {endpoint['name']:<26} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+              f"p99 {stats['p99_ms']:>9.2f} ms  {stats['throughput_rps']:>8.1f} req/s  "
+              f"{stats['errors']} errors  {stats['peak_rss_mb']} MB", file=sys.stderr)
+    return results
+
+def time_per_call(calls, iterations, rounds=9):
+    # {name: fn} -> {name: microseconds per call}, the median over rounds of
+    # each fn's mean. Rounds interleave the fns so they share any drift.
+    means = {name: [] for name in calls}
+    for _ in range(rounds):
+        for name, fn in calls.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            means[name].append((time.perf_counter() - start) / iterations * 1e6)
+    return {name: round(float(np.median(values)), 2) for name, values in means.items()}
+
+def auth_microbenchmark(app, iterations):
+    # Per-call cost of bearer token verification: pyjwt alone, the verifier
+    # on a cache miss (HMAC + user lookup) and on a hit, and the same cheap
+    # request without a token, with a cached token and with an uncached one
+    import jwt
+    from app.utils.auth import ALGORITHM, issue_token, keyring, verifier
+
+    with app.app_context():
+        token = issue_token('admin', 3600)
+        _, secret = keyring.signing_key()
+
+        def miss():
+            verifier.clear()
+            verifier.verify(token)
+
+        results = time_per_call({
+            'pyjwt_decode_us': lambda: jwt.decode(token, secret, algorithms=[ALGORITHM]),
+            'verify_miss_us': miss,
+            'verify_hit_us': lambda: verifier.verify(token)
+        }, iterations)
+
+    client = app.test_client()
+    path, headers = '/api/cache-stats', {'Authorization': f'Bearer {token}'}
+
+    def uncached_request():
+        verifier.clear()
+        client.get(path, headers=headers)
+
+    results.update(time_per_call({
+        'request_no_token_us': lambda: client.get(path),
+        'request_cached_token_us': lambda: client.get(path, headers=headers),
+        'request_uncached_token_us': uncached_request
+    }, max(iterations // 10, 1), rounds=15))
+    results['overhead_cached_us'] = round(results['request_cached_token_us'] - results['request_no_token_us'], 2)
+    results['overhead_uncached_us'] = round(results['request_uncached_token_us'] - results['request_no_token_us'], 2)
+    for name, value in results.items():
+        print(f"  {name:<28} {value:>10.2f}", file=sys.stderr)
+    return results
+
+def run_scale(args):
+    # Runs in its own process (see main) so imports, caches and RSS don't
+    # carry over between scales
+    import logging
+    logging.disable(logging.WARNING)
+    warnings.simplefilter('ignore')
+    sys.path.insert(0, os.path.join(ROOT, 'backend'))
+    from app import create_app
+    from app.config import Config
+
+    directory = args.run_scale
+
+    class BenchConfig(Config):
+        DATABASE_URI = os.path.join(directory, 'superstore_enhanced.db')
+        PARQUET_DIR = os.path.join(directory, 'orders_parquet')
+        ANOMALY_STATE_PATH = os.path.join(directory, 'anomaly_state.json')
+        # Measure the work itself unless --cache is given
+        CACHE_MAX_ENTRIES = Config.CACHE_MAX_ENTRIES if args.cache else 0
+        CACHE_DIR = None
+        MODEL_RELOAD_INTERVAL = 0
+        DASHBOARD_WARM_INTERVAL = 0
+
+    app = create_app(BenchConfig)
+    if args.auth:
+        with open(args.result_file, 'w') as f:
+            json.dump(auth_microbenchmark(app, args.iterations), f)
+        return
+
+    covered = {(e['path'].split('?')[0], e.get('method', 'GET')) for e in ENDPOINTS}
+    missing = sorted(
+        f'{method} {rule.rule}' for rule in app.url_map.iter_rules() if rule.rule.startswith('/api/')
+        for method in rule.methods - {'HEAD', 'OPTIONS'} if (rule.rule, method) not in covered
+    )
+    if missing:
+        print(f"  Not benchmarked: {', '.join(missing)}", file=sys.stderr)
+
+    results = {'endpoints': run_endpoints(make_client(app=app), args), 'not_benchmarked': missing}
+    with open(args.result_file, 'w') as f:
+        json.dump(results, f)
+
+def compare(results, baseline, tolerance, noise_ms):
+    # A regression is a slower median or lower throughput beyond the tolerance
+    # (and beyond noise_ms, so fast endpoints don't flap), or more failed
+    # requests. p95/p99 are reported but too noisy at these sample sizes to gate on.
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for name, stats in current['endpoints'].items():
+            old = previous['endpoints'].get(name)
+            if old is None:
+                continue
+            slower = stats['p50_ms'] - old['p50_ms'] > noise_ms
+            if slower and stats['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+                regressions.append(f"{scale} {name}: p50 {old['p50_ms']} -> {stats['p50_ms']} ms")
+            if slower and stats['throughput_rps'] < old['throughput_rps'] / (1 + tolerance):
+                regressions.append(f"{scale} {name}: throughput {old['throughput_rps']} -> {stats['throughput_rps']} req/s")
+            if stats['errors'] > old['errors']:
+                regressions.append(f"{scale} {name}: errors {old['errors']} -> {stats['errors']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency/throughput benchmark of every API endpoint')
+    parser.add_argument('--scales', default='50k', help='Comma-separated row counts, e.g. 50k,1M,10M')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first')
+    parser.add_argument('--endpoints', type=lambda s: s.split(','), help='Only these endpoint names')
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache enabled')
+    parser.add_argument('--url', help='Benchmark a running server instead (no databases are built)')
+    parser.add_argument('--server-pid', default=None, help='With --url, report peak RSS of this process')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--baseline', help='Fail if results regressed against this results file')
+    parser.add_argument('--save-baseline', help='Also write the results here as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown, as a fraction')
+    parser.add_argument('--noise-ms', type=float, default=5.0, help='Ignore slowdowns smaller than this')
+    parser.add_argument('--auth', action='store_true', help='Microbenchmark token verification instead')
+    parser.add_argument('--iterations', type=int, default=2000, help='Calls per --auth measurement')
+    parser.add_argument('--run-scale', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale:
+        return run_scale(args)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'cache': args.cache,
+            'url': args.url
+        },
+        'scales': {}
+    }
+
+    if args.auth:
+        directory, _ = build_database(parse_scale(args.scales.split(',')[0]), args.seed)
+        print("Token verification, microseconds per call", file=sys.stderr)
+        result_file = os.path.join(directory, '_bench_result.json')
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-scale', directory, '--result-file', result_file,
+             '--auth', '--iterations', str(args.iterations)],
+            check=True, cwd=ROOT
+        )
+        with open(result_file) as f:
+            results['auth'] = json.load(f)
+        os.remove(result_file)
+    elif args.url:
+        print(f"Benchmarking {args.url}", file=sys.stderr)
+        results['scales']['server'] = {'endpoints': run_endpoints(make_client(url=args.url), args, args.server_pid)}
+    else:
+        for rows in [parse_scale(s) for s in args.scales.split(',')]:
+            directory, build_s = build_database(rows, args.seed)
+            print(f"Benchmarking {rows} rows ({directory})", file=sys.stderr)
+            result_file = os.path.join(directory, '_bench_result.json')
+            forwarded = [
+                '--requests', str(args.requests), '--concurrency', str(args.concurrency), '--warmup', str(args.warmup)
+            ] + (['--endpoints', ','.join(args.endpoints)] if args.endpoints else []) + (['--cache'] if args.cache else [])
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run-scale', directory, '--result-file', result_file] + forwarded,
+                check=True, cwd=ROOT
+            )
+            with open(result_file) as f:
+                scale = json.load(f)
+            os.remove(result_file)
+            results['scales'][str(rows)] = {'rows': rows, 'build_s': round(build_s, 1) if build_s else None, **scale}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        settings = ('requests', 'concurrency', 'cache')
+        if any(baseline['meta'].get(k) != results['meta'][k] for k in settings):
+            print("Warning: baseline was recorded with different --requests/--concurrency/--cache", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance, args.noise_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
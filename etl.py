@@ -3,98 +3,644 @@ import numpy as np
 import sqlite3
 import os
 from datetime import datetime, timedelta
-import random
+import time
+import shutil
+import argparse
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet export is skipped without pyarrow
+    pq = None
 
 # Configuration
 DB_PATH = 'backend/data/superstore_enhanced.db'
+# Columnar copy of `orders` for the analytics jobs (read by app/services/columnar.py)
+PARQUET_DIR = 'backend/data/orders_parquet'
+PARQUET_VERSION_FILE = '_data_version'
+# Row group size: the full scans decode one group at a time (columnar.BATCH_ROWS)
+PARQUET_ROW_GROUP = 65536
+# One SQLite file per archived quarter (see archive_partitions)
+ARCHIVE_DIR = 'backend/data/archive'
 NUM_ROWS = 50000
+CHUNK_SIZE = 250000
 START_DATE = datetime(2023, 1, 1)
 END_DATE = datetime(2025, 12, 31)
 
-def generate_data():
-    print("Generating synthetic data...")
-    
-    # Dimensions
-    regions = ['North', 'South', 'East', 'West', 'Central']
-    categories = ['Furniture', 'Office Supplies', 'Technology']
-    sub_categories = {
-        'Furniture': ['Bookcases', 'Chairs', 'Tables', 'Furnishings'],
-        'Office Supplies': ['Labels', 'Storage', 'Art', 'Binders', 'Appliances', 'Paper', 'Fasteners', 'Envelopes', 'Supplies'],
-        'Technology': ['Phones', 'Accessories', 'Machines', 'Copiers']
-    }
-    segments = ['Consumer', 'Corporate', 'Home Office']
-    ship_modes = ['Standard Class', 'Second Class', 'First Class', 'Same Day']
+# Dimensions
+REGIONS = ['North', 'South', 'East', 'West', 'Central']
+CATEGORIES = ['Furniture', 'Office Supplies', 'Technology']
+SUB_CATEGORIES = {
+    'Furniture': ['Bookcases', 'Chairs', 'Tables', 'Furnishings'],
+    'Office Supplies': ['Labels', 'Storage', 'Art', 'Binders', 'Appliances', 'Paper', 'Fasteners', 'Envelopes', 'Supplies'],
+    'Technology': ['Phones', 'Accessories', 'Machines', 'Copiers']
+}
+SEGMENTS = ['Consumer', 'Corporate', 'Home Office']
+SHIP_MODES = ['Standard Class', 'Second Class', 'First Class', 'Same Day']
+
+def generate_chunk(rng, num_rows, start_id=1):
+    # Fully vectorized; all randomness comes from `rng` so chunks are reproducible
     
     # Generate Dates
     date_range = (END_DATE - START_DATE).days
-    dates = [START_DATE + timedelta(days=random.randint(0, date_range)) for _ in range(NUM_ROWS)]
+    dates = np.datetime64(START_DATE.date()) + rng.integers(0, date_range + 1, num_rows).astype('timedelta64[D]')
+    
+    # Sub_Category is drawn uniformly within its Category's slice of the flattened list
+    category_idx = rng.integers(0, len(CATEGORIES), num_rows)
+    flat_sub_categories = np.array([s for c in CATEGORIES for s in SUB_CATEGORIES[c]])
+    counts = np.array([len(SUB_CATEGORIES[c]) for c in CATEGORIES])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sub_idx = offsets[category_idx] + (rng.random(num_rows) * counts[category_idx]).astype(np.int64)
     
     # Generate Core Data
-    data = {
-        'Order_Date': dates,
-        'Region': np.random.choice(regions, NUM_ROWS),
-        'Segment': np.random.choice(segments, NUM_ROWS),
-        'Ship_Mode': np.random.choice(ship_modes, NUM_ROWS),
-        'Category': np.random.choice(categories, NUM_ROWS),
-    }
-    
-    df = pd.DataFrame(data)
-    
-    # Dependent Columns
-    df['Sub_Category'] = df['Category'].apply(lambda x: np.random.choice(sub_categories[x]))
-    df['Sales'] = np.random.lognormal(mean=4.5, sigma=1.2, size=NUM_ROWS).round(2)
-    df['Quantity'] = np.random.randint(1, 15, size=NUM_ROWS)
-    df['Discount'] = np.random.choice([0, 0.1, 0.2, 0.3, 0.4, 0.5], size=NUM_ROWS, p=[0.5, 0.2, 0.15, 0.1, 0.03, 0.02])
-    df['Profit'] = (df['Sales'] * np.random.uniform(-0.2, 0.4, size=NUM_ROWS)).round(2)
+    df = pd.DataFrame({
+        'Order_ID': np.arange(start_id, start_id + num_rows),
+        'Order_Date': dates.astype('datetime64[ns]'),
+        'Region': np.array(REGIONS)[rng.integers(0, len(REGIONS), num_rows)],
+        'Segment': np.array(SEGMENTS)[rng.integers(0, len(SEGMENTS), num_rows)],
+        'Ship_Mode': np.array(SHIP_MODES)[rng.integers(0, len(SHIP_MODES), num_rows)],
+        'Category': np.array(CATEGORIES)[category_idx],
+        'Sub_Category': flat_sub_categories[sub_idx],
+    })
+    
+    sales = rng.lognormal(mean=4.5, sigma=1.2, size=num_rows).round(2)
+    profit = (sales * rng.uniform(-0.2, 0.4, size=num_rows)).round(2)
+    quantity = rng.integers(1, 15, size=num_rows)
+    discount = rng.choice([0, 0.1, 0.2, 0.3, 0.4, 0.5], size=num_rows, p=[0.5, 0.2, 0.15, 0.1, 0.03, 0.02])
     
     # Enhanced Columns
-    df['Weather_Index'] = np.random.uniform(0, 100, size=NUM_ROWS).round(1) # 0=Bad, 100=Good
-    df['Supplier_Reliability'] = np.random.uniform(70, 100, size=NUM_ROWS).round(1)
-    df['Lead_Time_Days'] = np.random.randint(1, 14, size=NUM_ROWS)
-    df['Is_Promo'] = np.random.choice([0, 1], size=NUM_ROWS, p=[0.8, 0.2])
-    df['Customer_ID'] = np.random.randint(1000, 5000, size=NUM_ROWS)
-    df['Store_ID'] = np.random.randint(1, 50, size=NUM_ROWS)
+    weather = rng.uniform(0, 100, size=num_rows).round(1) # 0=Bad, 100=Good
+    reliability = rng.uniform(70, 100, size=num_rows).round(1)
+    lead_time = rng.integers(1, 14, size=num_rows)
+    is_promo = rng.choice([0, 1], size=num_rows, p=[0.8, 0.2])
     
     # Adjust Sales/Profit based on factors
     # Promo increases sales but decreases margin
-    df.loc[df['Is_Promo'] == 1, 'Sales'] *= 1.2
-    df.loc[df['Is_Promo'] == 1, 'Profit'] *= 0.8
+    sales = np.where(is_promo == 1, sales * 1.2, sales)
+    profit = np.where(is_promo == 1, profit * 0.8, profit)
     
     # Bad weather decreases sales for some categories
-    mask_weather = (df['Weather_Index'] < 30) & (df['Category'].isin(['Furniture']))
-    df.loc[mask_weather, 'Sales'] *= 0.7
+    mask_weather = (weather < 30) & (category_idx == CATEGORIES.index('Furniture'))
+    sales = np.where(mask_weather, sales * 0.7, sales)
     
+    df['Sales'] = sales
+    df['Quantity'] = quantity
+    df['Discount'] = discount
+    df['Profit'] = profit
+    df['Weather_Index'] = weather
+    df['Supplier_Reliability'] = reliability
+    df['Lead_Time_Days'] = lead_time
+    df['Is_Promo'] = is_promo
+    df['Customer_ID'] = rng.integers(1000, 5000, size=num_rows)
+    df['Store_ID'] = rng.integers(1, 50, size=num_rows)
+    return df
+
+def generate_data(num_rows=NUM_ROWS, start_id=1, seed=None):
+    print("Generating synthetic data...")
+    df = generate_chunk(np.random.default_rng(seed), num_rows, start_id)
     print(f"Generated {len(df)} rows.")
     return df
 
+def generate_chunks(total_rows, chunk_size=CHUNK_SIZE, seed=None, start_id=1):
+    # Each chunk gets its own child seed, so a given (seed, chunk_size) always
+    # yields the same rows and memory stays bounded by one chunk.
+    num_chunks = -(-total_rows // chunk_size)
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(num_chunks)):
+        size = min(chunk_size, total_rows - i * chunk_size)
+        yield generate_chunk(np.random.default_rng(child), size, start_id + i * chunk_size)
+
+# Summary tables rebuilt from `orders`. {where} restricts the rebuild to the
+# affected days/months during incremental loads.
+SUMMARY_DDL = {
+    'monthly_sales': '''
+        CREATE TABLE monthly_sales (
+            Month TEXT PRIMARY KEY,
+            Total_Sales REAL,
+            Total_Profit REAL
+        )
+    ''',
+    # Daily Rollup (answers /api/kpis and /api/profit-diagnostic, see app/utils/db.py)
+    'daily_rollup': '''
+        CREATE TABLE daily_rollup (
+            Order_Date TIMESTAMP,
+            Region TEXT,
+            Category TEXT,
+            Sub_Category TEXT,
+            Is_Promo INTEGER,
+            Order_Count INTEGER,
+            Sales REAL,
+            Profit REAL,
+            Quantity INTEGER,
+            Discount REAL,
+            Discounted_Sales REAL
+        )
+    ''',
+}
+
+SUMMARY_REFRESH = {
+    'monthly_sales': (
+        "DELETE FROM monthly_sales WHERE Month IN (SELECT strftime('%Y-%m', Order_Date) FROM etl_affected_days)",
+        '''
+        INSERT INTO monthly_sales
+        SELECT strftime('%Y-%m', Order_Date) as Month, Sum(Sales) as Total_Sales, Sum(Profit) as Total_Profit
+        FROM orders
+        {where}
+        GROUP BY 1
+        ''',
+        "WHERE strftime('%Y-%m', Order_Date) IN (SELECT strftime('%Y-%m', Order_Date) FROM etl_affected_days)"
+    ),
+    'daily_rollup': (
+        "DELETE FROM daily_rollup WHERE Order_Date IN (SELECT Order_Date FROM etl_affected_days)",
+        '''
+        INSERT INTO daily_rollup
+        SELECT Order_Date, Region, Category, Sub_Category, Is_Promo,
+            COUNT(*), SUM(Sales), SUM(Profit), SUM(Quantity), SUM(Discount), SUM(Sales * Discount)
+        FROM orders
+        {where}
+        GROUP BY 1, 2, 3, 4, 5
+        ''',
+        "WHERE Order_Date IN (SELECT Order_Date FROM etl_affected_days)"
+    ),
+}
+
+def connect():
+    # Autocommit mode so loads control their own transactions; WAL lets the
+    # API's read-only connections keep reading while a load commits.
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+# Normalized storage: order facts hold integer keys into one dimension
+# table per text column and a Day_Key (days since 1970-01-01) into dim_date.
+# The `orders` view joins them back under the original column names/types.
+DIMENSIONS = [
+    ('Region', 'dim_region'), ('Segment', 'dim_segment'), ('Ship_Mode', 'dim_ship_mode'),
+    ('Category', 'dim_category'), ('Sub_Category', 'dim_sub_category')
+]
+DAY_KEY = "CAST(strftime('%s', {column}) AS INTEGER) / 86400"
+EPOCH = datetime(1970, 1, 1)
+
+# Facts are partitioned by quarter: one table per quarter (order_facts_2024q1,
+# ...) listed in order_partitions with its Day_Key range. The `order_facts`
+# and `orders` views union them; app/utils/db.py:query_facts only reads the
+# partitions overlapping the requested dates, and archive_partitions() moves
+# old quarters out without touching the rest.
+PARTITIONS_DDL = '''
+    CREATE TABLE order_partitions (
+        name TEXT PRIMARY KEY,
+        first_day INTEGER NOT NULL,
+        last_day INTEGER NOT NULL
+    )
+'''
+
+FACTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        Order_ID INTEGER PRIMARY KEY,
+        Day_Key INTEGER NOT NULL,
+        Region_Key INTEGER NOT NULL,
+        Segment_Key INTEGER NOT NULL,
+        Ship_Mode_Key INTEGER NOT NULL,
+        Category_Key INTEGER NOT NULL,
+        Sub_Category_Key INTEGER NOT NULL,
+        Sales REAL,
+        Quantity INTEGER,
+        Discount REAL,
+        Profit REAL,
+        Weather_Index REAL,
+        Supplier_Reliability REAL,
+        Lead_Time_Days INTEGER,
+        Is_Promo INTEGER,
+        Customer_ID INTEGER,
+        Store_ID INTEGER,
+        CHECK (Day_Key BETWEEN {first_day} AND {last_day})
+    )
+'''
+FACT_COLUMNS = [
+    'Order_ID', 'Day_Key', 'Region_Key', 'Segment_Key', 'Ship_Mode_Key', 'Category_Key', 'Sub_Category_Key',
+    'Sales', 'Quantity', 'Discount', 'Profit', 'Weather_Index', 'Supplier_Reliability', 'Lead_Time_Days',
+    'Is_Promo', 'Customer_ID', 'Store_ID'
+]
+
+# One arm of the `orders` view; labels are joined per partition so a filter
+# on the view is pushed down into every arm
+ORDERS_SELECT = f'''
+    SELECT
+        f.Order_ID, d.Order_Date, {', '.join(f'{t}.{c}' for c, t in DIMENSIONS)},
+        f.Sales, f.Quantity, f.Discount, f.Profit, f.Weather_Index, f.Supplier_Reliability,
+        f.Lead_Time_Days, f.Is_Promo, f.Customer_ID, f.Store_ID
+    FROM {{source}} f
+    JOIN dim_date d ON d.Day_Key = f.Day_Key
+    {' '.join(f'JOIN {t} ON {t}.{c}_Key = f.{c}_Key' for c, t in DIMENSIONS)}
+'''
+
+def day_to_date(day):
+    return (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+
+def quarter_partition(year, quarter):
+    # (name, first_day, last_day) of a calendar quarter
+    first = datetime(year, 3 * quarter - 2, 1)
+    end = datetime(year + quarter // 4, 3 * quarter % 12 + 1, 1)
+    return f'order_facts_{year}q{quarter}', (first - EPOCH).days, (end - EPOCH).days - 1
+
+def get_partitions(conn):
+    return conn.execute('SELECT name, first_day, last_day FROM order_partitions ORDER BY first_day').fetchall()
+
+def create_views(conn):
+    conn.execute('DROP VIEW IF EXISTS orders')
+    conn.execute('DROP VIEW IF EXISTS order_facts')
+    # An empty database still gets both views, over no rows
+    sources = [name for name, _, _ in get_partitions(conn)]
+    sources = sources or [f"(SELECT {', '.join(f'NULL AS {c}' for c in FACT_COLUMNS)} WHERE 0)"]
+    conn.execute(f"CREATE VIEW order_facts AS {' UNION ALL '.join(f'SELECT * FROM {s}' for s in sources)}")
+    conn.execute(f"CREATE VIEW orders AS {' UNION ALL '.join(ORDERS_SELECT.format(source=s) for s in sources)}")
+
+def create_schema(conn):
+    conn.execute('CREATE TABLE dim_date (Day_Key INTEGER PRIMARY KEY, Order_Date TIMESTAMP NOT NULL UNIQUE)')
+    for column, table in DIMENSIONS:
+        conn.execute(f'CREATE TABLE {table} ({column}_Key INTEGER PRIMARY KEY, {column} TEXT NOT NULL UNIQUE)')
+    conn.execute(PARTITIONS_DDL)
+    create_views(conn)
+
+def legacy_layout(conn):
+    # 'orders' for a flat orders table, 'order_facts' for unpartitioned facts
+    for name in ('orders', 'order_facts'):
+        row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", [name]).fetchone()
+        if row and row[0] == 'table':
+            return name
+    return None
+
+def drop_schema(conn):
+    # Also handles the older layouts where `orders` or `order_facts` are tables
+    for name in ('orders', 'order_facts'):
+        row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", [name]).fetchone()
+        if row:
+            conn.execute(f"DROP {row[0].upper()} {name}")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'order_partitions'").fetchone():
+        for name, _, _ in get_partitions(conn):
+            conn.execute(f'DROP TABLE IF EXISTS {name}')
+        conn.execute('DROP TABLE order_partitions')
+    conn.execute('DROP TABLE IF EXISTS dim_date')
+    for _, table in DIMENSIONS:
+        conn.execute(f'DROP TABLE IF EXISTS {table}')
+
+def insert_facts(conn, source):
+    # Encode rows from a flat staging/delta table into their quarters' partitions;
+    # new labels get the next key. Order_Date is day-granular, so one dim_date row per day.
+    for column, table in DIMENSIONS:
+        conn.execute(f'INSERT OR IGNORE INTO {table} ({column}) SELECT DISTINCT {column} FROM {source} ORDER BY 1')
+    conn.execute(f'''
+        INSERT OR IGNORE INTO dim_date (Day_Key, Order_Date)
+        SELECT DISTINCT {DAY_KEY.format(column='Order_Date')}, Order_Date FROM {source} ORDER BY 1
+    ''')
+    
+    quarters = conn.execute(f'''
+        SELECT DISTINCT CAST(substr(Order_Date, 1, 4) AS INTEGER), (CAST(substr(Order_Date, 6, 2) AS INTEGER) + 2) / 3
+        FROM {source}
+        ORDER BY 1, 2
+    ''').fetchall()
+    existing = {name for name, _, _ in get_partitions(conn)}
+    for year, quarter in quarters:
+        name, first_day, last_day = quarter_partition(year, quarter)
+        if name not in existing:
+            conn.execute(FACTS_DDL.format(name=name, first_day=first_day, last_day=last_day))
+            conn.execute('INSERT INTO order_partitions VALUES (?, ?, ?)', [name, first_day, last_day])
+        conn.execute(f'''
+            INSERT INTO {name}
+            SELECT
+                s.Order_ID, {DAY_KEY.format(column='s.Order_Date')}, {', '.join(f'{t}.{c}_Key' for c, t in DIMENSIONS)},
+                s.Sales, s.Quantity, s.Discount, s.Profit, s.Weather_Index, s.Supplier_Reliability,
+                s.Lead_Time_Days, s.Is_Promo, s.Customer_ID, s.Store_ID
+            FROM {source} s
+            {' '.join(f'JOIN {t} ON {t}.{c} = s.{c}' for c, t in DIMENSIONS)}
+            WHERE s.Order_Date >= ? AND s.Order_Date < ?
+            ORDER BY s.Order_ID
+        ''', [day_to_date(first_day), day_to_date(last_day + 1)])
+    if any(quarter_partition(year, quarter)[0] not in existing for year, quarter in quarters):
+        create_views(conn)
+
+def delete_facts(conn, source):
+    # Order_IDs are unique across partitions, but a changed order may move quarters
+    for name, _, _ in get_partitions(conn):
+        conn.execute(f'DELETE FROM {name} WHERE Order_ID IN (SELECT Order_ID FROM {source})')
+
+def create_indexes(conn):
+    # Covering indexes shaped after app/utils/db.py:query_orders and the RFM scan:
+    # /api/kpis (optionally per Region), /api/profit-diagnostic (per Sub_Category)
+    # and /api/clv-churn (per Customer_ID) never touch the tables themselves.
+    # Every partition gets its own; existing ones are kept.
+    for name, _, _ in get_partitions(conn):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_day ON {name}(Day_Key, Sub_Category_Key, Is_Promo, Sales, Profit, Quantity, Discount)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_region_day ON {name}(Region_Key, Day_Key, Sales, Profit, Quantity, Discount)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_customer ON {name}(Customer_ID, Day_Key, Sales)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rollup_date_region ON daily_rollup(Order_Date, Region)')
+
+def set_watermark(conn, full_load=False):
+    conn.execute('CREATE TABLE IF NOT EXISTS etl_state (key TEXT PRIMARY KEY, value)')
+    # Order_ID is each partition's rowid, so this is one lookup per partition
+    watermark = max((conn.execute(f'SELECT MAX(Order_ID) FROM {name}').fetchone()[0] or 0 for name, _, _ in get_partitions(conn)), default=0)
+    conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('order_id_watermark', ?)", [watermark])
+    # New data version so the API's result cache drops everything computed before this load
+    version = time.time_ns()
+    conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('data_version', ?)", [version])
+    if full_load:
+        # Incremental consumers (e.g. the anomaly detector) reseed when this changes
+        conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('base_version', ?)", [version])
+    return version
+
+def get_watermark(conn):
+    try:
+        row = conn.execute("SELECT value FROM etl_state WHERE key = 'order_id_watermark'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+# Same schema pandas' to_sql produces for generate_data() output
+ORDERS_COLUMNS = [
+    ('Order_ID', 'INTEGER'), ('Order_Date', 'TIMESTAMP'), ('Region', 'TEXT'), ('Segment', 'TEXT'),
+    ('Ship_Mode', 'TEXT'), ('Category', 'TEXT'), ('Sub_Category', 'TEXT'), ('Sales', 'REAL'),
+    ('Quantity', 'INTEGER'), ('Discount', 'REAL'), ('Profit', 'REAL'), ('Weather_Index', 'REAL'),
+    ('Supplier_Reliability', 'REAL'), ('Lead_Time_Days', 'INTEGER'), ('Is_Promo', 'INTEGER'),
+    ('Customer_ID', 'INTEGER'), ('Store_ID', 'INTEGER')
+]
+
+def export_month(conn, path, month):
+    # Rewrite one Order_Month=YYYY-MM partition from the committed rows;
+    # the file is replaced atomically and dropped when the month is empty.
+    next_month = str(pd.Period(month, freq='M') + 1)
+    df = pd.read_sql(
+        'SELECT * FROM orders WHERE Order_Date >= ? AND Order_Date < ? ORDER BY Order_Date, Order_ID',
+        conn, params=[f'{month}-01', f'{next_month}-01']
+    )
+    partition = os.path.join(path, f'Order_Month={month}')
+    if df.empty:
+        shutil.rmtree(partition, ignore_errors=True)
+        return 0
+    df['Order_Date'] = pd.to_datetime(df['Order_Date'], format='%Y-%m-%d %H:%M:%S')
+    
+    os.makedirs(partition, exist_ok=True)
+    target = os.path.join(partition, 'part-0.parquet')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), target + '.tmp', compression='zstd', row_group_size=PARQUET_ROW_GROUP)
+    os.replace(target + '.tmp', target)
+    return len(df)
+
+def export_parquet(conn, months=None):
+    # Month-partitioned Parquet copy of `orders`, stamped with the data_version
+    # it was exported from; readers fall back to SQLite while the stamp is stale.
+    # months=None rebuilds the whole data set next to the live one and swaps it in.
+    if pq is None:
+        print("pyarrow not installed, skipping Parquet export.")
+        return
+    start = time.perf_counter()
+    version = conn.execute("SELECT value FROM etl_state WHERE key = 'data_version'").fetchone()[0]
+    
+    if months is None or not os.path.isdir(PARQUET_DIR):
+        path = PARQUET_DIR + '.tmp'
+        shutil.rmtree(path, ignore_errors=True)
+        months = [row[0] for row in conn.execute('SELECT DISTINCT substr(Order_Date, 1, 7) FROM orders ORDER BY 1')]
+    else:
+        path = PARQUET_DIR
+    
+    rows = sum(export_month(conn, path, month) for month in months)
+    with open(os.path.join(path, PARQUET_VERSION_FILE), 'w') as f:
+        f.write(str(version))
+    
+    if path != PARQUET_DIR:
+        shutil.rmtree(PARQUET_DIR + '.old', ignore_errors=True)
+        if os.path.isdir(PARQUET_DIR):
+            os.rename(PARQUET_DIR, PARQUET_DIR + '.old')
+        os.rename(path, PARQUET_DIR)
+        shutil.rmtree(PARQUET_DIR + '.old', ignore_errors=True)
+    print(f"Exported {rows} rows in {len(months)} monthly Parquet partitions in {time.perf_counter() - start:.1f}s.")
+
+def swap_in_staging(conn, convert_legacy=False):
+    # Replace `orders` with the encoded contents of `orders_staging` and rebuild
+    # summaries in one transaction, so readers see either the old or the new data set.
+    # convert_legacy re-encodes a flat `orders` table from before the normalized
+    # schema, or unpartitioned facts from before the quarterly partitions.
+    print("Encoding orders and creating summary tables...")
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if convert_legacy:
+            conn.execute('DROP TABLE IF EXISTS orders_staging')
+            if legacy_layout(conn) == 'orders':
+                conn.execute('ALTER TABLE orders RENAME TO orders_staging')
+            else:
+                conn.execute('CREATE TABLE orders_staging AS SELECT * FROM orders ORDER BY Order_ID')
+        drop_schema(conn)
+        create_schema(conn)
+        insert_facts(conn, 'orders_staging')
+        conn.execute('DROP TABLE orders_staging')
+        
+        # Create Summary Tables for Performance
+        for table, ddl in SUMMARY_DDL.items():
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+            conn.execute(ddl)
+            conn.execute(SUMMARY_REFRESH[table][1].format(where=''))
+        
+        create_indexes(conn)
+        set_watermark(conn, full_load=True)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    export_parquet(conn)
+
+def refresh_scores():
+    # Precompute the per-customer RFM scores and segment price elasticities for
+    # the data just loaded; the API's GET handlers only read them (flagged
+    # stale until this has run)
+    from backend.app.services.rfm import build_rfm_table
+    from backend.app.services.elasticity import build_elasticity_table
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        customers = build_rfm_table(conn, parquet_dir=PARQUET_DIR)
+        segments = build_elasticity_table(conn, parquet_dir=PARQUET_DIR)
+    finally:
+        conn.close()
+    if customers is None or segments is None:
+        print("Scores were already refreshed by another process.")
+    else:
+        print(f"Scored {customers} customers and fitted {segments} price segments.")
+
 def load_to_db(df):
     print(f"Loading data to {DB_PATH}...")
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
+    try:
+        # Stage the new data next to the live table; readers keep using `orders`
+        df.to_sql('orders_staging', conn, if_exists='replace', index=False)
+        swap_in_staging(conn)
+    finally:
+        conn.close()
+    refresh_scores()
+    print("Database populated successfully.")
+
+def load_streaming(total_rows, chunk_size=CHUNK_SIZE, seed=None):
+    # Generate and insert chunk by chunk so memory stays flat for any row count
+    print(f"Streaming {total_rows} rows to {DB_PATH} in chunks of {chunk_size}...")
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
-    # Main Table
-    df.to_sql('orders', conn, if_exists='replace', index=False)
+    names = [name for name, _ in ORDERS_COLUMNS]
+    insert = f"INSERT INTO orders_staging VALUES ({', '.join('?' * len(names))})"
     
-    # Create Indices
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_date ON orders(Order_Date)')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_region ON orders(Region)')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_category ON orders(Category)')
+    conn = connect()
+    try:
+        conn.execute('DROP TABLE IF EXISTS orders_staging')
+        conn.execute(f"CREATE TABLE orders_staging ({', '.join(f'{n} {t}' for n, t in ORDERS_COLUMNS)})")
+        
+        start = time.perf_counter()
+        written = 0
+        for chunk in generate_chunks(total_rows, chunk_size, seed):
+            # Dates are whole days; match the 'YYYY-MM-DD HH:MM:SS' text to_sql writes
+            chunk['Order_Date'] = np.char.add(np.datetime_as_string(chunk['Order_Date'].values, unit='D'), ' 00:00:00')
+            columns = [chunk[n].tolist() for n in names]
+            
+            conn.execute('BEGIN')
+            conn.executemany(insert, zip(*columns))
+            conn.execute('COMMIT')
+            written += len(chunk)
+            print(f"  {written}/{total_rows} rows")
+        insert_elapsed = time.perf_counter() - start
+        
+        swap_in_staging(conn)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    refresh_scores()
     
-    # Create Summary Tables for Performance
-    print("Creating summary tables...")
+    print(f"Inserted {written} rows in {insert_elapsed:.1f}s ({written / insert_elapsed:,.0f} rows/s), "
+          f"{elapsed:.1f}s including indexes and summaries ({written / elapsed:,.0f} rows/s).")
+
+def load_incremental(df):
+    # Append new orders and replace changed ones (matched on Order_ID), then
+    # merge the affected days into the summary tables, all in one transaction.
+    conn = connect()
+    watermark = get_watermark(conn)
+    if watermark is None:
+        conn.close()
+        print("No watermark found, falling back to a full load.")
+        return load_to_db(df)
+    if legacy_layout(conn):
+        swap_in_staging(conn, convert_legacy=True)
     
-    # Monthly Sales
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS monthly_sales AS
-        SELECT strftime('%Y-%m', Order_Date) as Month, Sum(Sales) as Total_Sales, Sum(Profit) as Total_Profit
-        FROM orders
-        GROUP BY 1
-    ''')
+    df.to_sql('orders_delta', conn, if_exists='replace', index=False)
+    new_rows = int((df['Order_ID'] > watermark).sum())
+    print(f"Merging {new_rows} new and {len(df) - new_rows} changed orders (watermark {watermark})...")
     
-    conn.close()
-    print("Database populated successfully.")
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Days touched by the delta, including the old dates of changed orders
+        conn.execute('DROP TABLE IF EXISTS etl_affected_days')
+        conn.execute('''
+            CREATE TEMP TABLE etl_affected_days AS
+            SELECT Order_Date FROM orders_delta
+            UNION
+            SELECT Order_Date FROM orders WHERE Order_ID IN (SELECT Order_ID FROM orders_delta)
+        ''')
+        
+        # Last day already loaded, to tell appends from changes to past days
+        last_date = conn.execute('SELECT MAX(Order_Date) FROM daily_rollup').fetchone()[0]
+        first_date = conn.execute('SELECT MIN(Order_Date) FROM etl_affected_days').fetchone()[0]
+        
+        delete_facts(conn, 'orders_delta')
+        insert_facts(conn, 'orders_delta')
+        create_indexes(conn) # for quarters the delta opened
+        
+        for table, (delete, insert, where) in SUMMARY_REFRESH.items():
+            conn.execute(delete)
+            conn.execute(insert.format(where=where))
+        
+        version = set_watermark(conn)
+        if last_date is not None and first_date is not None and str(first_date) <= str(last_date):
+            # Orders added to or changed on days already loaded: consumers that
+            # only read days after their last one (the anomaly detector) reseed
+            # when history_version changes; history_from is the earliest such day
+            conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('history_version', ?)", [version])
+            conn.execute("INSERT OR REPLACE INTO etl_state (key, value) VALUES ('history_from', ?)", [str(first_date)])
+        conn.execute('DROP TABLE orders_delta')
+        months = [row[0] for row in conn.execute('SELECT DISTINCT substr(Order_Date, 1, 7) FROM etl_affected_days')]
+        conn.execute('COMMIT')
+        
+        # Only the monthly partitions the delta touched
+        export_parquet(conn, months)
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    refresh_scores()
+    print("Incremental load complete.")
+
+def archive_partitions(before):
+    # Move every quarter that ends before `before` (YYYY-MM-DD) into its own
+    # file under ARCHIVE_DIR, as a flat `orders` table, then drop its partition,
+    # days and summary rows from the live database in one transaction.
+    conn = connect()
+    try:
+        cutoff = (datetime.strptime(before, '%Y-%m-%d') - EPOCH).days
+        old = [p for p in get_partitions(conn) if p[2] < cutoff]
+        if not old:
+            print(f"No quarters end before {before}, nothing to archive.")
+            return
+        
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        for name, first_day, last_day in old:
+            path = os.path.join(ARCHIVE_DIR, f'{name}.db')
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute('ATTACH DATABASE ? AS archive', [path])
+            try:
+                conn.execute(
+                    'CREATE TABLE archive.orders AS SELECT * FROM orders WHERE Order_Date >= ? AND Order_Date < ? ORDER BY Order_ID',
+                    [day_to_date(first_day), day_to_date(last_day + 1)]
+                )
+            finally:
+                conn.execute('DETACH DATABASE archive')
+            print(f"  {name} -> {path}")
+        
+        end = day_to_date(old[-1][2] + 1)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for name, _, _ in old:
+                conn.execute(f'DROP TABLE {name}')
+                conn.execute('DELETE FROM order_partitions WHERE name = ?', [name])
+            conn.execute('DELETE FROM dim_date WHERE Day_Key <= ?', [old[-1][2]])
+            conn.execute('DELETE FROM daily_rollup WHERE Order_Date < ?', [end])
+            conn.execute('DELETE FROM monthly_sales WHERE Month < ?', [end[:7]])
+            create_views(conn)
+            # History changed, so incremental consumers reseed as after a full load
+            set_watermark(conn, full_load=True)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        export_parquet(conn)
+    finally:
+        conn.close()
+    refresh_scores()
+    print(f"Archived {len(old)} quarters before {end}.")
 
 if __name__ == "__main__":
-    df = generate_data()
-    load_to_db(df)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true', help='Append new orders instead of replacing the table')
+    parser.add_argument('--stream', action='store_true', help='Generate and insert in chunks (for large load tests)')
+    parser.add_argument('--rows', type=int, default=NUM_ROWS)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--archive-before', metavar='YYYY-MM-DD', help='Archive the quarters ending before this date and exit')
+    args = parser.parse_args()
+    
+    if args.archive_before:
+        archive_partitions(args.archive_before)
+    elif args.stream:
+        load_streaming(args.rows, args.chunk_size, args.seed)
+    elif args.incremental:
+        conn = sqlite3.connect(DB_PATH)
+        start_id = (get_watermark(conn) or 0) + 1
+        conn.close()
+        load_incremental(generate_data(args.rows, start_id, args.seed))
+    else:
+        load_to_db(generate_data(args.rows, seed=args.seed))